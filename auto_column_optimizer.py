@@ -2,6 +2,8 @@ import pandas as pd
 from itertools import combinations, product
 from typing import List, Tuple, Dict, Optional
 from collections import Counter
+import numpy as np
+from draw_history import load_draw_history
 
 UNIT_COST = 50
 
@@ -96,25 +98,17 @@ def suggest_column_count(input_numbers: List[int], min_columns=3, max_columns=6)
     else:
         return min_columns
 
-def backtest_hit_rate(db_path: str, selected_numbers: set) -> None:
-    import sqlite3
-    from collections import Counter
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT date, numbers FROM lotto_data ORDER BY date ASC")
-    rows = cursor.fetchall()
-    conn.close()
+def count_column_hits(hits: np.ndarray, columns: List[List[int]]) -> np.ndarray:
+    """每期命中的柱數（hits 為 期數×39 命中矩陣）"""
+    return sum(hits[:, [n - 1 for n in col]].any(axis=1).astype(int) for col in columns)
 
-    hit_counts = []
-    for date, numbers_str in rows:
-        draw_numbers = set(map(int, numbers_str.split(",")))
-        hits = selected_numbers & draw_numbers
-        hit_counts.append(len(hits))
+def backtest_hit_rate(db_path: str, selected_numbers: set) -> None:
+    history = load_draw_history(db_path)
+    hit_counts = history.hits[:, [n - 1 for n in sorted(selected_numbers)]].sum(axis=1)
 
     total_periods = len(hit_counts)
-    total_hits = sum(hit_counts)
-    hit_distribution = Counter(hit_counts)
+    total_hits = int(hit_counts.sum())
+    hit_distribution = Counter(hit_counts.tolist())
 
     print(f"\n📊 整體命中率回測（共 {total_periods} 期）")
     print(f"🎯 總命中次數：{total_hits}")
@@ -124,27 +118,15 @@ def backtest_hit_rate(db_path: str, selected_numbers: set) -> None:
         print(f"  命中 {k} 個 → {hit_distribution[k]} 期")
 
 def simulate_column_hit_rate(db_path: str, columns: List[List[int]], stars: int = 3, preview_limit: int = 10) -> None:
-    import sqlite3
-    from collections import Counter
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT date, numbers FROM lotto_data ORDER BY date ASC")
-    rows = cursor.fetchall()
-    conn.close()
-
-    hit_distribution = Counter()
-    hit_3_column_details = []
-
-    for date, numbers_str in rows:
-        draw_numbers = set(map(int, numbers_str.split(",")))
-        hit_columns = sum(any(n in draw_numbers for n in col) for col in columns)
-        hit_distribution[hit_columns] += 1
-
-        if hit_columns == 3 and len(hit_3_column_details) < preview_limit:
-            hit_3_column_details.append((date, sorted(draw_numbers)))
-
-    total_periods = len(rows)
+    history = load_draw_history(db_path)
+    hit_columns = count_column_hits(history.hits, columns)
+    hit_distribution = Counter(hit_columns.tolist())
+    hit_3_column_details = [
+        (history.dates[i], sorted(history.draws[i].tolist()))
+        for i in np.flatnonzero(hit_columns == 3)[:preview_limit]
+    ]
+
+    total_periods = len(hit_columns)
     hit_success = sum(v for k, v in hit_distribution.items() if k >= stars)
 
     print(f"\n🧪 柱碰命中率回測（{stars} 星）")
@@ -159,43 +141,24 @@ def simulate_column_hit_rate(db_path: str, columns: List[List[int]], stars: int
         for date, nums in hit_3_column_details:
             print(f"  📅 {date} → 號碼：{nums}")
 def list_latest_hit_3_columns(db_path: str, columns: List[List[int]], limit: int = 10) -> None:
-    import sqlite3
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT date, numbers FROM lotto_data ORDER BY date DESC")
-    rows = cursor.fetchall()
-    conn.close()
+    history = load_draw_history(db_path)
+    hit_columns = count_column_hits(history.hits, columns)
+    column_numbers = set(num for col in columns for num in col)
 
     hit_3_list = []
-    for date, numbers_str in rows:
-        draw_numbers = set(map(int, numbers_str.split(",")))
-        hit_columns = sum(any(n in draw_numbers for n in col) for col in columns)
-        if hit_columns == 3:
-            hit_nums = sorted(draw_numbers & set(num for col in columns for num in col))
-            hit_3_list.append((date, hit_nums, sorted(draw_numbers)))
-            if len(hit_3_list) >= limit:
-                break
+    for i in np.flatnonzero(hit_columns == 3)[::-1][:limit]:
+        draw_numbers = set(history.draws[i].tolist())
+        hit_nums = sorted(draw_numbers & column_numbers)
+        hit_3_list.append((history.dates[i], hit_nums, sorted(draw_numbers)))
 
     print(f"\n🔍 最新命中 3 柱的期數（共列出 {len(hit_3_list)} 期）：")
     for date, hit_nums, all_nums in hit_3_list:
         print(f"  📅 {date} → 命中號碼：{hit_nums}（原始號碼：{all_nums}）")
 
 def analyze_hit_3_column_intervals(db_path: str, columns: List[List[int]]) -> None:
-    import sqlite3
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT date, numbers FROM lotto_data ORDER BY date ASC")
-    rows = cursor.fetchall()
-    conn.close()
-
-    hit_indices = []
-    for idx, (date, numbers_str) in enumerate(rows):
-        draw_numbers = set(map(int, numbers_str.split(",")))
-        hit_columns = sum(any(n in draw_numbers for n in col) for col in columns)
-        if hit_columns == 3:
-            hit_indices.append((idx, date))
+    history = load_draw_history(db_path)
+    hit_columns = count_column_hits(history.hits, columns)
+    hit_indices = [(int(idx), history.dates[idx]) for idx in np.flatnonzero(hit_columns == 3)]
 
     intervals = [j[0] - i[0] for i, j in zip(hit_indices[:-1], hit_indices[1:])]
     print(f"\n📊 命中 3 柱的期數間隔分析（共 {len(hit_indices)} 次命中）：")
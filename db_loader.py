@@ -1,18 +1,372 @@
 # db_loader.py
+import os
+import re
 import sqlite3
-from typing import List, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date as date_cls
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.request import pathname2url
 
-def get_latest_date(db_path: str) -> str:
+NUM_BALLS = 39
+NUMBERS_PER_DRAW = 5
+NUMBER_COLUMNS = ["n1", "n2", "n3", "n4", "n5"]
+NUMBERS_SQL = " || ',' || ".join(NUMBER_COLUMNS)  # 還原成 "1,2,3,4,5" 字串
+
+# 🗂 正規化後的 lotto_data 結構：ISO 日期、期序、5 個整數號碼欄與 39-bit 位元遮罩
+LOTTO_SCHEMA = [
+    """
+    CREATE TABLE lotto_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        seq INTEGER NOT NULL,           -- 期序（依日期由 1 起算）
+        date TEXT NOT NULL,             -- ISO 日期 YYYY-MM-DD
+        n1 SMALLINT NOT NULL,
+        n2 SMALLINT NOT NULL,
+        n3 SMALLINT NOT NULL,
+        n4 SMALLINT NOT NULL,
+        n5 SMALLINT NOT NULL,
+        mask INTEGER NOT NULL           -- bit k 代表號碼 k+1
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_lotto_date ON lotto_data(date)",
+    "CREATE INDEX IF NOT EXISTS idx_lotto_seq ON lotto_data(seq)",
+]
+
+# 🧾 內容檢查碼：每期 (date, mask) 的雜湊總和，由觸發器維護，不需掃描全表即可判斷內容是否變動
+_ROW_CHECKSUM = "((({row}.mask % 1000000007) * 1000003 + CAST(replace({row}.date, '-', '') AS INTEGER)) % 1000000007)"
+META_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS lotto_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lotto_insert AFTER INSERT ON lotto_data BEGIN
+        UPDATE lotto_meta SET value = value + {_ROW_CHECKSUM.format(row="NEW")} WHERE key = 'checksum';
+        UPDATE lotto_meta SET value = value + 1 WHERE key = 'revision';
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lotto_delete AFTER DELETE ON lotto_data BEGIN
+        UPDATE lotto_meta SET value = value - {_ROW_CHECKSUM.format(row="OLD")} WHERE key = 'checksum';
+        UPDATE lotto_meta SET value = value + 1 WHERE key = 'revision';
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_lotto_update AFTER UPDATE OF date, mask ON lotto_data BEGIN
+        UPDATE lotto_meta SET value = value - {_ROW_CHECKSUM.format(row="OLD")} + {_ROW_CHECKSUM.format(row="NEW")}
+            WHERE key = 'checksum';
+        UPDATE lotto_meta SET value = value + 1 WHERE key = 'revision';
+    END
+    """,
+    f"""
+    INSERT OR REPLACE INTO lotto_meta (key, value)
+        SELECT 'checksum', COALESCE(SUM({_ROW_CHECKSUM.format(row="lotto_data")}), 0) FROM lotto_data
+    """,
+    "INSERT OR IGNORE INTO lotto_meta (key, value) VALUES ('revision', 0)",
+]
+
+
+# 🔌 連線管理：每個執行緒各自重用連線、WAL 日誌、預編譯語句快取、唯讀分析連線
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
+_local = threading.local()
+_wal_ready = set()
+_stats_lock = threading.Lock()
+_query_stats: Dict[str, List[float]] = {}  # sql -> [次數, 秒數]
+
+
+def _record_query(sql: str, seconds: float, count: int = 1):
+    key = " ".join(sql.split())
+    with _stats_lock:
+        entry = _query_stats.setdefault(key, [0, 0.0])
+        entry[0] += count
+        entry[1] += seconds
+
+
+class _TimedConnection(sqlite3.Connection):
+    """記錄每條語句次數與耗時的連線。"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+
+def _open_connection(db_path: str, readonly: bool) -> sqlite3.Connection:
+    path = os.path.abspath(db_path)
+    if readonly:
+        if path not in _wal_ready:
+            _open_connection(db_path, readonly=False).close()  # 唯讀連線無法切換日誌模式，先由寫入連線設定
+        target, uri = f"file:{pathname2url(path)}?mode=ro", True
+    else:
+        target, uri = path, False
+
+    conn = sqlite3.connect(
+        target,
+        uri=uri,
+        isolation_level=None,  # 自動提交；寫入一律經由 transaction()
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=_TimedConnection
+    )
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    if not readonly:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        _wal_ready.add(path)
+    return conn
+
+
+def get_connection(db_path: str, readonly: bool = False) -> sqlite3.Connection:
+    """
+    取得目前執行緒可重用的連線（fork 後的子行程會自動重新連線）。
+    :param db_path: SQLite 資料庫路徑
+    :param readonly: 是否使用唯讀連線（分析查詢用）
+    :return: sqlite3.Connection
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    key = (os.path.abspath(db_path), readonly)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = _open_connection(db_path, readonly)
+    return conn
+
+
+def close_connections():
+    """關閉目前執行緒持有的所有連線。"""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+@contextmanager
+def transaction(db_path: str) -> Iterator[sqlite3.Connection]:
+    """
+    以單一寫入交易執行區塊內的語句，成功時提交、例外時回滾。
+    :param db_path: SQLite 資料庫路徑
+    """
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def fetch_all(db_path: str, sql: str, params: tuple = ()) -> List[tuple]:
+    """以唯讀連線執行查詢並取回全部結果（含讀取時間）。"""
+    conn = get_connection(db_path, readonly=True)
+    cursor = conn.execute(sql, params)
+    start = time.perf_counter()
+    rows = cursor.fetchall()
+    _record_query(sql, time.perf_counter() - start, count=0)
+    return rows
+
+
+def fetch_one(db_path: str, sql: str, params: tuple = ()) -> Optional[tuple]:
+    """以唯讀連線執行查詢並取回第一筆結果。"""
+    return get_connection(db_path, readonly=True).execute(sql, params).fetchone()
+
+
+def get_query_stats() -> Dict[str, Dict[str, float]]:
+    """
+    取得本行程的查詢統計。
+    :return: {sql: {"count": 次數, "seconds": 累計秒數}}
+    """
+    with _stats_lock:
+        return {sql: {"count": int(c), "seconds": t} for sql, (c, t) in _query_stats.items()}
+
+
+def reset_query_stats():
+    with _stats_lock:
+        _query_stats.clear()
+
+
+def report_query_stats(top: int = 10):
+    """列印查詢次數與耗時（依耗時排序）。"""
+    stats = get_query_stats()
+    if not stats:
+        return
+    total_count = sum(s["count"] for s in stats.values())
+    total_seconds = sum(s["seconds"] for s in stats.values())
+    print(f"\n🗄 資料庫查詢統計：共 {total_count} 次，{total_seconds * 1000:.1f} ms")
+    for sql, s in sorted(stats.items(), key=lambda item: item[1]["seconds"], reverse=True)[:top]:
+        print(f"  {s['count']:>5} 次 {s['seconds'] * 1000:>8.2f} ms  {sql[:80]}")
+
+
+def normalize_draw_date(date_str: str) -> str:
+    """
+    將 "2025 04/08 "、"2025/ 04/08"、"2025-09-12"、"20250912" 等格式統一為 ISO 日期。
+    :param date_str: 原始日期字串
+    :return: YYYY-MM-DD
+    """
+    parts = re.findall(r"\d+", str(date_str))
+    if len(parts) == 1 and len(parts[0]) == 8:
+        parts = [parts[0][:4], parts[0][4:6], parts[0][6:]]
+    if len(parts) != 3:
+        raise ValueError(f"無法解析日期：{date_str!r}")
+    return date_cls(int(parts[0]), int(parts[1]), int(parts[2])).isoformat()
+
+
+def encode_draw(numbers: Iterable[int]) -> Tuple[int, ...]:
+    """
+    驗證一期開獎號碼並轉成資料表欄位值。
+    :param numbers: 5 個不重複、介於 1~39 的號碼
+    :return: (n1, n2, n3, n4, n5, mask)，號碼由小到大
+    """
+    numbers = sorted(set(int(n) for n in numbers))
+    if len(numbers) != NUMBERS_PER_DRAW or numbers[0] < 1 or numbers[-1] > NUM_BALLS:
+        raise ValueError(f"開獎號碼須為 {NUMBERS_PER_DRAW} 個不重複的 1~{NUM_BALLS}：{numbers}")
+    mask = 0
+    for n in numbers:
+        mask |= 1 << (n - 1)
+    return (*numbers, mask)
+
+
+def row_checksum(draw_date: str, mask: int) -> int:
+    """單期內容雜湊（與 lotto_meta 觸發器的計算相同）。"""
+    return ((mask % 1000000007) * 1000003 + int(draw_date.replace("-", ""))) % 1000000007
+
+
+def is_normalized(conn: sqlite3.Connection) -> bool:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(lotto_data)")}
+    return {"seq", "mask", *NUMBER_COLUMNS} <= columns
+
+
+def resequence_draws(conn: sqlite3.Connection):
+    """依日期重新編排期序（補登舊期數時使用）。"""
+    conn.execute(
+        "UPDATE lotto_data SET seq = (SELECT COUNT(*) FROM lotto_data AS prev WHERE prev.date <= lotto_data.date)"
+    )
+
+
+def upsert_draws(db_path: str, draws: List[Tuple[str, Iterable[int]]]) -> Dict[str, int]:
+    """
+    以單一交易批次寫入多期開獎（同日期則覆蓋），最後一次性整理期序。
+    :param db_path: SQLite 資料庫路徑
+    :param draws: List of (date, numbers)，日期格式不限
+    :return: {"inserted": 新增期數, "updated": 覆蓋期數}
+    """
+    rows = {}
+    for draw_date, numbers in draws:
+        rows[normalize_draw_date(draw_date)] = encode_draw(numbers)
+    if not rows:
+        return {"inserted": 0, "updated": 0}
+
+    dates = sorted(rows)
+    with transaction(db_path) as conn:
+        existing = {
+            row[0] for row in
+            conn.execute("SELECT date FROM lotto_data WHERE date BETWEEN ? AND ?", (dates[0], dates[-1])).fetchall()
+        }
+        latest_date, latest_seq = conn.execute("SELECT MAX(date), COALESCE(MAX(seq), 0) FROM lotto_data").fetchone()
+
+        new_dates = [d for d in dates if d not in existing]
+        appends_only = not latest_date or not new_dates or new_dates[0] > latest_date
+        next_seq = {d: latest_seq + i for i, d in enumerate(new_dates, start=1)}
+
+        conn.executemany(
+            """
+            INSERT INTO lotto_data (seq, date, n1, n2, n3, n4, n5, mask) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                n1 = excluded.n1, n2 = excluded.n2, n3 = excluded.n3,
+                n4 = excluded.n4, n5 = excluded.n5, mask = excluded.mask
+            """,
+            [(next_seq.get(d, 0), d, *rows[d]) for d in dates]
+        )
+        if not appends_only:
+            resequence_draws(conn)  # 含補登舊期數，期序需重排
+
+    return {"inserted": len(new_dates), "updated": len(dates) - len(new_dates)}
+
+
+def migrate_lotto_schema(db_path: str) -> int:
+    """
+    將舊版 lotto_data（自由格式日期 + 逗號字串號碼）改寫為正規化結構並建立索引。
+    已是新結構時僅補建索引。
+    :param db_path: SQLite 資料庫路徑
+    :return: 改寫的期數（已是新結構則為 0）
+    """
+    with transaction(db_path) as conn:
+        if is_normalized(conn):
+            for statement in LOTTO_SCHEMA[1:] + META_SCHEMA:
+                conn.execute(statement)
+            return 0
+
+        rows = conn.execute("SELECT id, date, numbers FROM lotto_data").fetchall()
+        records = {}
+        for row_id, raw_date, numbers_str in rows:
+            iso_date = normalize_draw_date(raw_date)
+            if iso_date in records:
+                raise ValueError(f"正規化後日期重複：{iso_date}")
+            records[iso_date] = (row_id, encode_draw(re.findall(r"\d+", numbers_str)))
+
+        conn.execute("ALTER TABLE lotto_data RENAME TO lotto_data_legacy")
+        conn.execute(LOTTO_SCHEMA[0])
+        conn.executemany(
+            "INSERT INTO lotto_data (id, seq, date, n1, n2, n3, n4, n5, mask) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (row_id, seq, iso_date, *encoded)
+                for seq, (iso_date, (row_id, encoded)) in enumerate(sorted(records.items()), start=1)
+            ]
+        )
+        conn.execute("DROP TABLE lotto_data_legacy")
+        for statement in LOTTO_SCHEMA[1:] + META_SCHEMA:
+            conn.execute(statement)
+    get_connection(db_path).execute("VACUUM")
+    return len(records)
+
+
+def get_latest_date(db_path: str) -> Optional[str]:
     """
     查詢資料庫中最新的日期。
     :param db_path: SQLite 資料庫路徑
     :return: 最新日期字串，若無資料則回傳 None
     """
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM lotto_data")
-        result = cursor.fetchone()
-        return result[0] if result else None
+    result = fetch_one(db_path, "SELECT MAX(date) FROM lotto_data")
+    return result[0] if result else None
+
+
+def get_latest_draw(db_path: str) -> Optional[Tuple[int, str]]:
+    """
+    查詢最新一期的期序與日期（走 seq 索引）。
+    :param db_path: SQLite 資料庫路徑
+    :return: (seq, date)，若無資料則回傳 None
+    """
+    return fetch_one(db_path, "SELECT seq, date FROM lotto_data ORDER BY seq DESC LIMIT 1")
+
+
+def get_db_watermark(db_path: str) -> Dict[str, Optional[object]]:
+    """
+    資料庫水位：最新期序 / 日期（seq 索引）與觸發器維護的內容檢查碼、修訂次數。
+    :param db_path: SQLite 資料庫路徑
+    :return: {"seq", "date", "checksum", "revision"}（未建立 lotto_meta 時檢查碼為 None）
+    """
+    latest = get_latest_draw(db_path) or (0, None)
+    try:
+        meta = dict(fetch_all(db_path, "SELECT key, value FROM lotto_meta"))
+    except sqlite3.OperationalError:
+        meta = {}
+    return {
+        "seq": latest[0],
+        "date": latest[1],
+        "checksum": meta.get("checksum"),
+        "revision": meta.get("revision"),
+    }
+
 
 def get_rows_by_date_range(db_path: str, start_date: str, end_date: str) -> List[Tuple[str, str]]:
     """
@@ -22,13 +376,12 @@ def get_rows_by_date_range(db_path: str, start_date: str, end_date: str) -> List
     :param end_date: 結束日期 (YYYY-MM-DD)
     :return: List of (date, numbers_str)
     """
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT date, numbers FROM lotto_data WHERE date BETWEEN ? AND ? ORDER BY date ASC",
-            (start_date, end_date)
-        )
-        return cursor.fetchall()
+    return fetch_all(
+        db_path,
+        f"SELECT date, {NUMBERS_SQL} FROM lotto_data WHERE date BETWEEN ? AND ? ORDER BY date ASC",
+        (start_date, end_date)
+    )
+
 
 def load_lotto_history(db_path: str, max_rows: int = 300) -> List[Tuple[str, str]]:
     """
@@ -37,11 +390,18 @@ def load_lotto_history(db_path: str, max_rows: int = 300) -> List[Tuple[str, str
     :param max_rows: 最多載入的期數
     :return: List of (date, numbers_str)
     """
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT date, numbers FROM lotto_data ORDER BY date DESC LIMIT ?",
-            (max_rows,)
-        )
-        rows = cursor.fetchall()
-        return rows[::-1]  # 反轉成由舊到新
\ No newline at end of file
+    rows = fetch_all(
+        db_path,
+        f"SELECT date, {NUMBERS_SQL} FROM lotto_data ORDER BY seq DESC LIMIT ?",
+        (max_rows,)
+    )
+    return rows[::-1]  # 反轉成由舊到新
+
+
+def load_all_draws(db_path: str) -> List[Tuple]:
+    """
+    載入資料庫中全部期數的樂透資料（由舊到新）。
+    :param db_path: SQLite 資料庫路徑
+    :return: List of (date, n1, n2, n3, n4, n5, mask)
+    """
+    return fetch_all(db_path, f"SELECT date, {', '.join(NUMBER_COLUMNS)}, mask FROM lotto_data ORDER BY seq ASC")
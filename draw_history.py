@@ -0,0 +1,135 @@
+# draw_history.py
+import os
+import json
+from typing import Dict, NamedTuple, Tuple
+import numpy as np
+from db_loader import NUM_BALLS, NUMBERS_PER_DRAW, load_all_draws
+
+DB_PATH = "lotto_data.db"
+CACHE_VERSION = 2
+
+# 📦 每期一筆紀錄：日期、5 個號碼、39 格命中矩陣、39-bit 位元遮罩
+HISTORY_DTYPE = np.dtype([
+    ("date", "U12"),
+    ("numbers", np.uint8, (NUMBERS_PER_DRAW,)),
+    ("hits", np.bool_, (NUM_BALLS,)),
+    ("mask", np.uint64),
+])
+
+
+class DrawHistory(NamedTuple):
+    dates: np.ndarray   # (期數,) 日期字串
+    draws: np.ndarray   # (期數, 5) uint8 開獎號碼
+    hits: np.ndarray    # (期數, 39) bool，第 k 欄代表號碼 k+1
+    masks: np.ndarray   # (期數,) uint64，bit k 代表號碼 k+1
+
+
+_memory_cache: Dict[str, Tuple[list, DrawHistory]] = {}
+
+
+def _sidecar_paths(db_path: str) -> Tuple[str, str]:
+    base = os.path.splitext(db_path)[0]
+    return f"{base}.draws.npy", f"{base}.draws.json"
+
+
+def _db_fingerprint(db_path: str) -> list:
+    """
+    以資料庫（含 WAL 檔）的修改時間與大小判斷內容是否變動。
+    :param db_path: SQLite 資料庫路徑
+    :return: 可序列化的指紋清單
+    """
+    fingerprint = [CACHE_VERSION]
+    for path in (db_path, f"{db_path}-wal"):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.extend([stat.st_mtime_ns, stat.st_size])
+    return fingerprint
+
+
+def _as_history(records: np.ndarray) -> DrawHistory:
+    return DrawHistory(records["date"], records["numbers"], records["hits"], records["mask"])
+
+
+def _build_records(db_path: str) -> np.ndarray:
+    rows = load_all_draws(db_path)
+    records = np.zeros(len(rows), dtype=HISTORY_DTYPE)
+    if not rows:
+        return records
+
+    dates, *columns, masks = zip(*rows)
+    records["date"] = dates
+    records["numbers"] = np.array(columns, dtype=np.uint8).T
+    records["mask"] = masks
+
+    offsets = records["numbers"].astype(np.intp) - 1
+    records["hits"][np.arange(len(rows))[:, None], offsets] = True
+    return records
+
+
+def _write_sidecar(db_path: str, records: np.ndarray, fingerprint: list):
+    npy_path, meta_path = _sidecar_paths(db_path)
+    tmp_npy = f"{npy_path}.tmp"
+    with open(tmp_npy, "wb") as f:
+        np.save(f, records)
+    os.replace(tmp_npy, npy_path)
+
+    tmp_meta = f"{meta_path}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "rows": len(records)}, f)
+    os.replace(tmp_meta, meta_path)
+
+
+def _read_sidecar(db_path: str, fingerprint: list):
+    npy_path, meta_path = _sidecar_paths(db_path)
+    if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("fingerprint") != fingerprint:
+            return None
+        records = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    return records if records.dtype == HISTORY_DTYPE else None
+
+
+def load_draw_history(db_path: str = DB_PATH, refresh: bool = False) -> DrawHistory:
+    """
+    載入全部開獎歷史（由舊到新），以記憶體映射的 sidecar 檔快取。
+    資料庫內容變動時才會重新查詢並解析。
+    :param db_path: SQLite 資料庫路徑
+    :param refresh: 是否強制重建快取
+    :return: DrawHistory(dates, draws, hits, masks)
+    """
+    key = os.path.abspath(db_path)
+    fingerprint = _db_fingerprint(db_path)
+
+    if not refresh:
+        cached = _memory_cache.get(key)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        records = _read_sidecar(db_path, fingerprint)
+        if records is not None:
+            history = _as_history(records)
+            _memory_cache[key] = (fingerprint, history)
+            return history
+
+    records = _build_records(db_path)
+    try:
+        _write_sidecar(db_path, records, fingerprint)
+    except OSError as e:
+        print(f"⚠️ 無法寫入開獎歷史快取：{e}")
+
+    history = _as_history(records)
+    _memory_cache[key] = (fingerprint, history)
+    return history
+
+
+def load_draws(db_path: str = DB_PATH) -> np.ndarray:
+    """
+    取得全部開獎號碼（由舊到新）。
+    :param db_path: SQLite 資料庫路徑
+    :return: (期數, 5) uint8 陣列
+    """
+    return load_draw_history(db_path).draws
@@ -0,0 +1,413 @@
+# feature_store.py
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from db_loader import NUM_BALLS, get_db_watermark
+from ml_feature_generator import (
+    GENERATOR_VERSION, FEATURE_CONFIG, feature_columns, column_dtype, date_categorical, checked_astype,
+    load_feature_state, feature_rows_from_state
+)
+
+DB_PATH = "lotto_data.db"
+FEATURE_STORE = "features"        # Parquet 資料集目錄，依年份分區：features/year=YYYY/part-0.parquet
+FEATURE_CSV = "features.csv"      # 選用的 CSV 匯出
+FEATURE_STATE = "features.state.npz"  # 增量更新用的滾動狀態（對應特徵庫最新一期之後）
+FEATURE_SET_ROOT = "feature_sets"     # 其他視窗設定的特徵集：feature_sets/<名稱>/，索引為 index.json
+META_COLUMNS = ["date", "number"]
+LABEL_COLUMN = "is_drawn"
+ROW_GROUP_DRAWS = 32              # 每個 row group 約 32 期，日期篩選可略過不需要的 row group
+
+
+def manifest_path(feature_path: str = FEATURE_STORE) -> str:
+    return f"{os.path.splitext(feature_path)[0]}.manifest.json"
+
+
+def expected_columns(config: Dict = FEATURE_CONFIG) -> List[str]:
+    return META_COLUMNS + feature_columns(config) + [LABEL_COLUMN]
+
+
+def config_from_json(data: Optional[Dict]) -> Dict:
+    """由 manifest / 索引中的 JSON 還原特徵設定（缺少時為預設設定）。"""
+    if not data:
+        return FEATURE_CONFIG
+    return {**data, "freq_windows": tuple(data["freq_windows"])}
+
+
+def schema_hash(columns: List[str]) -> str:
+    return hashlib.sha1(json.dumps(list(columns)).encode("utf-8")).hexdigest()[:16]
+
+
+def write_manifest(columns: List[str], rows: int, db_path: str = DB_PATH, feature_path: str = FEATURE_STORE,
+                   config: Optional[Dict] = None, watermark: Optional[Dict] = None) -> Dict:
+    """
+    記錄特徵表涵蓋到的資料庫水位、欄位結構與產生器版本。
+    :param columns: 特徵表欄位
+    :param rows: 特徵表筆數
+    :param config: 非預設的特徵設定（特徵集使用）
+    :param watermark: 產生特徵時的資料庫水位，預設即時查詢
+    :return: manifest 內容
+    """
+    watermark = watermark or get_db_watermark(db_path)
+    manifest = {
+        "last_seq": watermark["seq"],
+        "last_date": watermark["date"],
+        "db_checksum": watermark["checksum"],
+        "schema_hash": schema_hash(columns),
+        "generator_version": GENERATOR_VERSION,
+        "rows": int(rows),
+        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if config is not None:
+        manifest["config"] = {**config, "freq_windows": list(config["freq_windows"])}
+    path = manifest_path(feature_path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(feature_path: str = FEATURE_STORE) -> Optional[Dict]:
+    path = manifest_path(feature_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_schema_current(manifest: Dict) -> bool:
+    """manifest 的產生器版本與欄位結構是否與目前程式一致。"""
+    return (
+        manifest.get("generator_version") == GENERATOR_VERSION
+        and manifest.get("schema_hash") == schema_hash(expected_columns(config_from_json(manifest.get("config"))))
+    )
+
+
+def check_staleness(db_path: str = DB_PATH, feature_path: str = FEATURE_STORE) -> Tuple[bool, str]:
+    """
+    比對 manifest 與資料庫水位，判斷特徵表是否過期（不讀取特徵表本身）。
+    :return: (是否過期, 原因)
+    """
+    if not os.path.exists(feature_path):
+        return True, "特徵表不存在"
+    manifest = read_manifest(feature_path)
+    if manifest is None:
+        return True, "缺少特徵表 manifest"
+    if not manifest_schema_current(manifest):
+        return True, "特徵產生器版本或欄位結構變更"
+
+    watermark = get_db_watermark(db_path)
+    if watermark["checksum"] is None:
+        return True, "資料庫缺少內容檢查碼，請先執行 --mode migrate"
+    if (manifest.get("last_seq"), manifest.get("last_date")) != (watermark["seq"], watermark["date"]):
+        return True, f"資料庫期數變動（特徵表至 {manifest.get('last_date')}，資料庫至 {watermark['date']}）"
+    if manifest.get("db_checksum") != watermark["checksum"]:
+        return True, "資料庫內容已變動"
+    return False, ""
+
+
+# 📦 Parquet 特徵庫：宣告型別、依年份分區，讀取時可指定欄位與日期區間
+def _arrow_type(col: str) -> pa.DataType:
+    dtype = column_dtype(col)
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string(), ordered=True)
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def feature_schema(columns: List[str]) -> pa.Schema:
+    return pa.schema([pa.field(col, _arrow_type(col)) for col in columns])
+
+
+def enforce_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    將特徵表轉成宣告型別；數值超出型別範圍時拒絕寫入，避免默默溢位。
+    :param df: 特徵表
+    :return: 轉換後的 DataFrame（已符合者不複製）
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        dtype = column_dtype(col)
+        if dtype == "category":
+            if not (isinstance(series.dtype, pd.CategoricalDtype) and series.dtype.ordered):
+                series = pd.Series(date_categorical(series.astype(str)), index=df.index)
+        elif series.dtype != dtype:
+            series = pd.Series(checked_astype(series.to_numpy(), dtype, col), index=df.index)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _ordered_dates(df: pd.DataFrame) -> pd.DataFrame:
+    if "date" in df.columns:
+        dates = df["date"].astype("category").cat.remove_unused_categories()
+        df["date"] = dates.cat.reorder_categories(sorted(dates.cat.categories), ordered=True)
+    return df
+
+
+def _year_path(store_path: str, year: str) -> str:
+    return os.path.join(store_path, f"year={year}", "part-0.parquet")
+
+
+def _write_partition(path: str, table: pa.Table):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_DRAWS * NUM_BALLS, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    return pa.Table.from_pandas(df, schema=feature_schema(df.columns.tolist()), preserve_index=False)
+
+
+def write_features(df: pd.DataFrame, store_path: str = FEATURE_STORE, csv_path: Optional[str] = None):
+    """
+    以整份特徵表重建 Parquet 特徵庫（先寫入暫存目錄再替換）。
+    :param df: 特徵表（date, number, 特徵..., is_drawn），依日期排序
+    :param store_path: 特徵庫目錄
+    :param csv_path: 同時匯出 CSV 的路徑（None 表示不匯出）
+    """
+    df = enforce_schema(df)
+    tmp_dir = f"{store_path}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    years = df["date"].astype(str).str[:4]
+    for year, part in df.groupby(years, sort=True):
+        _write_partition(_year_path(tmp_dir, year), _to_table(part))
+
+    old_dir = f"{store_path}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(store_path):
+        os.replace(store_path, old_dir)
+    os.replace(tmp_dir, store_path)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    if csv_path:
+        df.to_csv(csv_path, index=False)
+
+
+def append_features(df_new: pd.DataFrame, store_path: str = FEATURE_STORE):
+    """
+    將新期數的特徵列併入對應年份的分區（只重寫該年份檔案）。
+    :param df_new: 新增的特徵列，日期須晚於特徵庫既有資料
+    :param store_path: 特徵庫目錄
+    """
+    df_new = enforce_schema(df_new)
+    years = df_new["date"].astype(str).str[:4]
+    for year, part in df_new.groupby(years, sort=True):
+        path = _year_path(store_path, year)
+        table = _to_table(part)
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=table.schema)
+            table = pa.concat_tables([existing, table]).unify_dictionaries()
+        _write_partition(path, table)
+
+
+def _date_filter(start: Optional[str], end: Optional[str]):
+    expr = None
+    if start:
+        expr = (ds.field("date") >= start) & (ds.field("year") >= int(start[:4]))
+    if end:
+        upper = (ds.field("date") <= end) & (ds.field("year") <= int(end[:4]))
+        expr = upper if expr is None else expr & upper
+    return expr
+
+
+def read_features(
+    columns: Optional[List[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store_path: str = FEATURE_STORE,
+) -> pd.DataFrame:
+    """
+    讀取特徵庫；只讀取指定欄位，並依年份分區與 row group 統計略過日期區間外的資料。
+    :param columns: 欲讀取的欄位（None 表示全部）
+    :param start: 起始日期（含），YYYY-MM-DD
+    :param end: 結束日期（含），YYYY-MM-DD
+    :param store_path: 特徵庫目錄
+    :return: DataFrame，依日期由舊到新
+    """
+    if not os.path.isdir(store_path):
+        raise FileNotFoundError(f"找不到特徵庫 {store_path}，請先執行特徵更新")
+    dataset = ds.dataset(store_path, format="parquet", partitioning="hive")
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != "year"]
+    table = dataset.to_table(columns=list(columns), filter=_date_filter(start, end))
+    return _ordered_dates(table.to_pandas())
+
+
+def latest_feature_date(store_path: str = FEATURE_STORE) -> Optional[str]:
+    """特徵庫最新日期（優先取 manifest，不需讀取資料）。"""
+    manifest = read_manifest(store_path)
+    if manifest and manifest.get("last_date"):
+        return manifest["last_date"]
+    dates = read_features(columns=["date"], store_path=store_path)["date"]
+    return dates.max() if len(dates) else None
+
+
+def read_latest_features(columns: Optional[List[str]] = None, store_path: str = FEATURE_STORE) -> pd.DataFrame:
+    """只讀取最新一期的特徵列。"""
+    latest_date = latest_feature_date(store_path)
+    return read_features(columns, start=latest_date, end=latest_date, store_path=store_path)
+
+
+# ⏳ 時點查詢：第 D 期的特徵只由 D 之前的開獎計算（ml_feature_generator 逐期下移），標籤為 D 期本身
+_date_index_cache: Dict[str, Tuple[int, np.ndarray]] = {}
+
+
+def date_index(store_path: str = FEATURE_STORE) -> np.ndarray:
+    """
+    特徵庫內所有期別日期（由舊到新），依 manifest 修改時間快取，不需每次掃描資料。
+    :return: 日期字串陣列
+    """
+    key = os.path.abspath(store_path)
+    path = manifest_path(store_path)
+    stamp = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    cached = _date_index_cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    dates = read_features(columns=["date"], store_path=store_path)["date"].cat.categories
+    index = np.asarray(dates, dtype=str)
+    _date_index_cache[key] = (stamp, index)
+    return index
+
+
+def features_as_of(as_of: str, columns: Optional[List[str]] = None, store_path: str = FEATURE_STORE,
+                   state_path: str = FEATURE_STATE) -> pd.DataFrame:
+    """
+    取得於 as_of 當天可用的 39 列特徵（只使用 as_of 之前的開獎）。
+    as_of 為開獎日時回傳該期；非開獎日回傳其後第一期（其特徵同樣只用到 as_of 之前的開獎）；
+    晚於特徵庫最新一期時，由滾動狀態算出下一期特徵，此時沒有標籤欄。
+    :param as_of: 日期 YYYY-MM-DD
+    :param columns: 欲讀取的欄位（None 表示全部）
+    :return: DataFrame（39 列）
+    """
+    index = date_index(store_path)
+    pos = np.searchsorted(index, as_of, side="left")
+    if pos < len(index):
+        day = str(index[pos])
+        return read_features(columns, start=day, end=day, store_path=store_path).reset_index(drop=True)
+
+    state = load_feature_state(state_path)
+    manifest = read_manifest(store_path)
+    if state is None or manifest is None or int(state["n_draws"]) != manifest.get("last_seq"):
+        raise ValueError("特徵庫與滾動狀態不一致，請先重新產生特徵表")
+    df = feature_rows_from_state(state, as_of, []).drop(columns=[LABEL_COLUMN])
+    df = enforce_schema(df)
+    return df if columns is None else df[[col for col in columns if col != LABEL_COLUMN]]
+
+
+def next_draw_date(store_path: str = FEATURE_STORE) -> str:
+    """特徵庫最新一期之後的下一期日期：今天（已晚於最新一期時）或最新一期的隔天。"""
+    last = latest_feature_date(store_path)
+    if last is None:
+        raise ValueError("特徵庫沒有任何期數，請先執行特徵更新")
+    following = (datetime.strptime(last, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    return max(following, datetime.today().strftime("%Y-%m-%d"))
+
+
+def next_draw_features(columns: Optional[List[str]] = None, store_path: str = FEATURE_STORE,
+                       state_path: str = FEATURE_STATE) -> pd.DataFrame:
+    """
+    尚未開出的下一期 39 列特徵（由滾動狀態算出，只用到已開出的各期，沒有標籤欄），即時選號的輸入。
+    特徵庫最新一期本身已開出，其標籤在以全部期數訓練的模型內，不適合作為選號對象。
+    """
+    return features_as_of(next_draw_date(store_path), columns, store_path, state_path)
+
+
+def features_between(start: Optional[str] = None, end: Optional[str] = None, columns: Optional[List[str]] = None,
+                     store_path: str = FEATURE_STORE) -> pd.DataFrame:
+    """取得 start ~ end（含）各期的特徵列；每列皆只使用該期之前的開獎。"""
+    return read_features(columns, start=start, end=end, store_path=store_path)
+
+
+def features_before(as_of: str, columns: Optional[List[str]] = None, store_path: str = FEATURE_STORE) -> pd.DataFrame:
+    """
+    取得 as_of 之前（不含）各期的特徵列與標籤，作為 as_of 當天的訓練資料。
+    :param as_of: 日期 YYYY-MM-DD
+    """
+    index = date_index(store_path)
+    pos = np.searchsorted(index, as_of, side="left")
+    if pos == 0:
+        return read_features(columns, store_path=store_path).iloc[:0]
+    return read_features(columns, end=str(index[pos - 1]), store_path=store_path)
+
+
+def export_features_csv(csv_path: str = FEATURE_CSV, store_path: str = FEATURE_STORE) -> int:
+    """
+    將特徵庫匯出為 CSV（供外部工具使用）。
+    :return: 匯出筆數
+    """
+    df = read_features(store_path=store_path)
+    df.to_csv(csv_path, index=False)
+    print(f"✅ 特徵表已匯出：{csv_path}（{len(df)} 筆）")
+    return len(df)
+
+
+# 🗂 特徵集：以不同視窗 / 門檻設定產生的具名特徵庫（modules_feature_variants.py 建立）
+def feature_set_index_path(root: str = FEATURE_SET_ROOT) -> str:
+    return os.path.join(root, "index.json")
+
+
+def list_feature_sets(root: str = FEATURE_SET_ROOT) -> Dict[str, Dict]:
+    """
+    列出已建立的特徵集。
+    :return: {名稱: {"version", "config", "rows", "path", "updated_at"}}
+    """
+    path = feature_set_index_path(root)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def feature_set_path(name: Optional[str] = None, root: str = FEATURE_SET_ROOT) -> str:
+    """
+    特徵集對應的特徵庫目錄；name 為 None 時回傳預設特徵庫。
+    :raises KeyError: 找不到該名稱的特徵集
+    """
+    if name is None:
+        return FEATURE_STORE
+    sets = list_feature_sets(root)
+    if name not in sets:
+        raise KeyError(f"找不到特徵集 {name}，可用：{', '.join(sorted(sets)) or '（無）'}")
+    return sets[name]["path"]
+
+
+# 🧮 模型輸入與記憶體報告
+def model_matrix(df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    取出模型特徵欄並轉為 float32（XGBoost 內部即以 float32 運算，避免再轉一次）。
+    :param df: 特徵表
+    :param columns: 特徵欄位，預設為 date / number / is_drawn 以外的欄位
+    """
+    if columns is None:
+        columns = [col for col in df.columns if col not in META_COLUMNS + [LABEL_COLUMN]]
+    return df[list(columns)].astype(np.float32)
+
+
+def model_labels(df: pd.DataFrame) -> pd.Series:
+    return df[LABEL_COLUMN].astype(np.int8)
+
+
+def memory_report(tables: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    列出各資料表實際佔用的記憶體（含 category / 字串內容）。
+    :param tables: {名稱: DataFrame}
+    :return: DataFrame(table, rows, columns, mb)
+    """
+    rows = []
+    for name, df in tables.items():
+        mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+        rows.append({"table": name, "rows": len(df), "columns": df.shape[1], "mb": round(mb, 2)})
+        print(f"🧠 {name}：{len(df)} 列 × {df.shape[1]} 欄，{mb:.2f} MB")
+    return pd.DataFrame(rows)
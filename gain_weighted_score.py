@@ -1,41 +1,15 @@
-import pandas as pd
-from xgboost import XGBClassifier
+from feature_store import next_draw_features
+from model_registry import get_model
+from score_kernels import weighted_score
 
-FEATURE_CSV = "features.csv"
-TARGET_COLUMN = "is_drawn"
+# 📦 載入資料：尚未開出的下一期
+latest_df = next_draw_features()
 
-# 📦 載入資料
-df = pd.read_csv(FEATURE_CSV)
-latest_date = df["date"].max()
-latest_df = df[df["date"] == latest_date].copy()
+# 🧠 取得模型與 gain 作為加權係數（已登錄時不重訓）
+model, gain_dict = get_model()
 
-# 🧪 準備訓練資料
-X = df.drop(columns=["date", "number", TARGET_COLUMN])
-y = df[TARGET_COLUMN]
-
-# 🧠 訓練模型
-model = XGBClassifier(
-    n_estimators=100,
-    max_depth=6,
-    learning_rate=0.1,
-    scale_pos_weight=6,
-    eval_metric="logloss",
-    random_state=42
-)
-model.fit(X, y)
-
-# 📊 取得 gain 作為加權係數
-gain_dict = model.get_booster().get_score(importance_type='gain')
-
-# 🔧 計算每個號碼的加權分數
-def compute_score(row):
-    score = 0
-    for feature, gain in gain_dict.items():
-        if feature in row:
-            score += gain * row[feature]
-    return score
-
-latest_df["gain_score"] = latest_df.apply(compute_score, axis=1)
+# 🔧 計算每個號碼的加權分數（gain 對齊成權重向量，一次矩陣乘法）
+latest_df["gain_score"] = weighted_score(latest_df, gain_dict)
 
 # 🔝 選出分數最高的前 N 個號碼
 selected = latest_df.sort_values(by="gain_score", ascending=False).head(10)
@@ -0,0 +1,248 @@
+# head_tail_trainer.py
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.multioutput import MultiOutputClassifier
+from db_loader import get_db_watermark
+from draw_history import load_draws
+from model_artifacts import (
+    ArtifactNotFoundError, artifact_dir, has_artifact, list_artifacts, load_artifact, prune_artifacts, save_artifact,
+    tuned_params,
+)
+from model_registry import TRAIN_CONFIG
+
+DB_PATH = "lotto_data.db"
+ARTIFACT_KIND = "head_tail"  # 版本目錄：models/head_tail/<版本>/{tail,head}.joblib
+LOOKBACK = 5
+LOOKBACK_RANGE = range(3, 11)  # 預測頁回溯期數滑桿範圍
+# 重訓時除預設回溯期數外一併訓練的回溯期數（逗號分隔，預設無）；其餘滑桿值於預測時第一次使用才訓練
+RETRAIN_LOOKBACKS = tuple(
+    int(value) for value in os.environ.get("LOTTO_HEAD_TAIL_LOOKBACKS", "").split(",") if value.strip()
+)
+KINDS = ("tail", "head")
+
+# ⚙️ 頭尾模型超參數（run_tail_model / run_head_model / 預測 / 重訓共用）
+RF_PARAMS = {
+    "n_estimators": 100,
+    "random_state": 42,
+}
+
+
+def default_head_tail() -> Tuple[int, Dict]:
+    """未指定時使用的回溯期數與超參數：有以 --promote-tuned 採用的調參結果時為其最佳設定，否則為 LOOKBACK / RF_PARAMS。"""
+    tuned = tuned_params("rf")
+    return (int(tuned["lookback"]), tuned["params"]) if tuned else (LOOKBACK, RF_PARAMS)
+
+
+def retrain_lookbacks() -> List[int]:
+    """重訓時訓練的回溯期數：預設（或調參選出）的回溯期數加上 RETRAIN_LOOKBACKS。"""
+    return sorted({default_head_tail()[0], *RETRAIN_LOOKBACKS})
+
+
+class HeadTailModels(NamedTuple):
+    tail: MultiOutputClassifier
+    head: MultiOutputClassifier
+    version: str
+    lookback: int
+
+
+# 🧮 頭尾出現矩陣與回溯資料集：號碼→頭/尾查表一次索引，X 為共用記憶體的滑動視窗 view
+NUMBER_GROUPS = {
+    "tail": np.arange(40, dtype=np.intp) % 10,
+    "head": np.arange(40, dtype=np.intp) // 10,
+}
+GROUP_SIZES = {"tail": 10, "head": 4}
+
+
+def build_matrix(draws, mode="tail"):
+    """
+    各期頭數 / 尾數出現矩陣。
+    :param draws: (期數, 5) 開獎號碼
+    :param mode: 'tail'（0~9）或 'head'（0~3）
+    :return: (期數, 10 或 4) uint8，C 連續
+    """
+    if mode not in NUMBER_GROUPS:
+        raise ValueError("mode 必須是 'tail' 或 'head'")
+    draws = np.asarray(draws, dtype=np.intp)
+    matrix = np.zeros((len(draws), GROUP_SIZES[mode]), dtype=np.uint8)
+    if len(draws):
+        matrix[np.arange(len(draws))[:, None], NUMBER_GROUPS[mode][draws]] = 1
+    return matrix
+
+
+def build_dataset(matrix, lookback=5):
+    """
+    回溯資料集：X[i] 為第 i ~ i+lookback-1 期攤平，y[i] 為第 i+lookback 期。
+    矩陣為 C 連續時，連續 lookback 列在記憶體中本就相鄰，
+    X 以 sliding_window_view 取攤平後每 k 個元素起始的視窗，不複製資料。
+    :param matrix: (期數, k) 出現矩陣
+    :param lookback: 回溯期數
+    :return: (X view (期數-lookback, lookback*k), y view (期數-lookback, k))
+    """
+    matrix = np.ascontiguousarray(matrix)
+    n, k = matrix.shape
+    if n <= lookback:
+        return np.empty((0, lookback * k), dtype=matrix.dtype), np.empty((0, k), dtype=matrix.dtype)
+    X = sliding_window_view(matrix.ravel(), lookback * k)[::k][: n - lookback]
+    return X, matrix[lookback:]
+
+
+def build_datasets(matrix, lookbacks: Iterable[int]) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    一次產生多個回溯期數的資料集，全部為同一矩陣上的 view。
+    :return: {lookback: (X, y)}
+    """
+    matrix = np.ascontiguousarray(matrix)
+    return {lookback: build_dataset(matrix, lookback) for lookback in lookbacks}
+
+
+def latest_window(matrix, lookback=5):
+    """最新 lookback 期攤平成一列，作為下一期的預測輸入。"""
+    return np.ascontiguousarray(matrix[-lookback:]).reshape(1, -1)
+
+
+def head_tail_version(watermark: Dict, lookback: int = LOOKBACK, params: Dict = RF_PARAMS) -> str:
+    """
+    頭尾模型版本：資料庫水位 + 回溯期數 + 超參數，任一變動即為新版本。
+    :param watermark: get_db_watermark() 的結果
+    """
+    payload = {
+        "seq": watermark.get("seq"),
+        "checksum": watermark.get("checksum"),
+        "lookback": lookback,
+        "params": params,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _fit(X: np.ndarray, y: np.ndarray, params: Dict, n_jobs: int) -> MultiOutputClassifier:
+    model = MultiOutputClassifier(RandomForestClassifier(**params, n_jobs=n_jobs))
+    model.fit(X, y)
+    return model
+
+
+def _load_version(version: str, lookback: int) -> HeadTailModels:
+    objects, _ = load_artifact(ARTIFACT_KIND, version)
+    return HeadTailModels(objects["tail"], objects["head"], version, lookback)
+
+
+def train_head_tail_lookbacks(
+    lookbacks: Iterable[int] = LOOKBACK_RANGE,
+    db_path: str = DB_PATH,
+    params: Optional[Dict] = None,
+    force: bool = False,
+) -> Dict[int, HeadTailModels]:
+    """
+    以共用的開獎矩陣訓練多個回溯期數的尾數與頭數模型，存成版本化的 artifact。
+    出現矩陣只建一次，各回溯期數的資料集皆為其上的 view；
+    相同資料、回溯期數與超參數的版本已存在時直接載入，不重訓。訓練後刪除舊資料水位的版本（見 prune_head_tail）。
+    :param lookbacks: 回溯期數清單
+    :param db_path: SQLite 資料庫路徑
+    :param params: RandomForest 超參數（None 表示 default_head_tail() 的超參數）
+    :param force: 強制重訓
+    :return: {lookback: HeadTailModels(tail, head, version, lookback)}
+    """
+    params = params or default_head_tail()[1]
+    watermark = get_db_watermark(db_path)
+    result, pending = {}, []
+    for lookback in lookbacks:
+        version = head_tail_version(watermark, lookback, params)
+        if force or not has_artifact(ARTIFACT_KIND, version):
+            pending.append((lookback, version))
+        else:
+            result[lookback] = _load_version(version, lookback)
+    if not pending:
+        return result
+
+    draws = load_draws(db_path)
+    datasets = {
+        kind: build_datasets(build_matrix(draws, mode=kind), [lookback for lookback, _ in pending])
+        for kind in KINDS
+    }
+
+    # 🧵 同一回溯期數的頭尾兩個模型同時訓練，執行緒數均分給兩座森林，合計不超過 n_jobs
+    n_jobs = max(1, TRAIN_CONFIG["n_jobs"] // len(KINDS))
+    with ThreadPoolExecutor(max_workers=len(KINDS)) as pool:
+        for lookback, version in pending:
+            started = time.perf_counter()
+            futures = {kind: pool.submit(_fit, *datasets[kind][lookback], params, n_jobs) for kind in KINDS}
+            fitted = {kind: future.result() for kind, future in futures.items()}
+            seconds = round(time.perf_counter() - started, 3)
+
+            models = HeadTailModels(fitted["tail"], fitted["head"], version, lookback)
+            path = save_artifact(ARTIFACT_KIND, version, fitted, {
+                "lookback": lookback,
+                "params": params,
+                "db_seq": watermark["seq"],
+                "db_checksum": watermark["checksum"],
+                "draws": len(draws),
+                "n_jobs": n_jobs,
+                "seconds": seconds,
+            })
+            result[lookback] = models
+            print(f"🔮 頭尾模型已訓練並儲存：{path}（回溯 {lookback} 期，{seconds:.1f} 秒）")
+    prune_head_tail(watermark)
+    return result
+
+
+def prune_head_tail(watermark: Dict) -> List[str]:
+    """
+    刪除以舊資料庫水位訓練的頭尾模型版本（每版數百 MB，新開獎後即被取代）；目前水位的版本全部保留。
+    被刪除的非預設回溯期數於下次使用時重新訓練。
+    :param watermark: get_db_watermark() 的結果
+    :return: 已刪除的版本
+    """
+    current = [meta["version"] for meta in list_artifacts(
+        ARTIFACT_KIND, db_seq=watermark["seq"], db_checksum=watermark["checksum"]
+    )]
+    removed = prune_artifacts(ARTIFACT_KIND, current)
+    if removed:
+        print(f"🧹 已刪除 {len(removed)} 個舊資料的頭尾模型版本")
+    return removed
+
+
+def train_head_tail(
+    db_path: str = DB_PATH,
+    lookback: Optional[int] = None,
+    params: Optional[Dict] = None,
+    force: bool = False,
+) -> HeadTailModels:
+    """
+    取得單一回溯期數的頭尾模型（見 train_head_tail_lookbacks；未指定時使用 default_head_tail()）。
+    :return: HeadTailModels(tail, head, version, lookback)
+    """
+    lookback = lookback or default_head_tail()[0]
+    return train_head_tail_lookbacks([lookback], db_path, params, force)[lookback]
+
+
+def load_head_tail(db_path: str = DB_PATH, lookback: Optional[int] = None,
+                   params: Optional[Dict] = None) -> HeadTailModels:
+    """
+    預測路徑使用：只載入已訓練的頭尾模型，不重訓。
+    未指定回溯期數 / 超參數時使用 default_head_tail()（有調參結果時為最佳設定）。
+    目前資料的版本不存在時改用相同回溯期數與超參數的最新版本，再退而使用相同回溯期數的最新版本，並提示重訓。
+    :raises ArtifactNotFoundError: 該回溯期數從未訓練過
+    :return: HeadTailModels(tail, head, version, lookback)
+    """
+    default_lookback, default_params = default_head_tail()
+    lookback, params = lookback or default_lookback, params or default_params
+    version = head_tail_version(get_db_watermark(db_path), lookback, params)
+    if has_artifact(ARTIFACT_KIND, version):
+        return _load_version(version, lookback)
+    for match in ({"lookback": lookback, "params": params}, {"lookback": lookback}):
+        try:
+            objects, meta = load_artifact(ARTIFACT_KIND, **match)
+            break
+        except ArtifactNotFoundError:
+            continue
+    else:
+        raise ArtifactNotFoundError(f"找不到回溯 {lookback} 期的頭尾模型（{artifact_dir(ARTIFACT_KIND)}），請先執行 --mode retrain")
+    print(f"⚠️ 頭尾模型 {meta['version']} 訓練於資料庫第 {meta.get('db_seq')} 期（超參數 {meta.get('params')}），"
+          f"與目前資料 / 設定不符，請執行 --mode retrain")
+    return HeadTailModels(objects["tail"], objects["head"], meta["version"], lookback)
@@ -0,0 +1,284 @@
+# ml_feature_generator.py
+import os
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from draw_history import load_draw_history, DrawHistory
+from db_loader import NUM_BALLS
+
+GENERATOR_VERSION = "2"  # 特徵定義變更時遞增，使既有特徵表失效
+
+REQUIRED_COLUMNS = [
+    "draw_streak", "last_draw_gap", "cooldown", "momentum",
+    "freq_10", "freq_20", "freq_30", "tail_digit", "zone",
+    "tail_freq_10", "is_hot_tail", "streak_cooldown_combo", "is_recent_hot"
+]
+
+# ⚙️ 視窗與熱門門檻（預設值產生 REQUIRED_COLUMNS）
+FEATURE_CONFIG = {
+    "freq_windows": (10, 20, 30),
+    "momentum_window": 10,
+    "tail_window": 10,
+    "hot_tail_threshold": 6,     # 同尾數號碼近 tail_window 期合計出現次數
+    "recent_hot_threshold": 3,   # 近 freq_windows[0] 期出現次數
+}
+
+# 🧱 特徵表欄位型別：號碼與計數皆為小整數，旗標與標籤為 bool，日期為有序 category
+FEATURE_DTYPES = {
+    "number": np.int8,
+    "draw_streak": np.int16,
+    "last_draw_gap": np.int16,
+    "cooldown": np.int16,
+    "momentum": np.int8,
+    "tail_digit": np.int8,
+    "zone": np.int8,
+    "is_hot_tail": np.bool_,
+    "streak_cooldown_combo": np.int16,
+    "is_recent_hot": np.bool_,
+    "is_drawn": np.bool_,
+}
+
+
+def column_dtype(col: str):
+    """特徵表欄位的宣告型別（date 回傳 "category"）。"""
+    if col == "date":
+        return "category"
+    if col in FEATURE_DTYPES:
+        return FEATURE_DTYPES[col]
+    if col.startswith(("freq_", "tail_freq_")):
+        # 視窗次數上限：單一號碼 w 次；同尾數最多 4 個號碼，4w 次
+        window = int(col.rsplit("_", 1)[1])
+        bound = 4 * window if col.startswith("tail_freq_") else window
+        return np.int8 if bound <= np.iinfo(np.int8).max else np.int16
+    raise KeyError(f"未宣告型別的特徵欄位：{col}")
+
+
+def checked_astype(values: np.ndarray, dtype, col: str) -> np.ndarray:
+    """轉成宣告型別；數值超出型別範圍時拋出 ValueError，避免默默溢位。"""
+    values = np.asarray(values)
+    if values.dtype == dtype or len(values) == 0:
+        return values.astype(dtype, copy=False)
+    if np.dtype(dtype) == np.bool_:
+        valid = np.isin(values, (0, 1)).all()
+    else:
+        info = np.iinfo(dtype)
+        valid = values.min() >= info.min and values.max() <= info.max
+    if not valid:
+        raise ValueError(f"欄位 {col} 的數值超出宣告型別 {np.dtype(dtype).name} 的範圍")
+    return values.astype(dtype)
+
+
+def date_categorical(dates, repeats: int = 1) -> pd.Categorical:
+    """以有序 category 表示日期（每期重複 repeats 列），比字串欄位省下大量記憶體。"""
+    dates = np.asarray(dates, dtype=str)
+    categories = np.unique(dates)
+    codes = np.searchsorted(categories, dates)
+    return pd.Categorical.from_codes(np.repeat(codes, repeats), categories=categories, ordered=True)
+
+
+NUMBERS = np.arange(1, NUM_BALLS + 1)
+TAIL_DIGITS = NUMBERS % 10
+ZONES = (NUMBERS - 1) // 10 + 1
+
+
+def feature_columns(config: Dict = FEATURE_CONFIG) -> list:
+    """依設定產生的特徵欄位順序（預設即 REQUIRED_COLUMNS）。"""
+    windows = config["freq_windows"]
+    return (
+        ["draw_streak", "last_draw_gap", "cooldown", "momentum"]
+        + [f"freq_{w}" for w in windows]
+        + ["tail_digit", "zone", f"tail_freq_{config['tail_window']}", "is_hot_tail",
+           "streak_cooldown_combo", "is_recent_hot"]
+    )
+
+
+def _shift_down(values: np.ndarray, fill: int) -> np.ndarray:
+    """第 i 列改放第 i-1 列的值，使每期特徵只用到該期之前的開獎。"""
+    shifted = np.empty_like(values)
+    shifted[0] = fill
+    shifted[1:] = values[:-1]
+    return shifted
+
+
+def _assemble_features(draw_streak, last_draw_gap, cooldown, window_count, hits, config: Dict) -> Dict[str, np.ndarray]:
+    """由基本計數組出全部特徵欄位；window_count(w) 回傳近 w 期出現次數。"""
+    features = {
+        "draw_streak": draw_streak,
+        "last_draw_gap": last_draw_gap,
+        "cooldown": cooldown,
+    }
+    m = config["momentum_window"]
+    recent = window_count(m)
+    features["momentum"] = recent - (window_count(2 * m) - recent)
+
+    for w in config["freq_windows"]:
+        features[f"freq_{w}"] = window_count(w)
+
+    features["tail_digit"] = np.broadcast_to(TAIL_DIGITS, hits.shape)
+    features["zone"] = np.broadcast_to(ZONES, hits.shape)
+
+    tail_onehot = (TAIL_DIGITS[:, None] == np.arange(10)).astype(np.int32)
+    tail_window = config["tail_window"]
+    tail_freq = (window_count(tail_window) @ tail_onehot)[:, TAIL_DIGITS]
+    features[f"tail_freq_{tail_window}"] = tail_freq
+    features["is_hot_tail"] = (tail_freq >= config["hot_tail_threshold"]).astype(np.int32)
+    features["streak_cooldown_combo"] = draw_streak - cooldown
+    features["is_recent_hot"] = (
+        window_count(config["freq_windows"][0]) >= config["recent_hot_threshold"]
+    ).astype(np.int32)
+
+    features["is_drawn"] = hits.astype(np.int32)
+    return features
+
+
+def compute_feature_arrays(hits: np.ndarray, config: Dict = FEATURE_CONFIG) -> Dict[str, np.ndarray]:
+    """
+    由 期數×39 命中矩陣一次算出所有特徵（第 i 列只使用第 i 期之前的開獎）。
+    :param hits: (期數, 39) bool 命中矩陣，由舊到新
+    :param config: 視窗與門檻設定
+    :return: {欄位名稱: (期數, 39) 陣列}，含標籤 is_drawn
+    """
+    hits = np.asarray(hits, dtype=bool)
+    n_draws = len(hits)
+    idx = np.arange(n_draws, dtype=np.int32)[:, None]
+
+    # 📈 累積和：第 i 列 = 前 i 期的出現次數
+    counts = np.zeros((n_draws + 1, NUM_BALLS), dtype=np.int32)
+    np.cumsum(hits, axis=0, out=counts[1:])
+
+    def window_count(w: int) -> np.ndarray:
+        start = np.maximum(np.arange(n_draws) - w, 0)
+        return counts[:-1] - counts[start]
+
+    # ⏱ 最近一次出現 / 未出現的位置（-1 表示尚未發生）
+    last_hit = _shift_down(np.maximum.accumulate(np.where(hits, idx, -1), axis=0), -1)
+    last_miss_incl = np.maximum.accumulate(np.where(hits, -1, idx), axis=0)
+
+    cooldown = idx - 1 - last_hit
+    draw_streak = _shift_down(idx - last_miss_incl, 0)
+
+    # 每次出現與前一次出現的間隔，向後延用到下一次出現
+    gap_at_hit = np.where(hits & (last_hit >= 0), idx - last_hit, 0)
+    last_draw_gap = np.where(
+        last_hit >= 0,
+        np.take_along_axis(gap_at_hit, np.maximum(last_hit, 0), axis=0),
+        0
+    )
+    return _assemble_features(draw_streak, last_draw_gap, cooldown, window_count, hits, config)
+
+
+def build_feature_frame(history: DrawHistory, max_rows: int = None, config: Dict = FEATURE_CONFIG) -> pd.DataFrame:
+    """
+    將特徵陣列攤平成每期每號一列的 DataFrame（date, number, 特徵..., is_drawn）。
+    :param history: 開獎歷史
+    :param max_rows: 只輸出最近幾期（特徵仍以全部歷史計算）
+    :param config: 視窗與門檻設定
+    """
+    arrays = compute_feature_arrays(history.hits, config)
+    start = 0 if max_rows is None else max(len(history.dates) - max_rows, 0)
+    n_dates = len(history.dates) - start
+
+    data = {
+        "date": date_categorical(history.dates[start:], NUM_BALLS),
+        "number": np.tile(NUMBERS, n_dates).astype(FEATURE_DTYPES["number"]),
+    }
+    for col in feature_columns(config) + ["is_drawn"]:
+        data[col] = checked_astype(arrays.pop(col)[start:].ravel(), column_dtype(col), col)
+    return pd.DataFrame(data)
+
+
+def generate_features(db_path: str, max_rows: int = 5000, config: Dict = FEATURE_CONFIG) -> pd.DataFrame:
+    """
+    產生每期每號的特徵表。
+    :param db_path: SQLite 資料庫路徑
+    :param max_rows: 只輸出最近幾期
+    :param config: 視窗與門檻設定
+    :return: DataFrame（date, number, REQUIRED_COLUMNS..., is_drawn）
+    """
+    return build_feature_frame(load_draw_history(db_path), max_rows=max_rows, config=config)
+
+
+# 🔁 增量更新：只保留各號碼的冷卻 / 連開 / 間隔計數與最近數期命中，新增一期的成本與歷史長度無關
+def _state_window(config: Dict) -> int:
+    return max(max(config["freq_windows"]), 2 * config["momentum_window"], config["tail_window"])
+
+
+def init_feature_state(history: DrawHistory, config: Dict = FEATURE_CONFIG) -> Dict[str, np.ndarray]:
+    """
+    由完整歷史建立滾動狀態（代表「下一期」的特徵基礎）。
+    :param history: 開獎歷史
+    :param config: 視窗與門檻設定
+    """
+    hits = np.asarray(history.hits, dtype=bool)
+    arrays = compute_feature_arrays(np.vstack([hits, np.zeros((1, NUM_BALLS), dtype=bool)]), config)
+
+    window = _state_window(config)
+    recent = np.zeros((window, NUM_BALLS), dtype=bool)
+    tail = hits[-window:]
+    recent[window - len(tail):] = tail
+    return {
+        "n_draws": np.int64(len(hits)),
+        "last_date": np.str_(history.dates[-1] if len(hits) else ""),
+        "cooldown": arrays["cooldown"][-1].astype(np.int32),
+        "draw_streak": arrays["draw_streak"][-1].astype(np.int32),
+        "last_draw_gap": arrays["last_draw_gap"][-1].astype(np.int32),
+        "recent": recent,
+    }
+
+
+def _hit_row(drawn_numbers) -> np.ndarray:
+    row = np.zeros(NUM_BALLS, dtype=bool)
+    row[[int(n) - 1 for n in drawn_numbers]] = True
+    return row
+
+
+def feature_rows_from_state(state: Dict, draw_date: str, drawn_numbers, config: Dict = FEATURE_CONFIG) -> pd.DataFrame:
+    """
+    以滾動狀態計算新一期的 39 列特徵（含該期標籤）。
+    :param state: init_feature_state / advance_feature_state 的結果
+    :param draw_date: 新一期日期
+    :param drawn_numbers: 新一期開獎號碼
+    """
+    recent = state["recent"]
+
+    def window_count(w: int) -> np.ndarray:
+        return recent[len(recent) - w:].sum(axis=0, dtype=np.int32)[None, :]
+
+    hits = _hit_row(drawn_numbers)[None, :]
+    arrays = _assemble_features(
+        state["draw_streak"][None, :], state["last_draw_gap"][None, :], state["cooldown"][None, :],
+        window_count, hits, config
+    )
+    data = {"date": date_categorical([draw_date], NUM_BALLS), "number": NUMBERS.astype(FEATURE_DTYPES["number"])}
+    for col in feature_columns(config) + ["is_drawn"]:
+        data[col] = checked_astype(arrays[col][0], column_dtype(col), col)
+    return pd.DataFrame(data)
+
+
+def advance_feature_state(state: Dict, draw_date: str, drawn_numbers) -> Dict[str, np.ndarray]:
+    """將新一期開獎併入滾動狀態。"""
+    hit = _hit_row(drawn_numbers)
+    cooldown = state["cooldown"]
+    seen_before = cooldown < state["n_draws"]  # 冷卻期數等於總期數代表從未出現
+    return {
+        "n_draws": np.int64(state["n_draws"] + 1),
+        "last_date": np.str_(draw_date),
+        "cooldown": np.where(hit, 0, cooldown + 1).astype(np.int32),
+        "draw_streak": np.where(hit, state["draw_streak"] + 1, 0).astype(np.int32),
+        "last_draw_gap": np.where(hit, np.where(seen_before, cooldown + 1, 0), state["last_draw_gap"]).astype(np.int32),
+        "recent": np.vstack([state["recent"][1:], hit[None, :]]),
+    }
+
+
+def save_feature_state(path: str, state: Dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **state)
+    os.replace(tmp_path, path)
+
+
+def load_feature_state(path: str) -> Optional[Dict[str, np.ndarray]]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
@@ -0,0 +1,188 @@
+# model_artifacts.py
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import joblib
+import numpy as np
+import sklearn
+
+# 📁 所有模型檔案的根目錄：固定在專案目錄下，不隨執行時的工作目錄改變
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.environ.get("LOTTO_MODEL_DIR", os.path.join(BASE_DIR, "models"))
+META_FILE = "meta.json"
+TUNING_KIND = "tuning"  # --mode tune 的最佳設定（見 modules_tune）
+
+_loaded: Dict[Tuple[str, str], Dict[str, object]] = {}
+_lock = threading.Lock()
+
+
+class ArtifactNotFoundError(FileNotFoundError):
+    """找不到模型檔案；預測路徑不自行重訓，請先執行重訓。"""
+
+
+def artifact_dir(kind: str, version: Optional[str] = None) -> str:
+    """
+    模型類別（或特定版本）的目錄：models/<kind>/<version>/。
+    :param kind: 模型類別，例如 head_tail、registry、dmatrix
+    :param version: 版本（None 表示類別根目錄）
+    """
+    base = os.path.join(MODEL_DIR, kind)
+    return base if version is None else os.path.join(base, version)
+
+
+def _library_versions() -> Dict[str, str]:
+    return {"sklearn": sklearn.__version__, "joblib": joblib.__version__, "numpy": np.__version__}
+
+
+def _temp_path(target: str) -> str:
+    """同目錄下唯一命名的暫存檔（服務多個執行緒同時儲存同一版本時不共用暫存檔）。"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=f"{os.path.basename(target)}.", suffix=".tmp")
+    os.close(fd)
+    return tmp_path
+
+
+def save_artifact(kind: str, version: str, objects: Dict[str, object], meta: Optional[Dict] = None) -> str:
+    """
+    儲存一個版本的模型檔案（joblib 不壓縮，可記憶體映射載入）與版本資訊。
+    :param kind: 模型類別
+    :param version: 版本
+    :param objects: {檔名（不含副檔名）: 物件}
+    :param meta: 額外的版本資訊
+    :return: 版本目錄
+    """
+    path = artifact_dir(kind, version)
+    os.makedirs(path, exist_ok=True)
+    for name, obj in objects.items():
+        target = os.path.join(path, f"{name}.joblib")
+        tmp_path = _temp_path(target)
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, target)
+
+    full_meta = {
+        **(meta or {}),
+        "kind": kind,
+        "version": version,
+        "files": sorted(objects),
+        "libraries": _library_versions(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    meta_path = os.path.join(path, META_FILE)
+    tmp_meta = _temp_path(meta_path)
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(full_meta, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_meta, meta_path)
+
+    with _lock:
+        _loaded[(kind, version)] = dict(objects)
+    return path
+
+
+def read_artifact_meta(kind: str, version: str) -> Optional[Dict]:
+    meta_path = os.path.join(artifact_dir(kind, version), META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_artifacts(kind: str, **match) -> List[Dict]:
+    """
+    列出某類別的所有版本資訊（由舊到新），可依版本資訊欄位篩選。
+    :param match: 欄位需相等的條件，例如 lookback=5
+    """
+    base = artifact_dir(kind)
+    if not os.path.isdir(base):
+        return []
+    metas = []
+    for version in os.listdir(base):
+        meta = read_artifact_meta(kind, version)
+        if meta is not None and all(meta.get(key) == value for key, value in match.items()):
+            metas.append(meta)
+    return sorted(metas, key=lambda meta: meta.get("created_at", ""))
+
+
+def prune_artifacts(kind: str, keep: Iterable[str], **match) -> List[str]:
+    """
+    刪除符合 match 條件、但不在 keep 內的版本（例如資料更新後被取代的舊版本）。
+    :param kind: 模型類別
+    :param keep: 保留的版本
+    :param match: 欄位需相等的條件
+    :return: 已刪除的版本
+    """
+    keep = set(keep)
+    removed = []
+    for meta in list_artifacts(kind, **match):
+        version = meta["version"]
+        if version in keep:
+            continue
+        shutil.rmtree(artifact_dir(kind, version), ignore_errors=True)
+        with _lock:
+            _loaded.pop((kind, version), None)
+        removed.append(version)
+    return removed
+
+
+def tuned_params(model: str = "xgb", promoted_only: bool = True) -> Optional[Dict]:
+    """
+    最近一次調參的最佳設定；只有以 --promote-tuned 採用的結果會成為主模型 / 頭尾模型未指定超參數時的預設值。
+    :param model: 'xgb' 或 'rf'
+    :param promoted_only: 只取已採用（promoted）的結果
+    :return: 版本資訊（含 params，rf 另含 lookback）；沒有符合的結果時為 None
+    """
+    match = {"model": model, "promoted": True} if promoted_only else {"model": model}
+    metas = list_artifacts(TUNING_KIND, **match)
+    return metas[-1] if metas else None
+
+
+def has_artifact(kind: str, version: str) -> bool:
+    meta = read_artifact_meta(kind, version)
+    return meta is not None and all(
+        os.path.exists(os.path.join(artifact_dir(kind, version), f"{name}.joblib")) for name in meta["files"]
+    )
+
+
+def load_artifact(kind: str, version: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                  mmap_mode: Optional[str] = "r", **match) -> Tuple[Dict[str, object], Dict]:
+    """
+    載入模型檔案。以 joblib mmap_mode 開啟，大型陣列延遲讀取，並透過作業系統頁快取在多個行程間共用。
+    :param kind: 模型類別
+    :param version: 版本（None 表示符合 match 條件的最新版本）
+    :param names: 欲載入的檔名（None 表示全部）
+    :param mmap_mode: 傳給 joblib.load 的 mmap_mode（None 表示完整讀入）
+    :raises ArtifactNotFoundError: 找不到該版本或其檔案
+    :return: ({檔名: 物件}, 版本資訊)
+    """
+    if version is None:
+        metas = list_artifacts(kind, **match)
+        if not metas:
+            condition = "、".join(f"{key}={value}" for key, value in match.items())
+            raise ArtifactNotFoundError(f"找不到 {kind} 模型{f'（{condition}）' if condition else ''}，請先執行 --mode retrain")
+        version = metas[-1]["version"]
+    meta = read_artifact_meta(kind, version)
+    if meta is None:
+        raise ArtifactNotFoundError(f"找不到 {kind} 模型版本 {version}：{artifact_dir(kind, version)}")
+    if meta.get("libraries", {}).get("sklearn") != sklearn.__version__:
+        print(f"⚠️ {kind}/{version} 以 scikit-learn {meta.get('libraries', {}).get('sklearn')} 訓練，目前為 {sklearn.__version__}")
+
+    names = list(names or meta["files"])
+    with _lock:
+        cached = _loaded.get((kind, version), {})
+        if all(name in cached for name in names):
+            return {name: cached[name] for name in names}, meta
+
+    objects = {}
+    for name in names:
+        path = os.path.join(artifact_dir(kind, version), f"{name}.joblib")
+        if not os.path.exists(path):
+            raise ArtifactNotFoundError(f"找不到模型檔案：{path}")
+        objects[name] = joblib.load(path, mmap_mode=mmap_mode)
+    with _lock:
+        _loaded.setdefault((kind, version), {}).update(objects)
+    return objects, meta
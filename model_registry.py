@@ -0,0 +1,704 @@
+# model_registry.py
+import csv
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import log_loss
+from xgboost import XGBClassifier
+from db_loader import NUM_BALLS, row_checksum
+from model_artifacts import MODEL_DIR, artifact_dir, tuned_params
+from feature_store import (
+    FEATURE_STORE, read_manifest, read_features, date_index, model_matrix, model_labels, memory_report
+)
+
+REGISTRY_DIR = artifact_dir("registry")
+LRU_SIZE = 8  # 行程內保留的已載入模型數（dashboard 連續點擊時重用）
+TRAINING_LOG = os.path.join(MODEL_DIR, "training_log.csv")
+DMATRIX_DIR = artifact_dir("dmatrix")  # 訓練矩陣快取（float32 .npy，依特徵庫水位命名）
+DMATRIX_LRU_SIZE = 2  # 行程內保留的已量化訓練矩陣數
+SCORES_LRU_SIZE = 4   # 行程內保留的全期機率矩陣數
+
+# 🔁 增量重訓：接續上一版模型，只以新增期數追加少量樹
+INCREMENTAL_ROUNDS = 10
+FULL_REBUILD_EVERY = 8      # 連續增量更新次數上限，超過即整體重訓
+FULL_REBUILD_DAYS = 28      # 距上次整體重訓的天數上限
+DRIFT_TOLERANCE = 0.05      # 新期數 logloss 高於上一版的樣本外 logloss 超過 5% 視為漂移
+VALIDATION_DRAWS = 50       # 訓練 logloss（val_logloss，樣本內，僅供紀錄）使用的最近期數
+
+# ⚙️ 主策略模型超參數（所有策略 / 分析腳本共用）
+XGB_PARAMS = {
+    "n_estimators": 100,
+    "max_depth": 6,
+    "learning_rate": 0.1,
+    "scale_pos_weight": 6,
+    "eval_metric": "logloss",
+    "random_state": 42,
+}
+
+# 🧵 訓練執行設定：所有 fit / 預測共用，不影響模型內容位址
+TRAIN_CONFIG = {
+    "n_jobs": int(os.environ.get("LOTTO_N_JOBS", "0")) or os.cpu_count() or 1,
+    "external_memory": os.environ.get("LOTTO_EXTERNAL_MEMORY", "") == "1",  # 特徵表逐年分區串流，不整份載入記憶體
+    "incremental": os.environ.get("LOTTO_INCREMENTAL", "") == "1",  # 取用模型時優先使用 update_model 的增量模型
+}
+
+_lru: "OrderedDict[str, Tuple[XGBClassifier, Dict[str, float]]]" = OrderedDict()
+_dmatrix_lru: "OrderedDict[str, xgb.DMatrix]" = OrderedDict()
+_scores_lru: "OrderedDict[str, ScoreMatrix]" = OrderedDict()
+_lock = threading.Lock()
+_key_locks: Dict[str, threading.Lock] = {}  # 每個模型位址一把鎖：服務多個執行緒同時取用同一未登錄模型時只訓練一次
+
+
+def configure_training(n_jobs: Optional[int] = None, external_memory: Optional[bool] = None,
+                       incremental: Optional[bool] = None) -> Dict:
+    """
+    調整訓練執行設定（None 表示維持原值）。
+    :param n_jobs: 執行緒數，0 表示全部 CPU
+    :param external_memory: 是否以外部記憶體（逐年分區）建立訓練矩陣
+    :param incremental: get_model / score_matrix 是否取用目前特徵庫水位的增量模型（見 update_model）
+    :return: 目前設定
+    """
+    if n_jobs is not None:
+        TRAIN_CONFIG["n_jobs"] = n_jobs or os.cpu_count() or 1
+    if external_memory is not None:
+        TRAIN_CONFIG["external_memory"] = bool(external_memory)
+    if incremental is not None:
+        TRAIN_CONFIG["incremental"] = bool(incremental)
+    return dict(TRAIN_CONFIG)
+
+
+def default_params() -> Dict:
+    """未指定超參數時使用的設定：有以 --promote-tuned 採用的調參結果時為其最佳參數，否則為 XGB_PARAMS。"""
+    tuned = tuned_params("xgb")
+    return tuned["params"] if tuned else XGB_PARAMS
+
+
+def booster_params(params: Dict = XGB_PARAMS) -> Tuple[Dict, int]:
+    """
+    sklearn 包裝器的超參數轉為原生 xgb.train 參數。
+    :return: (原生參數, 回合數)
+    """
+    native = {k: v for k, v in params.items() if k not in ("n_estimators", "random_state", "n_jobs")}
+    native.update({
+        "objective": "binary:logistic",
+        "tree_method": "hist",
+        "seed": params.get("random_state", 0),
+        "nthread": TRAIN_CONFIG["n_jobs"],
+    })
+    return native, params.get("n_estimators", 100)
+
+
+def _as_classifier(booster: xgb.Booster, params: Dict) -> XGBClassifier:
+    """將原生 booster 包回 XGBClassifier，呼叫端沿用 predict_proba / get_booster。"""
+    model = XGBClassifier(**{**params, "n_jobs": TRAIN_CONFIG["n_jobs"]})
+    model.load_model(bytearray(booster.save_raw("ubj")))
+    return model
+
+
+def model_key(manifest: Dict, params: Dict = XGB_PARAMS, train_end: Optional[str] = None,
+              base_key: Optional[str] = None) -> str:
+    """
+    模型內容位址：特徵庫水位 + 特徵結構 + 超參數 + 訓練截止期別，任一變動即為不同模型。
+    :param manifest: 特徵庫 manifest
+    :param params: XGBoost 超參數
+    :param train_end: 訓練資料最後一期（None 表示全部）
+    :param base_key: 增量更新所接續的模型位址（None 表示整體訓練）；增量模型與整體訓練的模型位址不同
+    """
+    payload = {
+        "last_seq": manifest.get("last_seq"),
+        "db_checksum": manifest.get("db_checksum"),
+        "schema_hash": manifest.get("schema_hash"),
+        "generator_version": manifest.get("generator_version"),
+        "params": params,
+        "train_end": train_end,
+    }
+    if base_key is not None:
+        payload["base_key"] = base_key
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+
+
+def _artifact_paths(key: str) -> Tuple[str, str]:
+    return os.path.join(REGISTRY_DIR, f"{key}.ubj"), os.path.join(REGISTRY_DIR, f"{key}.json")
+
+
+def _remember(key: str, entry: Tuple[XGBClassifier, Dict[str, float]]):
+    with _lock:
+        _lru[key] = entry
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def load_model(key: str) -> Optional[Tuple[XGBClassifier, Dict[str, float]]]:
+    """
+    依內容位址取出模型與 gain（先查行程內 LRU，再查磁碟）。
+    :return: (model, gain_dict)；不存在時回傳 None
+    """
+    with _lock:
+        if key in _lru:
+            _lru.move_to_end(key)
+            return _lru[key]
+
+    model_path, meta_path = _artifact_paths(key)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    model = XGBClassifier(n_jobs=TRAIN_CONFIG["n_jobs"])
+    model.load_model(model_path)
+    entry = (model, meta["gain"])
+    _remember(key, entry)
+    return entry
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _atomic_write(path: str, write: Callable[[str], None], suffix: str = ".tmp"):
+    """
+    先寫到同目錄下唯一命名的暫存檔再 os.replace，多個執行緒 / 行程同時寫同一檔案時不會共用暫存檔。
+    :param write: 接收暫存檔路徑並寫入內容的函式
+    :param suffix: 暫存檔副檔名（XGBoost 依副檔名決定格式）
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=suffix)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_json(path: str, payload: Dict, **kwargs):
+    def write(tmp_path: str):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, **kwargs)
+    _atomic_write(path, write)
+
+
+def _write_npy(path: str, array: np.ndarray):
+    def write(tmp_path: str):
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+    _atomic_write(path, write)
+
+
+def _save_model(key: str, model: XGBClassifier, gain_dict: Dict[str, float], meta: Dict):
+    model_path, meta_path = _artifact_paths(key)
+    _atomic_write(model_path, model.save_model, suffix=".tmp.ubj")
+    _write_json(meta_path, {**meta, "gain": gain_dict}, indent=2, ensure_ascii=False)
+
+
+def model_features(model: XGBClassifier) -> List[str]:
+    """模型訓練時的特徵欄位順序。"""
+    return model.get_booster().feature_names
+
+
+def _log_training(meta: Dict):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    fields = ["trained_at", "key", "mode", "rows", "new_rows", "n_trees", "seconds", "val_logloss", "forward_logloss", "reason"]
+    exists = os.path.exists(TRAINING_LOG)
+    with open(TRAINING_LOG, "a", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        if not exists:
+            writer.writeheader()
+        writer.writerow(meta)
+
+
+def read_training_log() -> pd.DataFrame:
+    """整體 / 增量重訓紀錄（訓練秒數與驗證 logloss 並列比較）。"""
+    if not os.path.exists(TRAINING_LOG):
+        return pd.DataFrame()
+    return pd.read_csv(TRAINING_LOG)
+
+
+def _logloss(model: XGBClassifier, df: pd.DataFrame) -> Optional[float]:
+    if df.empty:
+        return None
+    y = model_labels(df)
+    prob = model.predict_proba(model_matrix(df, model_features(model)))[:, 1]
+    return round(float(log_loss(y, prob, labels=[0, 1])), 6)
+
+
+def _validation_rows(store_path: str, end: Optional[str] = None) -> pd.DataFrame:
+    """
+    end（含）之前最近 VALIDATION_DRAWS 期的特徵列（end 為 None 表示特徵庫最新一期）。
+    這些期數在模型的訓練資料內，算出的 val_logloss 為樣本內，只寫入紀錄，不作為漂移判斷基準。
+    """
+    index = date_index(store_path)
+    stop = int(np.searchsorted(index, end, side="right")) if end else len(index)
+    start = str(index[max(stop - VALIDATION_DRAWS, 0)]) if stop else None
+    return read_features(start=start, end=end, store_path=store_path)
+
+
+# 📐 訓練矩陣：依特徵庫水位快取，特徵庫未變動時不重新讀取 Parquet 與量化
+def _matrix_key(manifest: Dict, store_path: str, train_end: Optional[str]) -> str:
+    payload = {
+        "store_path": os.path.abspath(store_path),
+        "last_seq": manifest.get("last_seq"),
+        "db_checksum": manifest.get("db_checksum"),
+        "schema_hash": manifest.get("schema_hash"),
+        "generator_version": manifest.get("generator_version"),
+        "train_end": train_end,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+
+
+def _matrix_paths(key: str) -> Tuple[str, str, str]:
+    base = os.path.join(DMATRIX_DIR, key)
+    return f"{base}.X.npy", f"{base}.y.npy", f"{base}.json"
+
+
+def _read_matrix_cache(key: str) -> Optional[Tuple[np.ndarray, np.ndarray, List[str]]]:
+    x_path, y_path, meta_path = _matrix_paths(key)
+    if not all(os.path.exists(path) for path in (x_path, y_path, meta_path)):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            columns = json.load(f)["columns"]
+        return np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r"), columns
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_matrix_cache(key: str, X: np.ndarray, y: np.ndarray, columns: List[str]):
+    x_path, y_path, meta_path = _matrix_paths(key)
+    for path, array in ((x_path, X), (y_path, y)):
+        _write_npy(path, array)
+    _write_json(meta_path, {"columns": columns, "rows": len(X)})
+
+
+class _PartitionIter(xgb.DataIter):
+    """逐年分區餵給 XGBoost 的外部記憶體迭代器，特徵表可大於可用記憶體。"""
+
+    def __init__(self, store_path: str, train_end: Optional[str], cache_prefix: str):
+        years = sorted(
+            name.split("=", 1)[1] for name in os.listdir(store_path) if name.startswith("year=")
+        )
+        self._years = [year for year in years if train_end is None or year <= train_end[:4]]
+        self._store_path = store_path
+        self._train_end = train_end
+        self._pos = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self._pos == len(self._years):
+            return False
+        year = self._years[self._pos]
+        self._pos += 1
+        end = min(self._train_end or f"{year}-12-31", f"{year}-12-31")
+        df = read_features(start=f"{year}-01-01", end=end, store_path=self._store_path)
+        input_data(data=model_matrix(df), label=model_labels(df))
+        return True
+
+    def reset(self):
+        self._pos = 0
+
+
+def _manifest_or_raise(store_path: str) -> Dict:
+    manifest = read_manifest(store_path)
+    if manifest is None:
+        raise FileNotFoundError(f"找不到特徵庫 {store_path} 的 manifest，請先執行特徵更新")
+    return manifest
+
+
+def training_arrays(store_path: str = FEATURE_STORE, train_end: Optional[str] = None
+                    ) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    主模型訓練用的 float32 特徵矩陣與標籤，存成 .npy 並以記憶體映射開啟；特徵庫未變動時不重新讀取 Parquet。
+    回傳的 memmap 可將 .filename 交給其他行程映射同一份資料。
+    :param store_path: 特徵庫目錄
+    :param train_end: 訓練資料最後一期（含），None 表示全部
+    :return: (X, y, 欄位)
+    """
+    key = _matrix_key(_manifest_or_raise(store_path), store_path, train_end)
+    cached = _read_matrix_cache(key)
+    if cached is None:
+        df = read_features(end=train_end, store_path=store_path)
+        X = model_matrix(df)
+        memory_report({"features": df, "X": X})
+        _write_matrix_cache(key, X.to_numpy(), model_labels(df).to_numpy(), X.columns.tolist())
+        cached = _read_matrix_cache(key)
+    return cached
+
+
+def training_matrix(
+    store_path: str = FEATURE_STORE,
+    train_end: Optional[str] = None,
+    params: Dict = XGB_PARAMS,
+) -> xgb.DMatrix:
+    """
+    主模型的量化訓練矩陣（QuantileDMatrix）。依特徵庫水位與訓練截止期別快取：
+    行程內保留已量化的矩陣，磁碟上另存 float32 .npy（見 training_arrays）供其他行程直接建構；
+    TRAIN_CONFIG["external_memory"] 開啟時改為逐年分區串流（ExtMemQuantileDMatrix）。
+    :param store_path: 特徵庫目錄
+    :param train_end: 訓練資料最後一期（含），None 表示全部
+    :param params: XGBoost 超參數（取 max_bin）
+    """
+    max_bin = params.get("max_bin", 256)
+    key = f"{_matrix_key(_manifest_or_raise(store_path), store_path, train_end)}-b{max_bin}"
+    with _lock:
+        if key in _dmatrix_lru:
+            _dmatrix_lru.move_to_end(key)
+            return _dmatrix_lru[key]
+
+    nthread = TRAIN_CONFIG["n_jobs"]
+    if TRAIN_CONFIG["external_memory"]:
+        os.makedirs(DMATRIX_DIR, exist_ok=True)
+        it = _PartitionIter(store_path, train_end, cache_prefix=os.path.join(DMATRIX_DIR, f"{key}.cache"))
+        dtrain = xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin, nthread=nthread)
+        print(f"📐 以外部記憶體建立訓練矩陣：{dtrain.num_row()} 筆")
+    else:
+        X, y, columns = training_arrays(store_path, train_end)
+        dtrain = xgb.QuantileDMatrix(X, label=y, feature_names=columns, max_bin=max_bin, nthread=nthread)
+
+    with _lock:
+        _dmatrix_lru[key] = dtrain
+        _dmatrix_lru.move_to_end(key)
+        while len(_dmatrix_lru) > DMATRIX_LRU_SIZE:
+            _dmatrix_lru.popitem(last=False)
+    return dtrain
+
+
+def _register(key: str, model: XGBClassifier, meta: Dict) -> Tuple[XGBClassifier, Dict[str, float]]:
+    gain_dict = model.get_booster().get_score(importance_type="gain")
+    meta = {
+        **meta,
+        "key": key,
+        "n_trees": model.get_booster().num_boosted_rounds(),
+        "trained_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    _save_model(key, model, gain_dict, meta)
+    _log_training(meta)
+    entry = (model, gain_dict)
+    _remember(key, entry)
+    return entry
+
+
+def _train_end(as_of: Optional[str], store_path: str) -> Optional[str]:
+    if as_of is None:
+        return None
+    index = date_index(store_path)
+    pos = int(np.searchsorted(index, as_of, side="left"))
+    if pos == 0:
+        raise ValueError(f"{as_of} 之前沒有可訓練的期數")
+    return str(index[pos - 1])
+
+
+def get_model(
+    params: Optional[Dict] = None,
+    as_of: Optional[str] = None,
+    store_path: str = FEATURE_STORE,
+) -> Tuple[XGBClassifier, Dict[str, float]]:
+    """
+    取得主策略模型：已有相同內容位址的模型時直接載入，否則訓練並登錄。
+    TRAIN_CONFIG["incremental"] 開啟且未指定 as_of 時，沒有整體訓練的模型就取用目前特徵庫水位的增量模型
+    （update_model 以 base_key 另行登錄）；關閉時只回傳整體訓練的模型。
+    :param params: XGBoost 超參數（None 表示 default_params()）
+    :param as_of: 只以此日期之前的期數訓練（None 表示特徵庫全部期數）
+    :param store_path: 特徵庫目錄
+    :return: (model, gain_dict)
+    """
+    return _resolve_model(params or default_params(), as_of, store_path)[1]
+
+
+def _resolve_model(params: Dict, as_of: Optional[str], store_path: str
+                   ) -> Tuple[str, Tuple[XGBClassifier, Dict[str, float]]]:
+    """get_model 的實作，另回傳實際取用的模型位址（增量模型的位址與 model_key 不同）。"""
+    manifest = _manifest_or_raise(store_path)
+    train_end = _train_end(as_of, store_path)
+    key = model_key(manifest, params, train_end)
+
+    entry = load_model(key)
+    if entry is None and train_end is None and TRAIN_CONFIG["incremental"]:
+        incremental = _incremental_key(manifest, params, store_path)
+        entry = load_model(incremental) if incremental else None
+        key = incremental if entry is not None else key
+    if entry is not None:
+        print(f"♻️ 使用已登錄模型 {key}")
+        return key, entry
+
+    with _key_lock(key):  # 同一位址只由一個執行緒訓練，其餘等待後直接載入
+        entry = load_model(key)
+        if entry is not None:
+            return key, entry
+        return key, _train_full(key, params, manifest, store_path, train_end)
+
+
+def _train_full(key: str, params: Dict, manifest: Dict, store_path: str, train_end: Optional[str] = None,
+                reason: str = "", forward_logloss: Optional[float] = None):
+    dtrain = training_matrix(store_path, train_end, params)
+    native, rounds = booster_params(params)
+
+    started = time.perf_counter()
+    model = _as_classifier(xgb.train(native, dtrain, num_boost_round=rounds), params)
+    seconds = round(time.perf_counter() - started, 3)
+
+    trained_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    entry = _register(key, model, {
+        "mode": "full",
+        "params": params,
+        "as_of": train_end,
+        "train_end": train_end or manifest.get("last_date"),
+        "rows": dtrain.num_row(),
+        "new_rows": dtrain.num_row(),
+        "store_path": store_path,
+        "manifest": manifest,
+        "seconds": seconds,
+        "n_jobs": TRAIN_CONFIG["n_jobs"],
+        "external_memory": TRAIN_CONFIG["external_memory"],
+        "val_logloss": _logloss(model, _validation_rows(store_path, train_end)),
+        "forward_logloss": forward_logloss,
+        "updates_since_full": 0,
+        "full_trained_at": trained_at,
+        "reason": reason,
+    })
+    print(f"✅ 模型已訓練並登錄：{key}（{seconds:.1f} 秒）")
+    return entry
+
+
+# 🔁 增量重訓
+def _lineage_base(manifest: Dict, params: Dict, store_path: str) -> Optional[Dict]:
+    """同一特徵庫、特徵結構與超參數下，最近一個以全部期數訓練的模型。"""
+    best = None
+    for meta_path in glob.glob(os.path.join(REGISTRY_DIR, "*.json")):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        base_manifest = meta.get("manifest", {})
+        if (
+            meta.get("as_of") is None
+            and meta.get("params") == params
+            and meta.get("store_path") == store_path
+            and base_manifest.get("schema_hash") == manifest.get("schema_hash")
+            and base_manifest.get("generator_version") == manifest.get("generator_version")
+            and base_manifest.get("last_seq", 0) < manifest.get("last_seq", 0)
+            and (best is None or base_manifest["last_seq"] > best["manifest"]["last_seq"])
+        ):
+            best = meta
+    return best
+
+
+def _incremental_key(manifest: Dict, params: Dict, store_path: str) -> Optional[str]:
+    """目前特徵庫水位、相同超參數下最近登錄的增量模型位址；沒有時為 None。"""
+    best = None
+    for meta_path in glob.glob(os.path.join(REGISTRY_DIR, "*.json")):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        current = meta.get("manifest", {})
+        if (
+            meta.get("mode") == "incremental"
+            and meta.get("params") == params
+            and meta.get("store_path") == store_path
+            and current.get("last_seq") == manifest.get("last_seq")
+            and current.get("db_checksum") == manifest.get("db_checksum")
+            and current.get("schema_hash") == manifest.get("schema_hash")
+            and current.get("generator_version") == manifest.get("generator_version")
+            and (best is None or meta["trained_at"] > best["trained_at"])
+        ):
+            best = meta
+    return best["key"] if best else None
+
+
+def _rows_checksum(df: pd.DataFrame) -> int:
+    """由特徵列的標籤還原各期開獎遮罩，計算與 lotto_meta 相同的內容檢查碼。"""
+    drawn = df[df["is_drawn"]]
+    masks = drawn.groupby("date", observed=True)["number"].agg(
+        lambda numbers: sum(1 << (int(n) - 1) for n in numbers)
+    )
+    return sum(row_checksum(str(draw_date), int(mask)) for draw_date, mask in masks.items())
+
+
+def update_model(
+    params: Optional[Dict] = None,
+    store_path: str = FEATURE_STORE,
+    rounds: int = INCREMENTAL_ROUNDS,
+    force_full: bool = False,
+) -> Tuple[XGBClassifier, Dict[str, float]]:
+    """
+    增量更新主策略模型：載入上一版模型，以新增期數追加 rounds 棵樹（xgb_model 接續訓練）。
+    找不到可接續的模型、達到排程上限、歷史資料變動或偵測到漂移時改為整體重訓。
+    增量模型以 model_key(..., base_key=上一版位址) 登錄；TRAIN_CONFIG["incremental"] 開啟時
+    get_model / score_matrix 取用目前水位的增量模型，否則只取用整體訓練的模型。
+    :param params: XGBoost 超參數（None 表示 default_params()）
+    :param store_path: 特徵庫目錄
+    :param rounds: 每次增量追加的樹數
+    :param force_full: 強制整體重訓
+    :return: (model, gain_dict)
+    """
+    params = params or default_params()
+    manifest = read_manifest(store_path)
+    if manifest is None:
+        raise FileNotFoundError(f"找不到特徵庫 {store_path} 的 manifest，請先執行特徵更新")
+    key = model_key(manifest, params)
+    base = None if force_full else _lineage_base(manifest, params, store_path)
+    if not force_full:
+        for current in (key, model_key(manifest, params, base_key=base["key"]) if base else None):
+            entry = load_model(current) if current else None
+            if entry is not None:
+                print(f"♻️ 模型已是最新：{current}")
+                return entry
+
+    base_entry = load_model(base["key"]) if base else None
+    reason, forward, new_df = "", None, None
+    if force_full:
+        reason = "指定整體重訓"
+    elif base_entry is None:
+        reason = "找不到可接續的模型"
+    elif base.get("updates_since_full", 0) >= FULL_REBUILD_EVERY:
+        reason = f"已連續增量更新 {base['updates_since_full']} 次"
+    elif (datetime.now() - datetime.strptime(base["full_trained_at"], "%Y-%m-%d %H:%M:%S")).days >= FULL_REBUILD_DAYS:
+        reason = f"距上次整體重訓已超過 {FULL_REBUILD_DAYS} 天"
+    else:
+        index = date_index(store_path)
+        start = int(np.searchsorted(index, base["manifest"]["last_date"], side="right"))
+        new_df = read_features(start=str(index[start]), store_path=store_path) if start < len(index) else None
+        new_checksum = _rows_checksum(new_df) if new_df is not None else 0
+        if base["manifest"]["db_checksum"] + new_checksum != manifest.get("db_checksum"):
+            reason = "歷史期數內容已變動"
+        elif new_df is None:
+            reason = "找不到新增期數"
+        else:
+            # 新期數不在上一版的訓練資料內，與上一版對其新期數的 logloss 比較（兩者皆為樣本外）
+            forward = _logloss(base_entry[0], new_df)
+            reference = base.get("forward_logloss")
+            if reference and forward > reference * (1 + DRIFT_TOLERANCE):
+                reason = f"偵測到漂移（新期數 logloss {forward:.4f} > 上一版樣本外 {reference:.4f}）"
+
+    if reason:
+        print(f"🔄 整體重訓：{reason}")
+        return _train_full(key, params, manifest, store_path, reason=reason, forward_logloss=forward)
+
+    native, _ = booster_params(params)
+    base_model = base_entry[0]
+    dnew = xgb.DMatrix(model_matrix(new_df, model_features(base_model)), label=model_labels(new_df),
+                       nthread=TRAIN_CONFIG["n_jobs"])
+    started = time.perf_counter()
+    booster = xgb.train(native, dnew, num_boost_round=rounds, xgb_model=base_model.get_booster())
+    model = _as_classifier(booster, params)
+    seconds = round(time.perf_counter() - started, 3)
+
+    key = model_key(manifest, params, base_key=base["key"])
+    entry = _register(key, model, {
+        "mode": "incremental",
+        "params": params,
+        "as_of": None,
+        "train_end": manifest.get("last_date"),
+        "rows": base["rows"] + len(new_df),
+        "new_rows": len(new_df),
+        "store_path": store_path,
+        "manifest": manifest,
+        "seconds": seconds,
+        "n_jobs": TRAIN_CONFIG["n_jobs"],
+        "val_logloss": _logloss(model, _validation_rows(store_path)),
+        "forward_logloss": forward,
+        "base_key": base["key"],
+        "updates_since_full": base.get("updates_since_full", 0) + 1,
+        "full_trained_at": base["full_trained_at"],
+        "reason": "",
+    })
+    print(f"✅ 模型已增量更新：{base['key']} → {key}（+{rounds} 棵樹，{len(new_df)} 筆新資料，{seconds:.2f} 秒）")
+    return entry
+
+
+# 🎯 全期批次評分：整份特徵庫一次 inplace_predict，(期數, 39) 機率矩陣與模型存放在一起
+class ScoreMatrix(NamedTuple):
+    dates: np.ndarray  # (期數,) 日期字串
+    prob: np.ndarray   # (期數, 39) float32，號碼 1~39 依序
+    key: str           # 模型內容位址
+
+    def between(self, start: Optional[str] = None, end: Optional[str] = None) -> "ScoreMatrix":
+        """start ~ end（含）各期的機率（列為同一矩陣上的 view）。"""
+        lo = int(np.searchsorted(self.dates, start, side="left")) if start else 0
+        hi = int(np.searchsorted(self.dates, end, side="right")) if end else len(self.dates)
+        return ScoreMatrix(self.dates[lo:hi], self.prob[lo:hi], self.key)
+
+    def on(self, day: str) -> Optional[np.ndarray]:
+        """某一期 39 個號碼的機率；該期不在特徵庫內時回傳 None。"""
+        pos = int(np.searchsorted(self.dates, day, side="left"))
+        if pos < len(self.dates) and self.dates[pos] == day:
+            return self.prob[pos]
+        return None
+
+
+def _scores_path(key: str, store_key: str) -> str:
+    return os.path.join(REGISTRY_DIR, f"{key}.scores-{store_key[:12]}.npy")
+
+
+def model_scores(model: XGBClassifier, key: str, store_path: str = FEATURE_STORE) -> ScoreMatrix:
+    """
+    以指定模型為特徵庫所有期別評分：整份特徵矩陣（training_arrays 的 memmap）一次 inplace_predict。
+    結果存成 models/registry/<模型位址>.scores-<特徵庫水位>.npy，特徵庫未變動時直接映射讀取。
+    :param model: 主策略模型
+    :param key: 模型內容位址
+    :param store_path: 特徵庫目錄
+    :return: ScoreMatrix(dates, prob, key)
+    """
+    store_key = _matrix_key(_manifest_or_raise(store_path), store_path, None)
+    lru_key = f"{key}-{store_key}"
+    with _lock:
+        if lru_key in _scores_lru:
+            _scores_lru.move_to_end(lru_key)
+            return _scores_lru[lru_key]
+
+    dates = date_index(store_path)
+    path = _scores_path(key, store_key)
+    prob = None
+    if os.path.exists(path):
+        try:
+            prob = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            prob = None
+    if prob is None or prob.shape != (len(dates), NUM_BALLS):
+        X, _, columns = training_arrays(store_path)
+        features = model_features(model)
+        if features and features != columns:
+            X = X[:, [columns.index(name) for name in features]]
+        started = time.perf_counter()
+        prob = model.get_booster().inplace_predict(X).astype(np.float32).reshape(len(dates), NUM_BALLS)
+        print(f"🎯 全期批次評分：{len(dates)} 期 × {NUM_BALLS} 號，{time.perf_counter() - started:.2f} 秒")
+        _write_npy(path, prob)
+
+    scores = ScoreMatrix(dates, prob, key)
+    with _lock:
+        _scores_lru[lru_key] = scores
+        _scores_lru.move_to_end(lru_key)
+        while len(_scores_lru) > SCORES_LRU_SIZE:
+            _scores_lru.popitem(last=False)
+    return scores
+
+
+def score_matrix(
+    params: Optional[Dict] = None,
+    as_of: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store_path: str = FEATURE_STORE,
+) -> ScoreMatrix:
+    """
+    取得主策略模型（見 get_model）對 start ~ end 各期的預測機率，回測 / 頁面 / 報表直接索引，不逐期呼叫模型。
+    :param params: XGBoost 超參數（None 表示 default_params()）
+    :param as_of: 模型只以此日期之前的期數訓練（None 表示特徵庫全部期數）
+    :param start: 評分起始期別（None 表示第一期）
+    :param end: 評分結束期別（含，None 表示最新一期）
+    :param store_path: 特徵庫目錄
+    :return: ScoreMatrix(dates, prob, key)
+    """
+    params = params or default_params()
+    key, (model, _) = _resolve_model(params, as_of, store_path)
+    return model_scores(model, key, store_path).between(start, end)
@@ -0,0 +1,176 @@
+# modules_backtest.py
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from feature_store import FEATURE_STORE
+from model_registry import TRAIN_CONFIG, booster_params, default_params
+from modules_strategy_combiner import TOP_N
+from score_kernels import booster_gain_vector
+from strategy_tensor import load_feature_tensor, strategy_tensor
+
+BACKTEST_PATH = "backtest_hits.csv"
+RETRAIN_EVERY = 50        # 每 N 期重訓一次（同一折內的測試期共用一個模型）
+MIN_TRAIN_DRAWS = 300     # 第一個測試期之前至少要有的訓練期數
+COMBINED = "合併選號"      # strategies.json 的 unions：Top-N / 條件選號 / 模型機率 / 模型加權 的聯集（與舊版回測相同）
+
+
+def walk_forward_folds(n_dates: int, retrain_every: int = RETRAIN_EVERY, min_train: int = MIN_TRAIN_DRAWS,
+                       window: Optional[int] = None, start: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """
+    切出 walk-forward 折：每折以 [train_start, test_start) 訓練，測試 [test_start, test_end)。
+    :param n_dates: 總期數
+    :param retrain_every: 每折測試期數（即重訓間隔）
+    :param min_train: 第一折之前至少要有的訓練期數
+    :param window: 滾動視窗期數（None 表示擴張視窗，自第一期起訓練）
+    :param start: 第一個測試期的位置（預設為 min_train）
+    :return: [(train_start, test_start, test_end)]
+    """
+    start = max(start if start is not None else min_train, min_train)
+    folds = []
+    for test_start in range(start, n_dates, retrain_every):
+        train_start = 0 if window is None else max(0, test_start - window)
+        folds.append((train_start, test_start, min(test_start + retrain_every, n_dates)))
+    return folds
+
+
+# 🧵 子行程：特徵張量與標籤放在共享記憶體，各折只取自己的切片
+_shared = {}
+
+
+def _attach_shared(features_name: str, labels_name: str, shape: Tuple[int, int, int], columns: List[str],
+                   nthread: int):
+    features_shm = shared_memory.SharedMemory(name=features_name)
+    labels_shm = shared_memory.SharedMemory(name=labels_name)
+    _shared["shm"] = (features_shm, labels_shm)  # 保留參照，避免映射被釋放
+    _shared["features"] = np.ndarray(shape, dtype=np.float32, buffer=features_shm.buf)
+    _shared["labels"] = np.ndarray(shape[:2], dtype=np.bool_, buffer=labels_shm.buf)
+    _shared["columns"] = columns
+    _shared["nthread"] = nthread
+
+
+def _run_fold(fold: Tuple[int, int, int], params: Dict, top_n: int) -> Dict[str, np.ndarray]:
+    train_start, test_start, test_end = fold
+    features, labels, columns = _shared["features"], _shared["labels"], _shared["columns"]
+    n_features = features.shape[2]
+
+    native, rounds = booster_params(params)
+    native["nthread"] = _shared["nthread"]
+    dtrain = xgb.QuantileDMatrix(
+        features[train_start:test_start].reshape(-1, n_features),
+        label=labels[train_start:test_start].reshape(-1),
+        max_bin=params.get("max_bin", 256), nthread=native["nthread"],
+    )
+    booster = xgb.train(native, dtrain, num_boost_round=rounds)
+
+    test = features[test_start:test_end]
+    prob = booster.inplace_predict(test.reshape(-1, n_features)).reshape(test.shape[:2])
+    gain_weights = booster_gain_vector(booster, n_features)
+
+    hits = labels[test_start:test_end]
+    tensor = strategy_tensor(test, columns, prob, gain_weights, top_n, labels=hits)
+    result = dict(zip(tensor.strategies, tensor.hits))
+    result["picks"] = dict(zip(tensor.strategies, tensor.selected.sum(axis=2)))
+    for name, mask in tensor.unions.items():
+        result[name] = (mask & hits).sum(axis=1)
+        result["picks"][name] = mask.sum(axis=1)
+    result["fold"] = fold
+    return result
+
+
+def run_backtest(
+    retrain_every: int = RETRAIN_EVERY,
+    window: Optional[int] = None,
+    start: Optional[str] = None,
+    top_n: int = TOP_N,
+    params: Optional[Dict] = None,
+    store_path: str = FEATURE_STORE,
+    max_workers: Optional[int] = None,
+    save_path: Optional[str] = BACKTEST_PATH,
+) -> pd.DataFrame:
+    """
+    walk-forward 回測：每 retrain_every 期只以之前的期數重訓一次模型，評估該折各期的五種策略，各折平行執行。
+    :param retrain_every: 重訓間隔（期數）
+    :param window: 滾動訓練視窗期數（None 表示擴張視窗）
+    :param start: 第一個測試期的日期（預設為累積 MIN_TRAIN_DRAWS 期之後）
+    :param top_n: 各策略選出的號碼數
+    :param params: XGBoost 超參數（None 表示 default_params()，與即時選號的模型相同）
+    :param store_path: 特徵庫目錄
+    :param max_workers: 行程數，預設為 CPU 數
+    :param save_path: 命中表輸出 CSV（None 表示不輸出）
+    :return: DataFrame(date, strategy, picks, hits, train_start, train_end)，每期每策略一列
+    """
+    params = params or default_params()
+    data = load_feature_tensor(store_path)
+    n_dates = len(data.dates)
+    start_pos = int(np.searchsorted(data.dates, start, side="left")) if start else None
+    folds = walk_forward_folds(n_dates, retrain_every, window=window, start=start_pos)
+    if not folds:
+        raise ValueError(f"期數不足：共 {n_dates} 期，至少需要 {MIN_TRAIN_DRAWS + 1} 期")
+
+    workers = max_workers or TRAIN_CONFIG["n_jobs"]
+    nthread = max(1, TRAIN_CONFIG["n_jobs"] // workers)
+    features_shm = shared_memory.SharedMemory(create=True, size=max(data.features.nbytes, 1))
+    labels_shm = shared_memory.SharedMemory(create=True, size=max(data.labels.nbytes, 1))
+    started = time.perf_counter()
+    try:
+        np.ndarray(data.features.shape, dtype=np.float32, buffer=features_shm.buf)[:] = data.features
+        np.ndarray(data.labels.shape, dtype=np.bool_, buffer=labels_shm.buf)[:] = data.labels
+
+        print(f"🔄 walk-forward 回測：{len(folds)} 折（每 {retrain_every} 期重訓），{workers} 個行程")
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_attach_shared,
+            initargs=(features_shm.name, labels_shm.name, data.features.shape, data.columns, nthread)
+        ) as pool:
+            futures = [pool.submit(_run_fold, fold, params, top_n) for fold in folds]
+            results = [future.result() for future in futures]
+    finally:
+        for shm in (features_shm, labels_shm):
+            shm.close()
+            shm.unlink()
+
+    frames = []
+    for result in results:
+        train_start, test_start, test_end = result["fold"]
+        for name in result["picks"]:
+            frames.append(pd.DataFrame({
+                "date": data.dates[test_start:test_end],
+                "strategy": name,
+                "picks": result["picks"][name],
+                "hits": result[name],
+                "train_start": data.dates[train_start],
+                "train_end": data.dates[test_start - 1],
+            }))
+    table = pd.concat(frames, ignore_index=True).sort_values(["strategy", "date"], kind="stable")
+    print(f"✅ 回測完成：{n_dates - folds[0][1]} 期，{time.perf_counter() - started:.1f} 秒")
+
+    if save_path:
+        table.to_csv(save_path, index=False)
+        print(f"📝 命中表已儲存：{save_path}")
+    return table.reset_index(drop=True)
+
+
+def summarize_backtest(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    各策略的回測摘要。
+    :param table: run_backtest() 的命中表
+    :return: DataFrame(strategy, draws, hit_draws, hit_rate, avg_picks, avg_hits, hit_std)
+    """
+    grouped = table.groupby("strategy", sort=False)
+    summary = pd.DataFrame({
+        "draws": grouped["hits"].size(),
+        "hit_draws": (table["hits"] > 0).groupby(table["strategy"], sort=False).sum(),
+        "avg_picks": grouped["picks"].mean(),
+        "avg_hits": grouped["hits"].mean(),
+        "hit_std": grouped["hits"].std(),
+    })
+    summary["hit_rate"] = summary["hit_draws"] / summary["draws"]
+    return summary.reset_index()
+
+
+def hits_by_date(table: pd.DataFrame) -> pd.DataFrame:
+    """命中表轉為寬表：每期一列、每策略一欄。"""
+    return table.pivot(index="date", columns="strategy", values="hits")
@@ -0,0 +1,142 @@
+# modules_feature_variants.py
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+import numpy as np
+from db_loader import NUM_BALLS, get_db_watermark
+from draw_history import load_draw_history, DrawHistory
+from ml_feature_generator import FEATURE_CONFIG, GENERATOR_VERSION, build_feature_frame
+from feature_store import (
+    FEATURE_SET_ROOT, feature_set_index_path, list_feature_sets, write_features, write_manifest
+)
+
+DB_PATH = "lotto_data.db"
+
+# 🧪 預設探索範圍：未列出的鍵沿用 FEATURE_CONFIG
+VARIANT_GRID = {
+    "freq_windows": [(10, 20, 30), (5, 15, 30), (20, 40, 60)],
+    "tail_window": [10, 20],
+    "hot_tail_threshold": [6, 10],
+}
+
+
+def variant_grid(grid: Dict[str, list] = VARIANT_GRID, base: Dict = FEATURE_CONFIG) -> List[Dict]:
+    """
+    展開設定格點。
+    :param grid: {設定鍵: 候選值清單}
+    :param base: 其餘鍵的預設值
+    :return: 完整特徵設定清單
+    """
+    keys = list(grid)
+    return [{**base, **dict(zip(keys, values))} for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def variant_name(config: Dict) -> str:
+    """以設定值組成可讀的特徵集名稱，例如 f10-20-30_m10_t10_ht6_rh3。"""
+    return "f{}_m{}_t{}_ht{}_rh{}".format(
+        "-".join(map(str, config["freq_windows"])), config["momentum_window"], config["tail_window"],
+        config["hot_tail_threshold"], config["recent_hot_threshold"]
+    )
+
+
+def variant_version(config: Dict) -> str:
+    """產生器版本 + 設定雜湊，任一變動即為新版本。"""
+    payload = json.dumps({**config, "freq_windows": list(config["freq_windows"])}, sort_keys=True)
+    return f"v{GENERATOR_VERSION}-{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:8]}"
+
+
+# 🧵 子行程：透過共享記憶體讀取命中矩陣與日期，不經 pickle 複製
+_shared = {}
+
+
+def _attach_shared(hits_name: str, dates_name: str, n_draws: int):
+    hits_shm = shared_memory.SharedMemory(name=hits_name)
+    dates_shm = shared_memory.SharedMemory(name=dates_name)
+    _shared["shm"] = (hits_shm, dates_shm)  # 保留參照，避免映射被釋放
+    _shared["hits"] = np.ndarray((n_draws, NUM_BALLS), dtype=np.bool_, buffer=hits_shm.buf)
+    _shared["dates"] = np.ndarray((n_draws,), dtype="S10", buffer=dates_shm.buf)
+
+
+def _build_variant(name: str, config: Dict, path: str, watermark: Dict):
+    history = DrawHistory(_shared["dates"].astype(str), None, _shared["hits"], None)
+    df = build_feature_frame(history, config=config)
+    write_features(df, path)
+    write_manifest(df.columns.tolist(), len(df), feature_path=path, config=config, watermark=watermark)
+    return name, len(df)
+
+
+def _write_index(index: Dict[str, Dict], root: str):
+    path = feature_set_index_path(root)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def build_feature_variants(
+    configs: Optional[List[Dict]] = None,
+    db_path: str = DB_PATH,
+    root: str = FEATURE_SET_ROOT,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Dict]:
+    """
+    以多個行程平行產生各設定的特徵集，存成 feature_sets/<名稱>/ 並更新索引。
+    :param configs: 特徵設定清單，預設為 VARIANT_GRID 展開
+    :param db_path: SQLite 資料庫路徑
+    :param root: 特徵集根目錄
+    :param max_workers: 行程數，預設為 CPU 數
+    :return: 更新後的特徵集索引
+    """
+    configs = configs or variant_grid()
+    jobs = {variant_name(config): config for config in configs}
+    os.makedirs(root, exist_ok=True)
+
+    history = load_draw_history(db_path)
+    watermark = get_db_watermark(db_path)
+    hits = np.ascontiguousarray(history.hits, dtype=np.bool_)
+    dates = np.asarray(history.dates, dtype="S10")
+
+    hits_shm = shared_memory.SharedMemory(create=True, size=max(hits.nbytes, 1))
+    dates_shm = shared_memory.SharedMemory(create=True, size=max(dates.nbytes, 1))
+    try:
+        np.ndarray(hits.shape, dtype=np.bool_, buffer=hits_shm.buf)[:] = hits
+        np.ndarray(dates.shape, dtype="S10", buffer=dates_shm.buf)[:] = dates
+
+        print(f"🔄 平行產生 {len(jobs)} 組特徵集...")
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_attach_shared,
+            initargs=(hits_shm.name, dates_shm.name, len(hits))
+        ) as pool:
+            futures = [
+                pool.submit(_build_variant, name, config, os.path.join(root, name), watermark)
+                for name, config in jobs.items()
+            ]
+            results = dict(future.result() for future in futures)
+    finally:
+        for shm in (hits_shm, dates_shm):
+            shm.close()
+            shm.unlink()
+
+    index = list_feature_sets(root)
+    updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for name, rows in results.items():
+        config = jobs[name]
+        index[name] = {
+            "version": variant_version(config),
+            "config": {**config, "freq_windows": list(config["freq_windows"])},
+            "rows": rows,
+            "path": os.path.join(root, name),
+            "updated_at": updated_at,
+        }
+        print(f"✅ 特徵集 {name}（{index[name]['version']}）：{rows} 筆")
+    _write_index(index, root)
+    return index
+
+
+# if __name__ == "__main__":
+#     build_feature_variants()
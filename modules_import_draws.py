@@ -0,0 +1,100 @@
+# modules_import_draws.py
+import csv
+import io
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+from parser import parse_numbers_safely
+from db_loader import normalize_draw_date, encode_draw, upsert_draws
+
+DB_PATH = "lotto_data.db"
+
+
+def _read_source(source: str) -> Tuple[str, str]:
+    if source == "-":
+        return sys.stdin.read(), ""
+    with open(source, "r", encoding="utf-8-sig") as f:
+        return f.read(), os.path.splitext(source)[1].lower()
+
+
+def _parse_json(text: str) -> List[Tuple[object, object]]:
+    stripped = text.strip()
+    if stripped.startswith("["):
+        items = json.loads(stripped)
+    else:
+        items = [json.loads(line) for line in stripped.splitlines() if line.strip()]  # JSON Lines
+
+    records = []
+    for item in items:
+        if isinstance(item, dict):
+            records.append((item.get("date"), item.get("numbers")))
+        else:
+            records.append((item[0], item[1:] if len(item) > 2 else item[1]))
+    return records
+
+
+def _parse_csv(text: str) -> List[Tuple[object, object]]:
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    if rows and rows[0][0].strip().lower() == "date":
+        rows = rows[1:]  # 標題列
+    return [(row[0], " ".join(row[1:])) for row in rows]
+
+
+def read_draw_records(source: str = "-", fmt: Optional[str] = None) -> List[Tuple[object, object]]:
+    """
+    讀取批次開獎資料（CSV / JSON / JSON Lines，檔案或標準輸入）。
+    CSV 每列為 date, numbers（numbers 可為 "1,2,3,4,5" 或拆成 5 欄）；
+    JSON 為 [{"date": ..., "numbers": [...]}] 或每行一筆。
+    :param source: 檔案路徑，"-" 代表標準輸入
+    :param fmt: "csv" 或 "json"，預設依副檔名或內容判斷
+    :return: List of (原始日期, 原始號碼)
+    """
+    text, ext = _read_source(source)
+    if fmt is None:
+        fmt = "json" if ext in (".json", ".jsonl") or text.lstrip()[:1] in ("[", "{") else "csv"
+    if fmt not in ("csv", "json"):
+        raise ValueError("fmt 必須是 'csv' 或 'json'")
+    return _parse_json(text) if fmt == "json" else _parse_csv(text)
+
+
+def validate_draws(records: List[Tuple[object, object]]) -> Tuple[List[Tuple[str, List[int]]], List[str]]:
+    """
+    驗證並正規化批次開獎資料。
+    :param records: List of (原始日期, 原始號碼)
+    :return: (有效資料 List of (ISO 日期, 號碼), 錯誤訊息清單)
+    """
+    valid: Dict[str, List[int]] = {}
+    errors = []
+    for i, (raw_date, raw_numbers) in enumerate(records, start=1):
+        try:
+            draw_date = normalize_draw_date(raw_date)
+            numbers = raw_numbers if isinstance(raw_numbers, list) else parse_numbers_safely(str(raw_numbers))
+            numbers = list(encode_draw(numbers)[:-1])
+        except (TypeError, ValueError) as e:
+            errors.append(f"第 {i} 筆：{e}")
+            continue
+        if draw_date in valid and valid[draw_date] != numbers:
+            errors.append(f"第 {i} 筆：{draw_date} 重複且號碼不一致")
+            continue
+        valid[draw_date] = numbers
+    return sorted(valid.items()), errors
+
+
+def import_draws(source: str = "-", fmt: Optional[str] = None, db_path: str = DB_PATH) -> Dict[str, int]:
+    """
+    批次匯入開獎資料：全部驗證通過後，以單一交易 UPSERT 寫入資料庫。
+    :param source: 檔案路徑，"-" 代表標準輸入
+    :param fmt: "csv" 或 "json"，預設自動判斷
+    :param db_path: SQLite 資料庫路徑
+    :return: {"inserted": 新增期數, "updated": 覆蓋期數}
+    """
+    draws, errors = validate_draws(read_draw_records(source, fmt))
+    if errors:
+        for message in errors[:10]:
+            print(f"❌ {message}")
+        raise ValueError(f"匯入資料有 {len(errors)} 筆錯誤，未寫入任何資料")
+
+    result = upsert_draws(db_path, draws)
+    print(f"✅ 已匯入 {len(draws)} 期：新增 {result['inserted']} 期，覆蓋 {result['updated']} 期")
+    return result
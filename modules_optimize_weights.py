@@ -0,0 +1,357 @@
+# modules_optimize_weights.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from feature_store import FEATURE_STORE, date_index
+from model_artifacts import save_artifact
+from model_registry import TRAIN_CONFIG
+from modules_strategy_combiner import TOP_N
+from modules_tune import walk_forward_cuts
+from score_kernels import top_k_mask
+from strategy_registry import (
+    LEADERBOARD_PATH, OPERATORS, STRATEGY_CONFIG, apply_parameters, load_strategy_config,
+    save_strategy_config, tunable_parameters,
+)
+from strategy_tensor import load_feature_tensor
+
+OPTIMIZE_KIND = "strategy_weights"  # 每次搜尋一個版本目錄：models/strategy_weights/<run_id>/
+OPTIMIZERS = ("random", "coordinate", "cma")
+
+# 🧪 walk-forward 評估：最近 N_FOLDS 段各 FOLD_DRAWS 期依序評估，最後一段只報告、不參與挑選
+N_FOLDS = 5
+FOLD_DRAWS = 200
+MIN_AVG_PICKS = 1.0        # 平均每期選號少於此數的策略，該段命中率以 0 計（避免只在少數期選一兩個號碼）
+BUDGET = 4096              # 預設候選組數
+GENERATION = 256           # 每批送進行程池的候選數（cma 的族群大小）
+CHUNK = 64                 # 每個子行程一次評估的候選數
+GRID_POINTS = 17           # coordinate 每個參數的格點數
+WEIGHT_RANGE = 3.0         # 權重搜尋範圍 [-3, 3]
+THRESHOLD_SPAN = 3.0       # 分數門檻搜尋範圍：目前值 ± 3 × max(|目前值|, 1)
+LEADERBOARD_SIZE = 100
+
+
+# 🧩 搜尋計畫：只調整不依賴模型的分數與策略（機率 / gain 類策略與權重無關，固定不動）
+def _model_free(config: Dict, columns: List[str]) -> Tuple[List[str], List[str]]:
+    """不依賴模型輸出的具名分數與策略。"""
+    free_scores = []
+    for name, weights in config.get("scores", {}).items():
+        if all(key in columns or key in free_scores for key in weights):
+            free_scores.append(name)
+    free = set(columns) | set(free_scores)
+    strategies = [
+        item["name"] for item in config["strategies"]
+        if (item.get("score") is None or item["score"] in free)
+        and all(operand in free for operand, _, _ in item.get("filter", []))
+    ]
+    return free_scores, strategies
+
+
+def search_plan(config: Dict, columns: List[str]) -> Dict:
+    """
+    由策略設定整理出搜尋參數、範圍與子行程的向量化評估計畫。
+    :return: {"params", "initial", "strategies", "scores", "predicates", "columns"}
+    """
+    free_scores, strategies = _model_free(config, columns)
+    if not strategies:
+        raise ValueError("策略設定中沒有可調整權重 / 門檻的策略")
+    params = [
+        key for key in tunable_parameters(config)
+        if (key.startswith("scores.") and key.split(".", 2)[1] in free_scores)
+        or (key.startswith("strategies.") and key.split(".", 2)[1] in strategies)
+    ]
+    values = tunable_parameters(config)
+    initial = np.array([values[key] for key in params], dtype=np.float64)
+    position = {key: i for i, key in enumerate(params)}
+
+    used = sorted({
+        key for name in free_scores for key in config["scores"][name] if key in columns
+    } | {
+        operand for item in config["strategies"] if item["name"] in strategies
+        for operand, _, _ in item.get("filter", []) if operand in columns
+    } | {
+        item["score"] for item in config["strategies"] if item["name"] in strategies and item.get("score") in columns
+    }, key=columns.index)
+    score_terms = {
+        name: [(key, position.get(f"scores.{name}.{key}"), float(value)) for key, value in config["scores"][name].items()]
+        for name in free_scores
+    }
+    predicates = {}
+    for item in config["strategies"]:
+        if item["name"] in strategies:
+            predicates[item["name"]] = (
+                item.get("score"), item.get("select", "top_n") == "all",
+                [(operand, op, position.get(f"strategies.{item['name']}.{operand}{op}"), float(value))
+                 for operand, op, value in item.get("filter", [])],
+            )
+    return {"params": params, "initial": initial, "strategies": strategies, "scores": score_terms,
+            "predicates": predicates, "columns": used}
+
+
+def parameter_bounds(plan: Dict, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """權重為 ±WEIGHT_RANGE；特徵門檻為該特徵的最小 / 最大值；分數門檻為目前值 ± THRESHOLD_SPAN 倍。"""
+    lower, upper = [], []
+    for key, value in zip(plan["params"], plan["initial"]):
+        if key.startswith("scores."):
+            lower.append(-WEIGHT_RANGE)
+            upper.append(WEIGHT_RANGE)
+            continue
+        operand = key.split(".", 2)[2].rstrip("<>=")
+        if operand in plan["columns"]:
+            column = features[..., plan["columns"].index(operand)]
+            lower.append(float(column.min()))
+            upper.append(float(column.max()))
+        else:
+            span = THRESHOLD_SPAN * max(abs(value), 1.0)
+            lower.append(value - span)
+            upper.append(value + span)
+    lower, upper = np.array(lower), np.array(upper)
+    return np.minimum(lower, plan["initial"]), np.maximum(upper, plan["initial"])
+
+
+# 🧵 子行程：評估區間的特徵子張量與標籤在初始化時載入一次，各批候選以矩陣乘法一次算完
+_shared = {}
+
+
+def _attach(features: np.ndarray, labels: np.ndarray, plan: Dict, folds: List[Tuple[int, int]], top_n: int):
+    _shared.update(features=features, labels=labels, plan=plan, folds=folds, top_n=top_n)
+
+
+def _evaluate_chunk(thetas: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    一批候選的各段命中率。
+    :param thetas: (候選數, 參數數)
+    :return: {"folds": (候選數, 段數) 目標值, "rate:<策略>" / "picks:<策略>": (候選數,) 挑選段平均}
+    """
+    features, labels, plan = _shared["features"], _shared["labels"], _shared["plan"]
+    folds, top_n = _shared["folds"], _shared["top_n"]
+    columns = plan["columns"]
+    n = len(thetas)
+
+    def value(position, constant):
+        return thetas[:, position] if position is not None else np.full(n, constant)
+
+    # 具名分數的有效權重 (候選數, 特徵數)：引用先前分數時展開為其權重的線性組合
+    weights: Dict[str, np.ndarray] = {}
+    for name, terms in plan["scores"].items():
+        W = np.zeros((n, len(columns)))
+        for key, position, constant in terms:
+            coef = value(position, constant)
+            if key in weights:
+                W += coef[:, None] * weights[key]
+            else:
+                W[:, columns.index(key)] += coef
+        weights[name] = W
+    scores = {name: np.tensordot(W.astype(np.float32), features, axes=([1], [2])) for name, W in weights.items()}
+
+    def operand_values(operand):
+        return scores[operand] if operand in scores else features[None, :, :, columns.index(operand)]
+
+    hits, picks = {}, {}
+    for name in plan["strategies"]:
+        score, select_all, predicates = plan["predicates"][name]
+        passed = np.ones((n,) + labels.shape, dtype=bool)
+        for operand, op, position, constant in predicates:
+            passed &= OPERATORS[op](operand_values(operand), value(position, constant)[:, None, None])
+        if select_all:
+            selected = passed
+        else:
+            ranked = np.broadcast_to(operand_values(score), passed.shape) if score is not None else 0.0
+            selected = top_k_mask(np.where(passed, ranked, -np.inf), top_n) & passed
+        hits[name] = (selected & labels).sum(axis=2)
+        picks[name] = selected.sum(axis=2)
+
+    objective = np.zeros((n, len(folds)))
+    result = {}
+    for name in plan["strategies"]:
+        rates = np.zeros((n, len(folds)))
+        for k, (start, end) in enumerate(folds):
+            fold_hits = hits[name][:, start:end].sum(axis=1)
+            fold_picks = picks[name][:, start:end].sum(axis=1)
+            enough = fold_picks >= MIN_AVG_PICKS * (end - start)
+            rates[:, k] = np.where(enough, fold_hits / np.maximum(fold_picks, 1), 0.0)
+        objective += rates / len(plan["strategies"])
+        result[f"rate:{name}"] = rates[:, :-1].mean(axis=1)
+        result[f"picks:{name}"] = picks[name][:, folds[0][0]:folds[-2][1]].mean(axis=1)
+    result["folds"] = objective
+    return result
+
+
+class _Search:
+    """候選評估與紀錄：候選分批送進行程池，所有結果留作排行榜。"""
+
+    def __init__(self, pool: ProcessPoolExecutor, budget: int):
+        self.pool = pool
+        self.budget = budget
+        self.thetas: List[np.ndarray] = []
+        self.results: List[Dict[str, np.ndarray]] = []
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return self.budget - self.used
+
+    def evaluate(self, thetas: np.ndarray) -> np.ndarray:
+        """評估一批候選，回傳挑選段（最後一段除外）的平均目標值。"""
+        thetas = thetas[: max(self.remaining, 0)]
+        if not len(thetas):
+            return np.empty(0)
+        chunks = [thetas[i:i + CHUNK] for i in range(0, len(thetas), CHUNK)]
+        merged: Dict[str, np.ndarray] = {}
+        for result in self.pool.map(_evaluate_chunk, chunks):
+            for key, array in result.items():
+                merged[key] = np.concatenate([merged[key], array]) if key in merged else array
+        self.thetas.append(thetas)
+        self.results.append(merged)
+        self.used += len(thetas)
+        return merged["folds"][:, :-1].mean(axis=1)
+
+    def leaderboard(self, params: List[str]) -> pd.DataFrame:
+        thetas = np.concatenate(self.thetas)
+        folds = np.concatenate([result["folds"] for result in self.results])
+        board = pd.DataFrame({
+            "objective": folds[:, :-1].mean(axis=1),
+            "objective_std": folds[:, :-1].std(axis=1),
+            "holdout": folds[:, -1],
+        })
+        for key in self.results[0]:
+            if key != "folds":
+                board[key] = np.concatenate([result[key] for result in self.results])
+        board = pd.concat([board, pd.DataFrame(thetas, columns=params)], axis=1)
+        board.insert(0, "candidate", np.arange(len(board)))
+        return board.sort_values(["objective", "candidate"], ascending=[False, True], kind="stable").reset_index(drop=True)
+
+
+# 🔍 搜尋方式：皆以目前設定為第一個候選，目標為挑選段平均命中率（越高越好）
+def _random_search(search: _Search, initial: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                   rng: np.random.Generator):
+    search.evaluate(initial[None])
+    while search.remaining > 0:
+        search.evaluate(rng.uniform(lower, upper, (min(GENERATION, search.remaining), len(initial))))
+
+
+def _coordinate_search(search: _Search, initial: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                       rng: np.random.Generator):
+    best = initial.copy()
+    best_score = search.evaluate(best[None])[0]
+    span = upper - lower
+    while search.remaining > 0 and (span > 1e-3 * (upper - lower + 1e-12)).any():
+        improved = False
+        for p in rng.permutation(len(best)):
+            grid = np.clip(np.linspace(best[p] - span[p] / 2, best[p] + span[p] / 2, GRID_POINTS), lower[p], upper[p])
+            candidates = np.repeat(best[None], GRID_POINTS, axis=0)
+            candidates[:, p] = grid
+            scores = search.evaluate(candidates)
+            if not len(scores):
+                return
+            i = int(np.argmax(scores))
+            if scores[i] > best_score + 1e-12:
+                best, best_score, improved = candidates[i].copy(), scores[i], True
+        if not improved:
+            span = span / 2  # 一整輪沒有進步：縮小格點範圍，在最佳點附近細搜
+
+
+def _cma_search(search: _Search, initial: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+                rng: np.random.Generator):
+    """對角共變異數的演化策略（CMA 風格）：在正規化到 [0, 1] 的空間內，依菁英候選更新平均與各維步長。"""
+    width = np.where(upper > lower, upper - lower, 1.0)
+    mean = (initial - lower) / width
+    sigma = np.full(len(initial), 0.3)
+    mu = GENERATION // 4
+    weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+    weights /= weights.sum()
+    learning_rate = 0.3
+
+    search.evaluate(initial[None])
+    while search.remaining > 0:
+        population = np.clip(mean + sigma * rng.standard_normal((GENERATION, len(initial))), 0.0, 1.0)
+        scores = search.evaluate(lower + population * width)
+        if len(scores) < mu:
+            return
+        elite = population[np.argsort(-scores, kind="stable")[:mu]]
+        spread = np.sqrt(weights @ (elite - mean) ** 2)
+        mean = weights @ elite
+        sigma = np.maximum((1 - learning_rate) * sigma + learning_rate * spread, 1e-3)
+
+
+SEARCHES = {"random": _random_search, "coordinate": _coordinate_search, "cma": _cma_search}
+
+
+def optimize_weights(
+    optimizer: str = "cma",
+    budget: Optional[int] = None,
+    top_n: int = TOP_N,
+    config_path: Optional[str] = None,
+    store_path: str = FEATURE_STORE,
+    max_workers: Optional[int] = None,
+    seed: int = 42,
+) -> Dict:
+    """
+    搜尋策略設定中手動分數的權重與條件選號門檻，目標為 walk-forward 命中率（命中數 / 選號數）。
+    最近 N_FOLDS 段各 FOLD_DRAWS 期依序評估：前 N_FOLDS-1 段的平均命中率用於挑選，最後一段只報告（holdout）。
+    特徵子張量在各子行程只載入一次，候選分批以矩陣乘法 + argpartition 一次評估。
+    :param optimizer: 'random'、'coordinate'（座標下降）或 'cma'（對角 CMA 風格演化策略）
+    :param budget: 候選組數（預設 BUDGET）
+    :param top_n: 各策略選出的號碼數
+    :param config_path: 基底策略設定檔（預設 STRATEGY_CONFIG）
+    :param store_path: 特徵庫目錄
+    :param max_workers: 行程數，預設為 CPU 數
+    :param seed: 亂數種子
+    :return: {"run_id", "params", "objective", "holdout", "baseline", "config_path", "leaderboard"}
+    """
+    if optimizer not in SEARCHES:
+        raise ValueError(f"optimizer 必須是 {' / '.join(OPTIMIZERS)}")
+    config_path = config_path or STRATEGY_CONFIG
+    config = load_strategy_config(config_path)
+
+    index = date_index(store_path)
+    cuts = walk_forward_cuts(len(index), N_FOLDS, FOLD_DRAWS)
+    offset = cuts[0][0]
+    data = load_feature_tensor(store_path, start=str(index[offset]))
+    plan = search_plan(config, data.columns)
+    if not plan["params"]:
+        raise ValueError("策略設定中沒有可搜尋的權重或門檻")
+    features = np.ascontiguousarray(data.features[:, :, [data.columns.index(col) for col in plan["columns"]]])
+    folds = [(start - offset, end - offset) for start, end in cuts]
+    lower, upper = parameter_bounds(plan, features)
+
+    budget = budget or BUDGET
+    workers = max_workers or TRAIN_CONFIG["n_jobs"]
+    print(f"🎛️ 策略權重搜尋（{optimizer}）：{len(plan['params'])} 個參數，{budget} 組候選 × {len(folds)} 段 "
+          f"（{len(data.dates)} 期），{workers} 個行程")
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                             initargs=(features, data.labels, plan, folds, top_n)) as pool:
+        search = _Search(pool, budget)
+        SEARCHES[optimizer](search, plan["initial"], lower, upper, np.random.default_rng(seed))
+    seconds = time.perf_counter() - started
+
+    board = search.leaderboard(plan["params"])
+    baseline = board.loc[board["candidate"] == 0].iloc[0]
+    best = board.iloc[0]
+    best_params = {key: float(best[key]) for key in plan["params"]}
+
+    run_id = datetime.now().strftime("weights-%Y%m%d-%H%M%S")
+    run_dir = save_artifact(OPTIMIZE_KIND, run_id, {}, {
+        "optimizer": optimizer, "budget": budget, "evaluated": search.used, "seconds": round(seconds, 3),
+        "candidates_per_second": round(search.used / seconds, 1) if seconds else None,
+        "folds": len(folds), "fold_draws": FOLD_DRAWS, "top_n": top_n, "base_config": config_path,
+        "params": best_params, "objective": float(best["objective"]), "holdout": float(best["holdout"]),
+        "baseline": {"objective": float(baseline["objective"]), "holdout": float(baseline["holdout"])},
+    })
+    leaderboard = board.head(LEADERBOARD_SIZE)
+    for path in (os.path.join(run_dir, "leaderboard.csv"), LEADERBOARD_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        leaderboard.to_csv(path, index=False)
+    best_config_path = os.path.join(run_dir, "strategies.json")
+    save_strategy_config(apply_parameters(config, best_params), best_config_path)
+
+    print(f"⚡ 共評估 {search.used} 組，{seconds:.1f} 秒（每秒 {search.used / max(seconds, 1e-9):.0f} 組）")
+    print(f"📏 目前設定：命中率 {baseline['objective']:.4f}（holdout {baseline['holdout']:.4f}）")
+    print(f"🏆 最佳設定：命中率 {best['objective']:.4f}（holdout {best['holdout']:.4f}）")
+    return {"run_id": run_id, "params": best_params, "objective": float(best["objective"]),
+            "holdout": float(best["holdout"]), "baseline": float(baseline["objective"]),
+            "config_path": best_config_path, "leaderboard": leaderboard}
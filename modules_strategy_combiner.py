@@ -1,90 +1,46 @@
 # modules_strategy_combiner.py
 
 import pandas as pd
-from xgboost import XGBClassifier
+from typing import Optional
+from feature_store import features_as_of, model_matrix, next_draw_features
+from model_registry import load_model, model_features, score_matrix
+from score_kernels import weight_vector
+from strategy_registry import strategy_evaluator
 
-FEATURE_CSV = "features.csv"
 TOP_N = 10
-CONDITION_PARAMS = {
-    "cooldown": 15,
-    "momentum": -1,
-    "score": 1.5
-}
-
-def generate_strategy(top_n: int = TOP_N):
-    df = pd.read_csv(FEATURE_CSV)
-    latest_date = df["date"].max()
-    latest_df = df[df["date"] == latest_date].copy()
-
-    # 🧠 手動加權分數
-    latest_df["score"] = (
-        1.2 * latest_df["is_hot_tail"] +
-        1.0 * latest_df["is_recent_hot"] +
-        0.8 * latest_df["momentum"] +
-        0.6 * latest_df["draw_streak"] +
-        0.5 * latest_df["freq_20"] +
-        0.3 * latest_df["tail_freq_10"] -
-        0.2 * latest_df["cooldown"]
-    )
-    topn_selected = latest_df.sort_values(by="score", ascending=False).head(top_n)
-
-    # 📊 條件選號
-    condition_selected = latest_df[
-        (latest_df["is_hot_tail"] == 1) &
-        (latest_df["momentum"] >= CONDITION_PARAMS["momentum"]) &
-        (latest_df["cooldown"] < CONDITION_PARAMS["cooldown"]) &
-        (latest_df["score"] >= CONDITION_PARAMS["score"])
-    ]
-
-    # 🔮 模型預測機率
-    X = df.drop(columns=["date", "number", "is_drawn"])
-    y = df["is_drawn"]
-    model = XGBClassifier(
-        n_estimators=100,
-        max_depth=6,
-        learning_rate=0.1,
-        scale_pos_weight=6,
-        eval_metric="logloss",
-        random_state=42
-    )
-    model.fit(X, y)
-    X_latest = latest_df[X.columns]
-    latest_df["prob"] = model.predict_proba(X_latest)[:, 1]
-    model_selected = latest_df.sort_values(by="prob", ascending=False).head(top_n)
-
-    # 📈 模型加權分數（gain_score）
-    gain_dict = model.get_booster().get_score(importance_type='gain')
-    latest_df["gain_score"] = latest_df.apply(
-        lambda row: sum(gain_dict.get(f, 0) * row.get(f, 0) for f in gain_dict),
-        axis=1
-    )
-    gain_selected = latest_df.sort_values(by="gain_score", ascending=False).head(top_n)
-
-    # 🧠 自動策略分數（auto_score）
-    total_gain = sum(gain_dict.values())
-    gain_weights = {k: v / total_gain for k, v in gain_dict.items()}
-    latest_df["auto_score"] = latest_df.apply(
-        lambda row: sum(gain_weights.get(f, 0) * row.get(f, 0) for f in gain_weights),
-        axis=1
-    )
-
-    # 🔗 融合分數
-    latest_df["fusion_score"] = (
-        0.5 * latest_df["auto_score"] +
-        0.5 * latest_df["prob"]
-    )
-    fusion_selected = latest_df.sort_values(by="fusion_score", ascending=False).head(top_n)
+# 📜 各策略的權重、篩選條件與融合比例宣告於 strategies.json（strategy_registry）
+
+def generate_strategy(top_n: int = TOP_N, as_of: Optional[str] = None):
+    """
+    以 as_of 當天可用的資料產生多策略選號。
+    指定 as_of 時模型只以 as_of 之前的期數訓練，可對任一歷史期別回測而不洩漏答案；
+    未指定時（即時選號）對尚未開出的下一期選號（next_draw_features），
+    與重訓、strategy_combiner.py 共用以全部已開出期數訓練的模型，機率皆為樣本外。
+    :param top_n: 各策略選出的號碼數
+    :param as_of: 日期 YYYY-MM-DD
+    """
+    latest_df = (features_as_of(as_of) if as_of else next_draw_features()).copy()
+
+    # 🔮 模型預測機率（相同資料與超參數的模型直接取用，不重訓；機率取自全期批次評分）
+    scores = score_matrix(as_of=as_of)
+    model, gain_dict = load_model(scores.key)
+    prob = scores.on(str(latest_df["date"].iloc[0]))
+    if prob is not None:
+        prob = prob[latest_df["number"].to_numpy(dtype=int) - 1]
+    else:  # 特徵庫之後的下一期（由滾動狀態算出）不在評分矩陣內
+        prob = model.predict_proba(model_matrix(latest_df, model_features(model)))[:, 1]
+
+    # 📜 策略登錄：手動加權、條件選號、模型機率、模型加權、融合分數一次向量化計算
+    X = model_matrix(latest_df)
+    columns = X.columns.tolist()
+    evaluator = strategy_evaluator(columns)
+    values, _, selected = evaluator.evaluate(X.to_numpy(), prob, weight_vector(gain_dict, columns), top_n)
+    for name, value in values.items():
+        latest_df[name] = value
+    numbers = latest_df["number"].to_numpy()
+    sets = {name: set(numbers[mask].tolist()) for name, mask in selected.items()}
 
     # 📋 建立選號來源對照表
-    def extract_numbers(df): return set(df["number"].tolist())
-    sets = {
-        "Top-N": extract_numbers(topn_selected),
-        "條件選號": extract_numbers(condition_selected),
-        "模型機率": extract_numbers(model_selected),
-        "模型加權": extract_numbers(gain_selected),
-        "融合選號": extract_numbers(fusion_selected)
-    }
-
     all_numbers = sorted(set.union(*sets.values()))
     source_map = []
     for num in all_numbers:
@@ -0,0 +1,255 @@
+# modules_tune.py
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import log_loss
+from sklearn.multioutput import MultiOutputClassifier
+from db_loader import NUM_BALLS
+from draw_history import load_draws
+from feature_store import FEATURE_STORE, date_index, read_manifest
+from head_tail_trainer import KINDS, LOOKBACK, RF_PARAMS, build_dataset, build_matrix, train_head_tail
+from model_artifacts import TUNING_KIND, artifact_dir, save_artifact
+from model_registry import TRAIN_CONFIG, XGB_PARAMS, booster_params, get_model, model_key, training_arrays
+
+DB_PATH = "lotto_data.db"
+TRIALS_PATH = os.path.join(artifact_dir(TUNING_KIND), "trials.csv")
+
+# 🧪 walk-forward 交叉驗證：擴張訓練視窗，之後各接 VALID_DRAWS 期驗證
+N_FOLDS = 4
+VALID_DRAWS = 150
+EARLY_STOPPING_ROUNDS = 20
+MAX_ROUNDS = 400
+RANDOM_TRIALS = 48  # random 模式未指定 trial 數時的預設值
+MIN_TUNED_TREES = 20  # 最佳設定的樹數低於此值視為退化（early stopping 幾乎立即停止），不採用為預設值
+
+# 🔍 預設搜尋範圍：未列出的鍵沿用 XGB_PARAMS / RF_PARAMS
+XGB_SEARCH_SPACE = {
+    "max_depth": [3, 4, 6, 8],
+    "learning_rate": [0.03, 0.05, 0.1, 0.2],
+    "scale_pos_weight": [1, 3, 6],
+    "min_child_weight": [1, 5, 20],
+    "subsample": [0.8, 1.0],
+    "colsample_bytree": [0.8, 1.0],
+}
+RF_SEARCH_SPACE = {
+    "lookback": [3, 5, 7, 10],
+    "n_estimators": [100, 200],
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 5, 20],
+}
+
+
+def search_candidates(space: Dict[str, list], search: str = "grid", n_trials: Optional[int] = None,
+                      seed: int = 42) -> List[Dict]:
+    """
+    展開搜尋範圍。
+    :param space: {參數: 候選值清單}
+    :param search: 'grid' 全部組合，或 'random' 隨機抽 n_trials 組（不重複）
+    :param n_trials: random 模式的組數（預設 RANDOM_TRIALS）；grid 模式下超過時隨機截取
+    :return: 參數組清單
+    """
+    keys = list(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if search == "grid" and (n_trials is None or n_trials >= len(grid)):
+        return grid
+    if search not in ("grid", "random"):
+        raise ValueError("search 必須是 'grid' 或 'random'")
+    return random.Random(seed).sample(grid, min(n_trials or RANDOM_TRIALS, len(grid)))
+
+
+def walk_forward_cuts(n_draws: int, n_folds: int = N_FOLDS, valid_draws: int = VALID_DRAWS) -> List[Tuple[int, int]]:
+    """
+    各折的 (訓練截止, 驗證截止) 期數位置：第 k 折以 [0, cut) 訓練、[cut, cut+valid_draws) 驗證。
+    """
+    first = n_draws - n_folds * valid_draws
+    if first <= valid_draws:
+        raise ValueError(f"期數不足：{n_draws} 期無法切出 {n_folds} 折 × {valid_draws} 期驗證")
+    return [(first + k * valid_draws, first + (k + 1) * valid_draws) for k in range(n_folds)]
+
+
+# 🧵 子行程：XGBoost 訓練矩陣以記憶體映射共用，各折的量化矩陣在行程內只建一次
+_shared = {}
+
+
+def _attach_xgb(x_path: str, y_path: str, columns: List[str], folds: List[Tuple[int, int]], nthread: int):
+    _shared.update(
+        X=np.load(x_path, mmap_mode="r"), y=np.load(y_path, mmap_mode="r"), columns=columns,
+        folds=folds, nthread=nthread, dmatrix={},
+    )
+
+
+def _fold_dmatrix(fold: int, max_bin: int) -> Tuple[xgb.DMatrix, xgb.DMatrix]:
+    key = (fold, max_bin)
+    if key not in _shared["dmatrix"]:
+        train_end, valid_end = _shared["folds"][fold]
+        X, y, columns, nthread = _shared["X"], _shared["y"], _shared["columns"], _shared["nthread"]
+        dtrain = xgb.QuantileDMatrix(X[:train_end], label=y[:train_end], feature_names=columns,
+                                     max_bin=max_bin, nthread=nthread)
+        dvalid = xgb.QuantileDMatrix(X[train_end:valid_end], label=y[train_end:valid_end], feature_names=columns,
+                                     ref=dtrain, nthread=nthread)
+        _shared["dmatrix"][key] = (dtrain, dvalid)
+    return _shared["dmatrix"][key]
+
+
+def _xgb_trial(trial: int, params: Dict) -> Dict:
+    native, _ = booster_params(params)
+    native["nthread"] = _shared["nthread"]
+    started = time.perf_counter()
+    scores, rounds = [], []
+    for fold in range(len(_shared["folds"])):
+        dtrain, dvalid = _fold_dmatrix(fold, params.get("max_bin", 256))
+        booster = xgb.train(native, dtrain, num_boost_round=MAX_ROUNDS, evals=[(dvalid, "valid")],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        scores.append(booster.best_score)
+        rounds.append(booster.best_iteration + 1)
+    return {
+        "trial": trial, "params": params, "score": float(np.mean(scores)), "score_std": float(np.std(scores)),
+        "rounds": int(np.median(rounds)), "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _attach_rf(matrices: Dict[str, np.ndarray], cuts: List[Tuple[int, int]], nthread: int):
+    _shared.update(matrices=matrices, cuts=cuts, nthread=nthread)
+
+
+def _rf_trial(trial: int, params: Dict) -> Dict:
+    lookback = params["lookback"]
+    rf_params = {**RF_PARAMS, **{k: v for k, v in params.items() if k != "lookback"}}
+    started = time.perf_counter()
+    scores = []
+    for cut, valid_end in _shared["cuts"]:
+        losses = []
+        for kind in KINDS:
+            X, y = build_dataset(_shared["matrices"][kind], lookback)  # 第 i 列預測第 i+lookback 期
+            train_rows, valid_rows = cut - lookback, valid_end - lookback
+            model = MultiOutputClassifier(RandomForestClassifier(**rf_params, n_jobs=_shared["nthread"]))
+            model.fit(X[:train_rows], y[:train_rows])
+            probs = model.predict_proba(X[train_rows:valid_rows])
+            y_valid = y[train_rows:valid_rows]
+            losses.extend(
+                log_loss(y_valid[:, j], prob[:, -1], labels=[0, 1]) for j, prob in enumerate(probs)
+            )
+        scores.append(float(np.mean(losses)))
+    return {
+        "trial": trial, "params": params, "score": float(np.mean(scores)), "score_std": float(np.std(scores)),
+        "rounds": rf_params["n_estimators"], "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _run_trials(worker, initializer, initargs, candidates: List[Dict], max_workers: int) -> pd.DataFrame:
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs) as pool:
+        futures = [pool.submit(worker, trial, params) for trial, params in enumerate(candidates)]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            print(f"🧪 trial {result['trial']:>3}：logloss {result['score']:.5f}（{result['seconds']:.1f} 秒）{result['params']}")
+    return pd.DataFrame(results).sort_values("score").reset_index(drop=True)
+
+
+def _save_trials(run_id: str, model: str, trials: pd.DataFrame):
+    os.makedirs(os.path.dirname(TRIALS_PATH), exist_ok=True)
+    table = trials.assign(run_id=run_id, model=model, params=trials["params"].map(repr))
+    table.to_csv(TRIALS_PATH, mode="a", header=not os.path.exists(TRIALS_PATH), index=False)
+
+
+def _worker_split(max_workers: Optional[int]) -> Tuple[int, int]:
+    workers = max_workers or TRAIN_CONFIG["n_jobs"]
+    return workers, max(1, TRAIN_CONFIG["n_jobs"] // workers)
+
+
+def _promotable(model: str, params: Dict, promote: bool) -> bool:
+    """是否採用為預設超參數：需明確指定 promote，且最佳設定不是退化的結果。"""
+    if not promote:
+        print(f"ℹ️ {model} 調參結果未採用為預設值（加上 --promote-tuned 才會取代預設超參數）")
+        return False
+    if params.get("n_estimators", 100) < MIN_TUNED_TREES:
+        print(f"⚠️ {model} 最佳設定只有 {params.get('n_estimators')} 棵樹（< {MIN_TUNED_TREES}），視為退化，不採用為預設值")
+        return False
+    return True
+
+
+def tune_xgb(search: str = "grid", n_trials: Optional[int] = None, space: Dict[str, list] = XGB_SEARCH_SPACE,
+             store_path: str = FEATURE_STORE, max_workers: Optional[int] = None, promote: bool = False) -> Dict:
+    """
+    主模型超參數搜尋：walk-forward 交叉驗證 + early stopping，trial 分散到行程池。
+    最佳參數（回合數取各折 early stopping 的中位數）以全部期數訓練後登錄到模型登錄。
+    :param promote: 採用為預設超參數（見 model_registry.default_params；退化的結果不採用）
+    :return: {"run_id", "params", "score", "registry_key", "promoted", "trials"}
+    """
+    index = date_index(store_path)
+    X, y, columns = training_arrays(store_path)
+    if len(X) != len(index) * NUM_BALLS:
+        raise ValueError("特徵庫每期列數不一致，無法以期數切分交叉驗證")
+    folds = [(cut * NUM_BALLS, end * NUM_BALLS) for cut, end in walk_forward_cuts(len(index))]
+    candidates = [{**XGB_PARAMS, **params} for params in search_candidates(space, search, n_trials)]
+    workers, nthread = _worker_split(max_workers)
+
+    print(f"🔍 主模型調參：{len(candidates)} 組 × {len(folds)} 折，{workers} 個行程")
+    trials = _run_trials(_xgb_trial, _attach_xgb, (X.filename, y.filename, columns, folds, nthread),
+                         candidates, workers)
+    best = trials.iloc[0]
+    best_params = {**best["params"], "n_estimators": int(best["rounds"])}
+
+    run_id = datetime.now().strftime("xgb-%Y%m%d-%H%M%S")
+    _save_trials(run_id, "xgb", trials)
+    get_model(params=best_params, store_path=store_path)
+    registry_key = model_key(read_manifest(store_path), best_params)
+    promoted = _promotable("xgb", best_params, promote)
+    save_artifact(TUNING_KIND, run_id, {}, {
+        "model": "xgb", "params": best_params, "score": float(best["score"]), "search": search,
+        "trials": len(trials), "folds": len(folds), "valid_draws": VALID_DRAWS, "store_path": store_path,
+        "registry_key": registry_key, "promoted": promoted,
+    })
+    print(f"🏆 最佳主模型參數（logloss {best['score']:.5f}）：{best_params}")
+    return {"run_id": run_id, "params": best_params, "score": float(best["score"]), "registry_key": registry_key,
+            "promoted": promoted, "trials": trials}
+
+
+def tune_rf(search: str = "grid", n_trials: Optional[int] = None, space: Dict[str, list] = RF_SEARCH_SPACE,
+            db_path: str = DB_PATH, max_workers: Optional[int] = None, promote: bool = False) -> Dict:
+    """
+    頭尾模型超參數與回溯期數搜尋：walk-forward 交叉驗證，trial 分散到行程池。
+    出現矩陣只建一次，各 trial 的回溯資料集皆為其上的 view；最佳設定訓練後存成頭尾模型版本。
+    :param promote: 採用為預設回溯期數與超參數（見 head_tail_trainer.default_head_tail；退化的結果不採用）
+    :return: {"run_id", "params", "lookback", "score", "version", "promoted", "trials"}
+    """
+    draws = load_draws(db_path)
+    matrices = {kind: build_matrix(draws, mode=kind) for kind in KINDS}
+    cuts = walk_forward_cuts(len(draws))
+    candidates = [{"lookback": LOOKBACK, **params} for params in search_candidates(space, search, n_trials)]
+    workers, nthread = _worker_split(max_workers)
+
+    print(f"🔍 頭尾模型調參：{len(candidates)} 組 × {len(cuts)} 折，{workers} 個行程")
+    trials = _run_trials(_rf_trial, _attach_rf, (matrices, cuts, nthread), candidates, workers)
+    best = trials.iloc[0]
+    lookback = int(best["params"]["lookback"])
+    best_params = {**RF_PARAMS, **{k: v for k, v in best["params"].items() if k != "lookback"}}
+
+    run_id = datetime.now().strftime("rf-%Y%m%d-%H%M%S")
+    _save_trials(run_id, "rf", trials)
+    models = train_head_tail(db_path, lookback=lookback, params=best_params)
+    promoted = _promotable("rf", best_params, promote)
+    save_artifact(TUNING_KIND, run_id, {}, {
+        "model": "rf", "params": best_params, "lookback": lookback, "score": float(best["score"]),
+        "search": search, "trials": len(trials), "folds": len(cuts), "valid_draws": VALID_DRAWS,
+        "head_tail_version": models.version, "promoted": promoted,
+    })
+    print(f"🏆 最佳頭尾模型設定（logloss {best['score']:.5f}）：回溯 {lookback} 期，{best_params}")
+    return {"run_id": run_id, "params": best_params, "lookback": lookback, "score": float(best["score"]),
+            "version": models.version, "promoted": promoted, "trials": trials}
+
+
+def read_trials() -> pd.DataFrame:
+    """所有調參 trial 紀錄。"""
+    if not os.path.exists(TRIALS_PATH):
+        return pd.DataFrame()
+    return pd.read_csv(TRIALS_PATH)
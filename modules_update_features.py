@@ -1,101 +1,115 @@
 #modules_update_features.py
 import os
 import pandas as pd
-from ml_feature_generator import generate_features
+from typing import Optional
+from ml_feature_generator import (
+    generate_features, init_feature_state, feature_rows_from_state,
+    advance_feature_state, save_feature_state, load_feature_state
+)
 from parser import parse_numbers_safely
-from db_loader import load_lotto_history
-import sqlite3
+from db_loader import (
+    normalize_draw_date, encode_draw, resequence_draws, transaction,
+    get_db_watermark, row_checksum
+)
+from draw_history import load_draw_history
+from feature_store import (
+    check_staleness, read_manifest, write_manifest, manifest_schema_current,
+    write_features, append_features, read_features, FEATURE_STORE, FEATURE_STATE
+)
 
 DB_PATH = "lotto_data.db"
-FEATURE_CSV = "features.csv"
+FEATURE_CSV = None  # 設定路徑（例如 "features.csv"）即在重建特徵庫時一併匯出 CSV
 
 def standardize_date(date_str: str) -> str:
-    return pd.to_datetime(date_str, errors="coerce").strftime("%Y-%m-%d")
+    return normalize_draw_date(date_str)
 
 def insert_draw_to_db(db_path: str, draw_date: str, drawn_numbers: set):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    numbers_str = ",".join(map(str, sorted(drawn_numbers)))
+    encoded = encode_draw(drawn_numbers)
+    numbers_str = ",".join(map(str, encoded[:-1]))
     draw_date_std = standardize_date(draw_date)
 
-    cursor.execute("SELECT COUNT(*) FROM lotto_data WHERE date = ?", (draw_date_std,))
-    if cursor.fetchone()[0] > 0:
-        print(f"⚠️ 資料庫已包含 {draw_date_std}，將覆蓋該期資料")
-        cursor.execute("DELETE FROM lotto_data WHERE date = ?", (draw_date_std,))
-
-    cursor.execute("INSERT INTO lotto_data (date, numbers) VALUES (?, ?)", (draw_date_std, numbers_str))
-    conn.commit()
-    conn.close()
+    with transaction(db_path) as conn:
+        if conn.execute("SELECT COUNT(*) FROM lotto_data WHERE date = ?", (draw_date_std,)).fetchone()[0] > 0:
+            print(f"⚠️ 資料庫已包含 {draw_date_std}，將覆蓋該期資料")
+            conn.execute("DELETE FROM lotto_data WHERE date = ?", (draw_date_std,))
+
+        latest_date, latest_seq = conn.execute("SELECT MAX(date), COALESCE(MAX(seq), 0) FROM lotto_data").fetchone()
+        conn.execute(
+            "INSERT INTO lotto_data (seq, date, n1, n2, n3, n4, n5, mask) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (latest_seq + 1, draw_date_std, *encoded)
+        )
+        if latest_date and draw_date_std < latest_date:
+            resequence_draws(conn)  # 補登舊期數，期序需重排
     print(f"✅ 已將 {draw_date_std} 的開獎號碼寫入資料庫：{numbers_str}")
 
+def is_feature_outdated(feature_path: str, db_path: str) -> bool:
+    outdated, reason = check_staleness(db_path, feature_path)
+    if outdated:
+        print(f"⚠️ {reason}，需重新產生特徵表")
+    return outdated
+
+def regenerate_features() -> pd.DataFrame:
+    print("🔄 特徵表過期或資料庫有更新，重新產生中...")
+    try:
+        df_features = generate_features(DB_PATH, max_rows=None)  # 向量化後可直接重建全部歷史
+        write_features(df_features, FEATURE_STORE, csv_path=FEATURE_CSV)
+        save_feature_state(FEATURE_STATE, init_feature_state(load_draw_history(DB_PATH)))
+        write_manifest(df_features.columns.tolist(), len(df_features), DB_PATH, FEATURE_STORE)
+        print(f"✅ 特徵表已更新，共 {len(df_features)} 筆號碼")
+        return df_features
+    except Exception as e:
+        print("❌ 特徵表更新失敗：", e)
+        return pd.DataFrame()
+
+def refresh_features() -> pd.DataFrame:
+    """資料庫已寫入新期數後（例如批次匯入），只在需要時重新產生特徵表。"""
+    if is_feature_outdated(FEATURE_STORE, DB_PATH):
+        return regenerate_features()
+    return read_features()
+
+def append_draw_features(draw_date_std: str, drawn_numbers: set) -> Optional[pd.DataFrame]:
+    """
+    新一期為資料庫最新期且滾動狀態與特徵表一致時，只計算並附加該期 39 列特徵。
+    :return: 新增的特徵列；無法增量更新時回傳 None
+    """
+    state = load_feature_state(FEATURE_STATE)
+    manifest = read_manifest(FEATURE_STORE)
+    if state is None or manifest is None or not os.path.isdir(FEATURE_STORE):
+        return None
+    watermark = get_db_watermark(DB_PATH)
+    if watermark["date"] != draw_date_std or int(state["n_draws"]) != watermark["seq"] - 1:
+        return None
+    # 特徵表涵蓋的內容 + 本期 = 目前資料庫內容，才可直接附加
+    expected_checksum = (manifest.get("db_checksum") or 0) + row_checksum(draw_date_std, encode_draw(drawn_numbers)[-1])
+    if manifest.get("last_seq") != watermark["seq"] - 1 or expected_checksum != watermark["checksum"]:
+        return None
+    if not manifest_schema_current(manifest):
+        return None
+
+    df_new = feature_rows_from_state(state, draw_date_std, drawn_numbers)
+    append_features(df_new, FEATURE_STORE)
+    if FEATURE_CSV and os.path.exists(FEATURE_CSV):
+        df_new.to_csv(FEATURE_CSV, mode="a", header=False, index=False)
+    save_feature_state(FEATURE_STATE, advance_feature_state(state, draw_date_std, drawn_numbers))
+    write_manifest(df_new.columns.tolist(), manifest["rows"] + len(df_new), DB_PATH, FEATURE_STORE)
+    print(f"✅ 已增量附加期別 {draw_date_std} 的特徵資料，共 {len(df_new)} 筆號碼")
+    return df_new
+
 def update_features(draw_date: str, drawn_numbers_str: str) -> pd.DataFrame:
-    draw_date_std = pd.to_datetime(draw_date, errors="coerce").strftime("%Y-%m-%d")
+    draw_date_std = standardize_date(draw_date)
     drawn_numbers = set(parse_numbers_safely(drawn_numbers_str))
 
     insert_draw_to_db(DB_PATH, draw_date_std, drawn_numbers)
 
-    def is_feature_outdated(feature_csv_path: str, db_path: str) -> bool:
-        if not os.path.exists(feature_csv_path):
-            print("⚠️ 特徵表不存在，需重新產生")
-            return True
-
-        try:
-            existing_df = pd.read_csv(feature_csv_path)
-            latest_csv_date = pd.to_datetime(existing_df["date"].max(), errors="coerce")
-        except Exception as e:
-            print("⚠️ 無法讀取現有特徵表或日期欄位：", e)
-            return True
+    df_new = append_draw_features(draw_date_std, drawn_numbers)
+    if df_new is not None:
+        return df_new
 
-        try:
-            expected_df = generate_features(db_path, max_rows=100)
-            latest_db_date = pd.to_datetime(expected_df["date"].max(), errors="coerce")
-        except Exception as e:
-            print("⚠️ 無法產生預期特徵表，請檢查 generate_features 或資料庫：", e)
-            return True
-
-        if latest_db_date > latest_csv_date:
-            print(f"⚠️ 資料庫有更新（{latest_db_date} > {latest_csv_date}），需重新產生特徵表")
-            return True
-
-        REQUIRED_COLUMNS = [
-            "draw_streak", "last_draw_gap", "cooldown", "momentum",
-            "freq_10", "freq_20", "freq_30", "tail_digit", "zone",
-            "tail_freq_10", "is_hot_tail", "streak_cooldown_combo", "is_recent_hot"
-        ]
-        missing_columns = set(REQUIRED_COLUMNS) - set(existing_df.columns)
-        if missing_columns:
-            print("⚠️ 特徵表缺少欄位：", missing_columns)
-            return True
-
-        return False
-
-    if is_feature_outdated(FEATURE_CSV, DB_PATH):
-        print("🔄 特徵表過期或資料庫有更新，重新產生中...")
-        try:
-            df_features = generate_features(DB_PATH, max_rows=5000)
-            df_features["date"] = df_features["date"].astype(str)
-            df_features.to_csv(FEATURE_CSV, index=False)
-            print(f"✅ 特徵表已更新，共 {len(df_features)} 筆號碼")
-        except Exception as e:
-            print("❌ 特徵表更新失敗：", e)
-            return pd.DataFrame()
+    # 覆蓋或補登舊期數會改變資料庫檢查碼，特徵表隨之整表重建
+    if is_feature_outdated(FEATURE_STORE, DB_PATH):
+        df_features = regenerate_features()
     else:
-        df_features = pd.read_csv(FEATURE_CSV)
-        df_features["date"] = df_features["date"].astype(str)
-
-        if draw_date_std in df_features["date"].values:
-            print(f"⚠️ 特徵資料已包含期別 {draw_date_std}，將覆蓋該期標記")
-            mask = df_features["date"] == draw_date_std
-            df_features.loc[mask, "is_drawn"] = df_features.loc[mask, "number"].apply(
-                lambda n: int(n in drawn_numbers)
-            )
-            try:
-                df_features.to_csv(FEATURE_CSV, index=False)
-                print(f"✅ 已更新特徵資料，共 {len(df_features)} 筆號碼")
-            except Exception as e:
-                print(f"❌ CSV 寫入失敗：{e}")
-        else:
-            print(f"⚠️ 特徵表中尚未包含期別 {draw_date_std}，請確認 generate_features 是否涵蓋該期")
+        print(f"✅ 期別 {draw_date_std} 內容未變動，特徵表無需更新")
+        df_features = read_features()
 
     return df_features
\ No newline at end of file
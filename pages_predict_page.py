@@ -1,6 +1,7 @@
 # pages_predict_page.py
 import streamlit as st
-from modules_predict import predict_strategy
+import prediction_service as service
+from model_artifacts import ArtifactNotFoundError, tuned_params
 import datetime
 def show_predict_page():
     st.title("🔮 頭尾預測選號")
@@ -13,11 +14,17 @@ def show_predict_page():
     with col2:
         top_n = st.slider("🎯 選號數量", min_value=1, max_value=10, value=6)
 
-    lookback = st.slider("🔁 回溯期數", min_value=3, max_value=10, value=5)
+    tuned = tuned_params("rf")
+    lookback = st.slider("🔁 回溯期數", min_value=3, max_value=10, value=int(tuned["lookback"]) if tuned else 5,
+                         help="預設為 --mode tune 選出的回溯期數")
     threshold = st.slider("📈 機率門檻", min_value=0.1, max_value=0.9, value=0.5)
 
     if st.button("開始預測"):
-        result = predict_strategy(date_str=date_str or None, lookback=lookback, threshold=threshold, top_n=top_n)
+        try:
+            result = service.headtail(lookback=lookback, threshold=threshold, top_n=top_n, date_str=date_str or None)
+        except ArtifactNotFoundError as e:
+            st.error(f"❌ {e}")
+            return
         st.success(f"✅ 預測完成（期別：{result['date']}）")
 
         st.subheader("🎯 預測尾數")
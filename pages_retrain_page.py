@@ -1,5 +1,7 @@
 import streamlit as st
 from modules_retrain_model import retrain_model
+from model_artifacts import tuned_params
+from modules_tune import read_trials
 import matplotlib.pyplot as plt
 
 def show_retrain_page():
@@ -11,6 +13,20 @@ def show_retrain_page():
     - 🔮 頭尾預測模型（RandomForest）
     """)
 
+    with st.expander("🧪 調參結果（--mode tune；以 --promote-tuned 採用者為重訓預設值）"):
+        for name, label in (("xgb", "主策略模型"), ("rf", "頭尾預測模型")):
+            tuned = tuned_params(name, promoted_only=False)
+            if tuned:
+                lookback = f"，回溯 {tuned['lookback']} 期" if "lookback" in tuned else ""
+                status = "已採用" if tuned.get("promoted") else "未採用"
+                st.markdown(f"**{label}**：{tuned['version']}（logloss {tuned['score']:.5f}{lookback}，{status}）")
+                st.json(tuned["params"])
+            else:
+                st.markdown(f"**{label}**：尚未調參，使用預設超參數")
+        trials = read_trials()
+        if not trials.empty:
+            st.dataframe(trials.sort_values(["run_id", "score"], ascending=[False, True]))
+
     col1, col2, col3 = st.columns(3)
     with col1:
         retrain_main = st.checkbox("重訓主模型", value=True)
@@ -41,7 +57,7 @@ def show_retrain_page():
                 st.pyplot(fig)
 
             if retrain_tail_head:
-                st.markdown("🔮 頭尾預測模型已重訓並儲存至 `models/tail_model.pkl` 與 `models/head_model.pkl`")
+                st.markdown("🔮 頭尾預測模型已重訓並儲存至 `models/head_tail/<版本>/`")
 
         except Exception as e:
             st.error(f"❌ 重訓失敗：{e}")
\ No newline at end of file
@@ -1,5 +1,5 @@
 import streamlit as st
-from modules_betting_engine import simulate_betting
+import prediction_service as service
 
 def show_simulate_page():
     st.title("💰 投注模擬")
@@ -8,7 +8,7 @@ def show_simulate_page():
 
     if st.button("開始模擬投注"):
         try:
-            result = simulate_betting(stars=stars, top_n=top_n)
+            result = service.betting(stars=stars, top_n=top_n)
 
             st.subheader("🔗 三星連碰")
             st.write(f"號碼{result['linked']['numbers']}")
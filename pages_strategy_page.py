@@ -1,12 +1,12 @@
+import pandas as pd
 import streamlit as st
-from modules_strategy_combiner import generate_strategy
-from modules_betting_engine import simulate_betting
+import prediction_service as service
 
 def show_strategy_page():
     st.title("🎯 策略選號")
     if st.button("產生策略選號"):
         try:
-            latest_df, df_sources, sets = generate_strategy()
+            latest_df, df_sources, sets = service.strategy()
             st.success("✅ 策略選號完成！")
             st.dataframe(df_sources)
 
@@ -35,4 +35,23 @@ def show_strategy_page():
             #     st.write("→", "-".join(map(str, combo)))
 
         except Exception as e:
-            st.error(f"❌ 策略選號失敗：{e}")
\ No newline at end of file
+            st.error(f"❌ 策略選號失敗：{e}")
+
+    st.subheader("📅 近期各策略命中")
+    draws = st.slider("回看期數", min_value=10, max_value=300, value=50, step=10)
+    if st.button("計算近期命中"):
+        try:
+            hits = service.strategy_hits(draws=draws)
+            as_of = hits.attrs.get("as_of")
+            in_sample = int((hits.index.astype(str) < as_of).sum()) if as_of else 0
+            if in_sample:
+                st.caption(f"模型只以 {as_of} 之前的期數訓練：區間前 {in_sample} 期為樣本內，其餘為樣本外")
+            else:
+                st.caption(f"模型只以 {as_of} 之前的期數訓練，區間內各期皆為樣本外")
+            st.dataframe(pd.DataFrame({
+                "命中率": (hits > 0).mean(),
+                "平均命中": hits.mean(),
+            }).style.format({"命中率": "{:.2%}", "平均命中": "{:.2f}"}))
+            st.line_chart(hits.rolling(10, min_periods=1).mean())
+        except Exception as e:
+            st.error(f"❌ 命中計算失敗：{e}")
\ No newline at end of file
@@ -1,5 +1,6 @@
 import streamlit as st
 from modules_update_features import update_features
+import prediction_service as service
 import pandas as pd
 
 def show_update_page():
@@ -13,6 +14,8 @@ def show_update_page():
         try:
             df_updated = update_features(draw_date, drawn_numbers_str)
             st.success(f"✅ 特徵資料已更新，共 {len(df_updated)} 筆號碼")
+            if service.notify_reload():
+                st.info("🛰 預測服務已重新載入")
             st.dataframe(df_updated[df_updated["date"].astype(str) == draw_date])
         except Exception as e:
             st.error(f"❌ 更新失敗：{e}")
\ No newline at end of file
@@ -0,0 +1,317 @@
+# prediction_service.py
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+import numpy as np
+import pandas as pd
+
+# 🛰 常駐預測服務：開獎矩陣、最新特徵與已登錄模型留在記憶體，頁面與 CLI 以 HTTP 呼叫
+# 服務未啟動時，客戶端函式直接在本行程執行相同的處理函式（結果格式一致）
+# 模型 / 特徵相關模組在處理函式內才載入，只呼叫服務的頁面不必匯入 xgboost / sklearn
+DB_PATH = "lotto_data.db"
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = int(os.environ.get("LOTTO_SERVICE_PORT", "8539"))
+SERVICE_URL = os.environ.get("LOTTO_SERVICE_URL", f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+CONNECT_TIMEOUT = 0.5   # 探測服務是否存在的逾時（秒）
+REQUEST_TIMEOUT = 600   # 回測等長時間請求的逾時（秒）
+HITS_HOLDOUT_DRAWS = 300  # /strategy_hits 共用模型保留的最近期數（策略頁滑桿上限），各回看期數不另訓練模型
+
+
+class ServiceError(RuntimeError):
+    """服務端處理失敗。"""
+
+
+def _to_json(value):
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"無法序列化 {type(value).__name__}")
+
+
+def _round_trip(result: Dict) -> Dict:
+    """與服務回應相同的 JSON 形式（numpy 數值、tuple、set 轉為原生型別）。"""
+    return json.loads(json.dumps(result, default=_to_json, ensure_ascii=False))
+
+
+# 🧠 處理函式：服務端與本行程備援共用
+def handle_strategy(top_n: int = 10, as_of: Optional[str] = None) -> Dict:
+    from modules_strategy_combiner import generate_strategy
+    latest_df, df_sources, sets = generate_strategy(top_n=top_n, as_of=as_of)
+    return {
+        "latest": latest_df.assign(date=latest_df["date"].astype(str)).to_dict(orient="records"),
+        "sources": df_sources.to_dict(orient="records"),
+        "sets": {name: sorted(numbers) for name, numbers in sets.items()},
+    }
+
+
+def handle_headtail(lookback: Optional[int] = None, threshold: float = 0.5, top_n: int = 6, date_str: Optional[str] = None) -> Dict:
+    from modules_predict import predict_strategy
+    return predict_strategy(date_str=date_str, lookback=lookback, threshold=threshold, top_n=top_n)
+
+
+def handle_betting(stars: int = 3, top_n: int = 10) -> Dict:
+    from modules_betting_engine import simulate_betting
+    return simulate_betting(stars=stars, top_n=top_n)
+
+
+def handle_scores(start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+    from model_registry import score_matrix
+    scores = score_matrix(start=start, end=end)
+    return {"key": scores.key, "dates": scores.dates, "prob": scores.prob}
+
+
+def handle_strategy_hits(draws: int = 50, top_n: int = 10) -> Dict:
+    from strategy_tensor import evaluate_strategies, hits_frame, recent_start
+    # 所有回看期數共用同一個模型（只以最近 HITS_HOLDOUT_DRAWS 期之前訓練，服務載入時已預先訓練）；
+    # as_of 之前的期數為樣本內
+    as_of = recent_start(HITS_HOLDOUT_DRAWS)
+    tensor = evaluate_strategies(start=recent_start(draws), top_n=top_n, as_of=as_of)
+    hits = hits_frame(tensor)
+    return {"dates": hits.index.tolist(), "hits": hits.to_dict(orient="list"), "as_of": as_of}
+
+
+def handle_backtest(retrain_every: int = 50, window: Optional[int] = None, start: Optional[str] = None) -> Dict:
+    from modules_backtest import run_backtest, summarize_backtest
+    table = run_backtest(retrain_every=retrain_every, window=window, start=start)
+    return {"summary": summarize_backtest(table).to_dict(orient="records"), "rows": len(table)}
+
+
+class ServiceState:
+    """服務常駐的資料與模型；reload() 於新開獎匯入後重新載入。"""
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()  # 重新載入與讀寫 latest_processed_df.csv 的路徑（CSV_ROUTES）依序執行
+        self.info: Dict = {}
+        self.reload()
+
+    def reload(self) -> Dict:
+        from draw_history import load_draw_history
+        from feature_store import latest_feature_date, read_latest_features
+        from head_tail_trainer import load_head_tail
+        from model_artifacts import ArtifactNotFoundError
+        from model_registry import score_matrix
+        from strategy_tensor import recent_start
+
+        started = time.perf_counter()
+        with self.lock:
+            history = load_draw_history(self.db_path, refresh=True)
+            latest = read_latest_features()
+            # 載入模型並預先算好全期機率：與 /strategy、/scores 未指定 as_of 時相同的訓練截止（全部期數），
+            # 第一個請求直接取用，不在請求中訓練
+            scores = score_matrix(as_of=None)
+            try:
+                score_matrix(as_of=recent_start(HITS_HOLDOUT_DRAWS))  # /strategy_hits 共用的保留期模型
+            except ValueError:  # 特徵庫期數不足 HITS_HOLDOUT_DRAWS，保留期之前沒有可訓練的期數
+                pass
+            try:
+                head_tail = load_head_tail(self.db_path).version
+            except ArtifactNotFoundError:
+                head_tail = None
+            self.info = {
+                "draws": len(history.dates),
+                "latest_draw": str(history.dates[-1]) if len(history.dates) else None,
+                "latest_features": latest_feature_date(),
+                "feature_rows": len(latest),
+                "model_key": scores.key,
+                "head_tail_version": head_tail,
+                "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "load_seconds": round(time.perf_counter() - started, 3),
+            }
+        print(f"🛰 服務資料已載入：{self.info}")
+        return self.info
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value not in (None, "") else None
+
+
+ROUTES: Dict[str, Tuple[Callable, Dict[str, Callable]]] = {
+    "/strategy": (handle_strategy, {"top_n": int, "as_of": str}),
+    "/headtail": (handle_headtail, {"lookback": int, "threshold": float, "top_n": int, "date_str": str}),
+    "/betting": (handle_betting, {"stars": int, "top_n": int}),
+    "/scores": (handle_scores, {"start": str, "end": str}),
+    "/strategy_hits": (handle_strategy_hits, {"draws": int, "top_n": int}),
+    "/backtest": (handle_backtest, {"retrain_every": int, "window": _int, "start": str}),
+}
+
+
+# 策略選號寫出、投注模擬讀取 latest_processed_df.csv，這兩個路徑在 state.lock 內執行；
+# 其餘路徑（含耗時數分鐘的 /backtest）不持有鎖，不會擋住選號與頭尾預測
+CSV_ROUTES = ("/strategy", "/betting")
+
+
+def _make_handler(state: ServiceState):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Dict):
+            body = json.dumps(payload, default=_to_json, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _run(self, func: Callable, *args, **kwargs):
+            try:
+                self._reply(200, func(*args, **kwargs))
+            except Exception as e:
+                self._reply(500, {"error": str(e), "type": type(e).__name__})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._reply(200, state.info)
+                return
+            if url.path not in ROUTES:
+                self._reply(404, {"error": f"未知的路徑 {url.path}", "type": "NotFound"})
+                return
+            func, casts = ROUTES[url.path]
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                kwargs = {key: casts[key](value) for key, value in query.items() if key in casts}
+            except ValueError as e:
+                self._reply(400, {"error": f"參數格式錯誤：{e}", "type": "BadRequest"})
+                return
+
+            if url.path not in CSV_ROUTES:
+                self._run(func, **kwargs)
+                return
+
+            def locked():
+                with state.lock:
+                    return func(**kwargs)
+            self._run(locked)
+
+        def do_POST(self):
+            if urlparse(self.path).path == "/reload":
+                self._run(state.reload)
+            else:
+                self._reply(404, {"error": f"未知的路徑 {self.path}", "type": "NotFound"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, db_path: str = DB_PATH):
+    """
+    啟動常駐預測服務（只聽 localhost），Ctrl+C 結束。
+    端點：GET /health、/strategy、/headtail、/betting、/scores、/strategy_hits、/backtest；POST /reload
+    """
+    state = ServiceState(db_path)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    print(f"🛰 預測服務啟動：http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 預測服務已停止")
+    finally:
+        server.server_close()
+
+
+# 🔌 客戶端：優先呼叫服務，連不上時在本行程執行
+_down_until: Dict[str, float] = {}
+RETRY_AFTER = 30  # 服務連線失敗後，幾秒內直接走本行程備援
+
+
+def _reachable() -> bool:
+    url = urlparse(SERVICE_URL)
+    try:
+        with socket.create_connection((url.hostname, url.port), timeout=CONNECT_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+def _request(path: str, params: Optional[Dict] = None, method: str = "GET",
+             timeout: float = REQUEST_TIMEOUT) -> Optional[Dict]:
+    """
+    呼叫服務；服務未啟動時回傳 None。
+    :raises ServiceError: 服務端處理失敗
+    """
+    if time.monotonic() < _down_until.get(SERVICE_URL, 0) or not _reachable():
+        _down_until[SERVICE_URL] = time.monotonic() + RETRY_AFTER
+        return None
+    query = urlencode({k: v for k, v in (params or {}).items() if v is not None})
+    request = Request(f"{SERVICE_URL}{path}{'?' + query if query else ''}", method=method,
+                      data=b"" if method == "POST" else None)
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except HTTPError as e:
+        payload = json.loads(e.read().decode("utf-8") or "{}")
+        if payload.get("type") == "ArtifactNotFoundError":
+            from model_artifacts import ArtifactNotFoundError
+            raise ArtifactNotFoundError(payload["error"]) from None
+        raise ServiceError(payload.get("error", str(e))) from None
+    except (URLError, ConnectionError):
+        _down_until[SERVICE_URL] = time.monotonic() + RETRY_AFTER
+        return None
+
+
+def _call(path: str, handler: Callable, **params) -> Dict:
+    result = _request(path, params)
+    return result if result is not None else _round_trip(handler(**params))
+
+
+def service_status() -> Optional[Dict]:
+    """服務狀態（/health）；未啟動時為 None。"""
+    _down_until.pop(SERVICE_URL, None)
+    return _request("/health", timeout=CONNECT_TIMEOUT)
+
+
+def notify_reload() -> bool:
+    """新開獎匯入後通知服務重新載入；服務未啟動時略過。"""
+    _down_until.pop(SERVICE_URL, None)
+    return _request("/reload", method="POST") is not None
+
+
+def strategy(top_n: int = 10, as_of: Optional[str] = None):
+    """多策略選號，回傳格式同 generate_strategy：(latest_df, df_sources, sets)。"""
+    result = _call("/strategy", handle_strategy, top_n=top_n, as_of=as_of)
+    sets = {name: set(numbers) for name, numbers in result["sets"].items()}
+    return pd.DataFrame(result["latest"]), pd.DataFrame(result["sources"]), sets
+
+
+def headtail(lookback: Optional[int] = None, threshold: float = 0.5, top_n: int = 6,
+             date_str: Optional[str] = None) -> Dict:
+    """頭尾預測選號，回傳格式同 predict_strategy（未指定回溯期數時使用調參結果）。"""
+    return _call("/headtail", handle_headtail, lookback=lookback, threshold=threshold, top_n=top_n, date_str=date_str)
+
+
+def betting(stars: int = 3, top_n: int = 10) -> Dict:
+    """投注模擬，回傳格式同 simulate_betting（組合為 list）。"""
+    return _call("/betting", handle_betting, stars=stars, top_n=top_n)
+
+
+def scores(start: Optional[str] = None, end: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """主策略模型對 start ~ end 各期的預測機率：(日期 (期數,), 機率 (期數, 39))。"""
+    result = _call("/scores", handle_scores, start=start, end=end)
+    return np.asarray(result["dates"], dtype=str), np.asarray(result["prob"], dtype=np.float32)
+
+
+def strategy_hits(draws: int = 50, top_n: int = 10) -> pd.DataFrame:
+    """
+    最近 draws 期各策略的命中數：每期一列、每策略一欄。
+    模型只以 attrs["as_of"] 之前的期數訓練，該日期之前的期數為樣本內。
+    """
+    result = _call("/strategy_hits", handle_strategy_hits, draws=draws, top_n=top_n)
+    hits = pd.DataFrame(result["hits"], index=pd.Index(result["dates"], name="date"))
+    hits.attrs["as_of"] = result["as_of"]
+    return hits
+
+
+def backtest(retrain_every: int = 50, window: Optional[int] = None, start: Optional[str] = None) -> Dict:
+    """walk-forward 回測摘要：{"summary": [...], "rows"}。"""
+    return _call("/backtest", handle_backtest, retrain_every=retrain_every, window=window, start=start)
@@ -1,19 +1,17 @@
 # run_head_model.py
 import os
-import sqlite3
 import csv
 from datetime import datetime
 from collections import Counter
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.multioutput import MultiOutputClassifier
-import joblib
+from draw_history import load_draws
+from head_tail_trainer import build_matrix, build_dataset, latest_window, train_head_tail
+from db_loader import fetch_one
 
 # ✅ 路徑初始化
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "lotto_data.db")
 LOG_PATH = os.path.join(BASE_DIR, "selection_log_head.csv")
-MODEL_PATH = os.path.join(BASE_DIR, "head_model.pkl")
 
 # 🔍 環境檢查器
 def check_environment():
@@ -21,10 +19,7 @@ def check_environment():
     if not os.path.exists(DB_PATH):
         raise FileNotFoundError(f"❌ 找不到資料庫：{DB_PATH}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT date, numbers FROM lotto_data LIMIT 1")
-        conn.close()
+        fetch_one(DB_PATH, "SELECT seq, date, n1, n2, n3, n4, n5, mask FROM lotto_data LIMIT 1")
         print("✅ 資料庫連線成功")
     except Exception as e:
         raise RuntimeError(f"❌ 資料庫結構錯誤：{e}")
@@ -36,35 +31,17 @@ def check_environment():
     else:
         print("✅ 選號紀錄 CSV 已存在")
 
-# 📦 載入開獎資料
-def load_draws():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT numbers FROM lotto_data ORDER BY date ASC")
-    rows = cursor.fetchall()
-    conn.close()
-    return [list(map(int, row[0].split(','))) for row in rows]
-
 # 🧠 建立頭數矩陣
 def build_head_matrix(draws):
-    head_matrix = []
-    for draw in draws:
-        heads = [n // 10 for n in draw]
-        row = [1 if i in heads else 0 for i in range(4)]  # 頭數 0~3
-        head_matrix.append(row)
-    return np.array(head_matrix)
+    return build_matrix(draws, mode="head")
 
-# 🧠 建立訓練資料
+# 🧠 建立訓練資料（X 為滑動視窗 view）
 def build_head_dataset(head_matrix, lookback=5):
-    X, y = [], []
-    for i in range(lookback, len(head_matrix)):
-        X.append(head_matrix[i - lookback:i].flatten())
-        y.append(head_matrix[i])
-    return np.array(X), np.array(y).astype(int)
+    return build_dataset(head_matrix, lookback)
 
 # 🔮 預測下一期頭數
 def predict_next_head(model, head_matrix, lookback=5, threshold=0.5):
-    latest = head_matrix[-lookback:].flatten().reshape(1, -1)
+    latest = latest_window(head_matrix, lookback)
     probs = model.predict_proba(latest)
     predicted_heads = []
     for i, prob in enumerate(probs):
@@ -97,14 +74,11 @@ def save_selection(heads, numbers):
 # 🚀 主流程
 def run_head_model():
     check_environment()
-    draws = load_draws()
+    draws = load_draws(DB_PATH)
     head_matrix = build_head_matrix(draws)
-    X, y = build_head_dataset(head_matrix, lookback=5)
 
-    print("🎯 訓練頭數共振模型...")
-    model = MultiOutputClassifier(RandomForestClassifier(n_estimators=100, random_state=42))
-    model.fit(X, y)
-    joblib.dump(model, MODEL_PATH)
+    print("🎯 取得頭數共振模型...")
+    model = train_head_tail(DB_PATH, lookback=5).head
 
     print("🔮 預測下一期頭數...")
     predicted_heads = predict_next_head(model, head_matrix, lookback=5, threshold=0.5)
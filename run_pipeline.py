@@ -1,31 +1,89 @@
 import argparse
-from modules_update_features import update_features
+from modules_update_features import update_features, refresh_features
 from modules_retrain_model import retrain_model
-from modules_strategy_combiner import generate_strategy
-from modules_betting_engine import simulate_betting
+import prediction_service as service
 from modules_rl_simulation import run_rl_simulation
 from modules_report_generator import generate_report
 from datetime import datetime
 from run_tail_model import run_tail_model
 from run_head_model import run_head_model
+from modules_import_draws import import_draws
+from modules_feature_variants import build_feature_variants
+from db_loader import migrate_lotto_schema, report_query_stats
+from feature_store import export_features_csv
+from model_registry import configure_training
+from modules_tune import tune_xgb, tune_rf
+from modules_optimize_weights import OPTIMIZERS, optimize_weights
+
+DB_PATH = "lotto_data.db"
+
+def run_pipeline(mode="full", input_path="-", export_csv=None, feature_set=None, incremental=False,
+                 search="random", trials=None, tune_model="all", retrain_every=50, window=None, optimizer="cma",
+                 promote_tuned=False):
+    if mode == "migrate":
+        migrated = migrate_lotto_schema(DB_PATH)
+        if migrated:
+            print(f"✅ 資料表已轉換為正規化結構，共 {migrated} 期")
+        else:
+            print("✅ 資料表已是正規化結構，索引已確認")
+
+    if mode == "import":
+        result = import_draws(input_path, db_path=DB_PATH)
+        if result["inserted"] or result["updated"]:
+            df = refresh_features()
+            print(f"📋 特徵資料筆數：{len(df)}")
+            model, df_gain = retrain_model(incremental=incremental)
+            print("✅ 主策略模型與頭尾模型已依匯入資料重訓")
+            if service.notify_reload():
+                print("🛰 預測服務已重新載入")
 
-def run_pipeline(mode="full"):
     if mode in ["full", "update"]:
         draw_date = input("請輸入期別（YYYY-MM-DD）：").strip()
         drawn_numbers = input("請輸入中獎號碼（以逗號分隔）：").strip()
         df = update_features(draw_date, drawn_numbers)
         print(f"📋 本期資料筆數：{len(df)}")
+        if mode == "update" and service.notify_reload():  # full 模式於重訓後再通知
+            print("🛰 預測服務已重新載入")
+
+    if mode == "variants":
+        index = build_feature_variants()
+        print(f"📦 目前共有 {len(index)} 組特徵集，可用 --mode retrain --feature-set 名稱 訓練")
+
+    if mode == "tune":
+        if tune_model in ["all", "xgb"]:
+            result = tune_xgb(search=search, n_trials=trials, promote=promote_tuned)
+            print(f"🏆 主模型最佳參數已登錄（{result['registry_key']}），交叉驗證 logloss：{result['score']:.5f}")
+        if tune_model in ["all", "rf"]:
+            result = tune_rf(search=search, n_trials=trials, promote=promote_tuned)
+            print(f"🏆 頭尾模型最佳設定已儲存（{result['version']}），交叉驗證 logloss：{result['score']:.5f}")
+
+    if mode == "optimize-weights":
+        result = optimize_weights(optimizer=optimizer, budget=trials)
+        print(f"📝 最佳策略設定：{result['config_path']}（設定 LOTTO_STRATEGY_CONFIG 即可套用）")
+        print("🏅 排行榜前5：")
+        print(result["leaderboard"].head(5)[["objective", "objective_std", "holdout"]])
+
+    if mode == "serve":
+        service.serve()
+
+    if mode == "backtest":
+        result = service.backtest(retrain_every=retrain_every, window=window)
+        print("\n📊 walk-forward 回測結果：")
+        for row in result["summary"]:
+            print(f"{row['strategy']:<8} → 命中率 {row['hit_rate']:.2%}，平均命中 {row['avg_hits']:.2f}（{int(row['draws'])} 期）")
 
     if mode in ["full", "retrain"]:
-        model, df_gain = retrain_model()
+        model, df_gain = retrain_model(feature_set=feature_set, incremental=incremental)
         print("✅ 主策略模型已重訓")
         print("📊 模型特徵重要性（前5）:")
         print(df_gain.head())
 
-        print("🔮 頭尾預測模型也已同步重訓並儲存（tail_model.pkl / head_model.pkl）")
+        print("🔮 頭尾預測模型也已同步重訓並儲存（models/head_tail/）")
+        if service.notify_reload():
+            print("🛰 預測服務已重新載入")
 
     if mode in ["full", "strategy"]:
-        latest_df, df_sources, sets = generate_strategy()
+        latest_df, df_sources, sets = service.strategy()
         print(f"\n📋 本期資料筆數：{len(latest_df)}")
 
         print("\n🎯 綜合選號結果（多策略融合）：")
@@ -38,7 +96,7 @@ def run_pipeline(mode="full"):
         print(f"總綜合選號數：{len(df_sources)}")
 
     if mode in ["full", "simulate"]:
-        result = simulate_betting()
+        result = service.betting()
         print("\n📈 投注模擬結果:")
         print(f"🔗 連碰 → {len(result['linked']['combos'])} 組，平均分數：{result['linked']['avg_score']:.4f}")
         print(f"🧱 柱碰 → {len(result['column']['combos'])} 組，平均分數：{result['column']['avg_score']:.4f}")
@@ -83,10 +141,32 @@ def run_pipeline(mode="full"):
         print("\n📊 頭數預測結果：", result["predicted_heads"])
         print("🎯 選號結果：", result["selected_numbers"])
 
+    if export_csv:
+        export_features_csv(export_csv)
+
+    report_query_stats()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", choices=["full", "update", "retrain", "strategy", "simulate", "rl", "report", "head", "tail"], default="full")
+    parser.add_argument("--mode", choices=["full", "update", "retrain", "strategy", "simulate", "rl", "report", "head", "tail", "migrate", "import", "variants", "tune", "backtest", "serve", "optimize-weights"], default="full")
+    parser.add_argument("--input", default="-", help="import 模式的 CSV/JSON 檔案路徑（預設讀取標準輸入）")
+    parser.add_argument("--export-csv", metavar="PATH", help="執行完畢後將特徵庫匯出為 CSV（例如 features.csv）")
+    parser.add_argument("--feature-set", help="retrain 模式改用指定特徵集（由 --mode variants 建立）")
+    parser.add_argument("--incremental", action="store_true", help="主模型改為增量重訓（接續上一版模型，依排程或漂移才整體重訓），選號 / 服務並取用增量模型（同 LOTTO_INCREMENTAL=1）")
+    parser.add_argument("--n-jobs", type=int, help="所有模型訓練共用的執行緒數（0 表示全部 CPU）")
+    parser.add_argument("--external-memory", action="store_true", help="主模型訓練矩陣改為逐年分區串流（特徵表大於記憶體時使用）")
+    parser.add_argument("--search", choices=["grid", "random"], default="random", help="tune 模式的搜尋方式")
+    parser.add_argument("--trials", type=int, help="tune 模式的 trial 數（random 模式預設 48，grid 模式超過時隨機截取）；optimize-weights 模式的候選組數（預設 4096）")
+    parser.add_argument("--tune-model", choices=["all", "xgb", "rf"], default="all", help="tune 模式要調參的模型")
+    parser.add_argument("--promote-tuned", action="store_true", help="tune 模式的最佳設定採用為重訓 / 選號 / 回測的預設超參數（退化的結果不採用）")
+    parser.add_argument("--retrain-every", type=int, default=50, help="backtest 模式每 N 期重訓一次")
+    parser.add_argument("--window", type=int, help="backtest 模式的滾動訓練視窗期數（預設為擴張視窗）")
+    parser.add_argument("--optimizer", choices=OPTIMIZERS, default="cma", help="optimize-weights 模式的搜尋方式（random / coordinate / cma）")
     args = parser.parse_args()
-    run_pipeline(mode=args.mode)
\ No newline at end of file
+    configure_training(n_jobs=args.n_jobs, external_memory=args.external_memory or None,
+                       incremental=args.incremental or None)
+    run_pipeline(mode=args.mode, input_path=args.input, export_csv=args.export_csv, feature_set=args.feature_set,
+                 incremental=args.incremental, search=args.search, trials=args.trials, tune_model=args.tune_model,
+                 retrain_every=args.retrain_every, window=args.window, optimizer=args.optimizer,
+                 promote_tuned=args.promote_tuned)
\ No newline at end of file
@@ -0,0 +1,78 @@
+# score_kernels.py
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# 🧮 線性評分核心：{特徵: 權重} 先對齊成權重向量，分數為「特徵矩陣 · 權重」一次矩陣乘法
+# 取代逐列 DataFrame.apply 的 sum(gain.get(f) * row[f])，任意列數（或 (期數, 39, 特徵數) 張量）皆適用
+
+
+def weight_vector(weights: Dict[str, float], columns: Sequence[str], normalize: bool = False) -> np.ndarray:
+    """
+    將權重字典依欄位順序排成向量，不在字典內的欄位權重為 0（字典內不在 columns 的特徵略過）。
+    :param weights: {特徵: 權重}，例如 gain_dict
+    :param columns: 特徵欄位順序
+    :param normalize: 除以全部權重總和（即 auto_score 的 gain 比例）
+    :return: (特徵數,) float64
+    """
+    vector = np.array([weights.get(col, 0.0) for col in columns], dtype=np.float64)
+    if normalize:
+        total = sum(weights.values())
+        if total:
+            vector /= total
+    return vector
+
+
+def booster_gain_vector(booster: xgb.Booster, n_features: int, normalize: bool = False) -> np.ndarray:
+    """
+    以未命名特徵（f0, f1, ...）訓練的 booster 之 gain 向量，依特徵位置排列。
+    :param booster: 原生 booster
+    :param n_features: 特徵數
+    :param normalize: 除以 gain 總和
+    """
+    gain = booster.get_score(importance_type="gain")
+    return weight_vector(gain, [f"f{i}" for i in range(n_features)], normalize)
+
+
+def linear_score(features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    特徵矩陣 · 權重向量。
+    :param features: (..., 特徵數)，例如 (列數, 特徵數) 或 (期數, 39, 特徵數)
+    :param weights: (特徵數,)
+    :return: (...) float64
+    """
+    return np.matmul(features, weights)
+
+
+def top_k_mask(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    沿最後一軸取分數最高的 k 個（argpartition，不做完整排序）。
+    :param scores: (..., 39)
+    :return: 同形狀 bool 遮罩
+    """
+    mask = np.zeros(scores.shape, dtype=bool)
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return mask
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    np.put_along_axis(mask, top, True, axis=-1)
+    return mask
+
+
+def weighted_score(df: pd.DataFrame, weights: Dict[str, float], normalize: bool = False,
+                   columns: Optional[List[str]] = None) -> np.ndarray:
+    """
+    DataFrame 各列的加權分數：sum(weights[f] * row[f])，只取 df 內存在的特徵。
+    :param df: 特徵表（任意列數）
+    :param weights: {特徵: 權重}
+    :param normalize: 除以全部權重總和
+    :param columns: 參與計分的欄位（None 表示 weights 內且存在於 df 的欄位）
+    :return: (列數,) float64
+    """
+    if columns is None:
+        columns = [col for col in weights if col in df.columns]
+    if not columns:
+        return np.zeros(len(df), dtype=np.float64)
+    X = df[columns].to_numpy(dtype=np.float32)
+    return linear_score(X, weight_vector(weights, columns, normalize))
@@ -0,0 +1,228 @@
+# strategy_registry.py
+import copy
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from model_artifacts import MODEL_DIR
+from score_kernels import linear_score, top_k_mask, weight_vector
+
+# 📜 宣告式策略登錄：權重、篩選條件與融合比例寫在 strategies.json，編譯成對特徵張量的向量化運算
+#   scores：具名分數 = Σ 權重 × 輸入；輸入可為特徵欄、內建分數或先前宣告的分數
+#   strategies：依 score 取前 top_n（select="all" 表示選出所有通過 filter 者），filter 為 [輸入, 運算子, 數值]
+#   unions：多個策略選號的聯集（回測用）
+STRATEGY_CONFIG = os.environ.get(
+    "LOTTO_STRATEGY_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "strategies.json")
+)
+LEADERBOARD_PATH = os.path.join(MODEL_DIR, "strategy_weights", "leaderboard.csv")  # --mode optimize-weights 的最新排行榜
+BUILTIN_SCORES = ("prob", "gain_score", "auto_score")  # 模型機率、gain 加權分數、gain 正規化分數
+OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+RANGE_OPERATORS = ("<", "<=", ">", ">=")  # 可搜尋門檻的篩選條件（== / != 為類別條件，固定不動）
+
+_compiled: Dict[Tuple, "StrategyEvaluator"] = {}
+_lock = threading.Lock()
+
+
+def load_strategy_config(path: str = STRATEGY_CONFIG) -> Dict:
+    """
+    讀取策略設定檔。
+    :raises ValueError: 缺少 scores / strategies
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not config.get("strategies"):
+        raise ValueError(f"策略設定檔 {path} 沒有 strategies")
+    config.setdefault("scores", {})
+    config.setdefault("unions", {})
+    return config
+
+
+class StrategyEvaluator:
+    """
+    編譯後的策略：所有具名分數的特徵權重疊成一個 (特徵數, 分數數) 矩陣，一次矩陣乘法算出，
+    再加上對內建 / 先前分數的引用；篩選條件為逐元素比較。輸入可為任意前綴形狀 (..., 39, 特徵數)。
+    """
+
+    def __init__(self, config: Dict, columns: Sequence[str]):
+        self.columns = list(columns)
+        self.names: List[str] = [item["name"] for item in config["strategies"]]
+        self.unions: Dict[str, List[str]] = {name: list(members) for name, members in config.get("unions", {}).items()}
+        self.score_names: List[str] = list(config.get("scores", {}))
+
+        known = set(BUILTIN_SCORES)
+        refs = []
+        for name, weights in config.get("scores", {}).items():
+            if name in self.columns or name in BUILTIN_SCORES:
+                raise ValueError(f"分數名稱 {name} 與特徵或內建分數重複")
+            unknown = [key for key in weights if key not in self.columns and key not in known]
+            if unknown:
+                raise ValueError(f"分數 {name} 引用了未知的輸入：{unknown}")
+            refs.append([(key, float(value)) for key, value in weights.items() if key not in self.columns])
+            known.add(name)
+        self._feature_weights = np.stack(
+            [weight_vector(weights, self.columns) for weights in config.get("scores", {}).values()], axis=1
+        ) if self.score_names else np.zeros((len(self.columns), 0))
+        self._refs = refs
+
+        self._strategies = []
+        for item in config["strategies"]:
+            score = item.get("score")
+            if score is not None and score not in known:
+                raise ValueError(f"策略 {item['name']} 的分數 {score} 未定義")
+            predicates = []
+            for operand, op, value in item.get("filter", []):
+                if op not in OPERATORS:
+                    raise ValueError(f"策略 {item['name']} 的運算子 {op} 不支援")
+                if operand not in self.columns and operand not in known:
+                    raise ValueError(f"策略 {item['name']} 的篩選欄位 {operand} 未定義")
+                predicates.append((operand, OPERATORS[op], float(value)))
+            select_all = item.get("select", "top_n") == "all"
+            if score is None and not select_all:
+                raise ValueError(f"策略 {item['name']} 需指定 score 或 select=\"all\"")
+            self._strategies.append((item["name"], score, predicates, select_all))
+        for name, members in self.unions.items():
+            missing = [member for member in members if member not in self.names]
+            if missing:
+                raise ValueError(f"聯集 {name} 引用了未知的策略：{missing}")
+
+    def scores(self, features: np.ndarray, prob: np.ndarray, gain_weights: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        所有內建與具名分數。
+        :param features: (..., 39, 特徵數)
+        :param prob: (..., 39) 模型機率
+        :param gain_weights: (特徵數,) gain 向量
+        :return: {分數名稱: (..., 39)}
+        """
+        gain_score = linear_score(features, gain_weights)
+        total = gain_weights.sum()
+        values = {
+            "prob": prob,
+            "gain_score": gain_score,
+            "auto_score": gain_score / total if total else gain_score,
+        }
+        if self.score_names:
+            stacked = linear_score(features, self._feature_weights)  # (..., 39, 分數數)
+            for i, (name, refs) in enumerate(zip(self.score_names, self._refs)):
+                value = stacked[..., i]
+                for ref, weight in refs:
+                    value = value + weight * values[ref]
+                values[name] = value
+        return values
+
+    def evaluate(self, features: np.ndarray, prob: np.ndarray, gain_weights: np.ndarray, top_n: int
+                 ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        計算所有策略的分數與選號。
+        :return: (具名分數, {策略: 排序分數（未通過 filter 為 -inf）}, {策略: bool 選號})
+        """
+        values = self.scores(features, prob, gain_weights)
+        strategy_scores, selected = {}, {}
+        for name, score, predicates, select_all in self._strategies:
+            passed = np.ones(prob.shape, dtype=bool)
+            for operand, op, value in predicates:
+                column = values[operand] if operand in values else features[..., self.columns.index(operand)]
+                passed &= op(column, value)
+            ranked = values[score] if score is not None else np.zeros(prob.shape)
+            if predicates:
+                ranked = np.where(passed, ranked, -np.inf)
+            strategy_scores[name] = ranked
+            selected[name] = passed if select_all else top_k_mask(ranked, top_n) & passed
+        return values, strategy_scores, selected
+
+    def union(self, selected: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """{聯集名稱: 成員策略選號的聯集}。"""
+        return {name: np.logical_or.reduce([selected[member] for member in members])
+                for name, members in self.unions.items()}
+
+
+def strategy_evaluator(columns: Sequence[str], path: Optional[str] = None,
+                       config: Optional[Dict] = None) -> StrategyEvaluator:
+    """
+    依特徵欄位編譯策略設定（設定檔未變動時重用已編譯結果）。
+    :param columns: 特徵欄位順序
+    :param path: 設定檔（預設 STRATEGY_CONFIG）
+    :param config: 直接給定的設定（優先於 path，不快取）
+    """
+    if config is not None:
+        return StrategyEvaluator(config, columns)
+    path = path or STRATEGY_CONFIG
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns, tuple(columns))
+    with _lock:
+        if key in _compiled:
+            return _compiled[key]
+    evaluator = StrategyEvaluator(load_strategy_config(path), columns)
+    with _lock:
+        _compiled[key] = evaluator
+    return evaluator
+
+
+# 🎛️ 可調參數：權重為 "scores.<分數>.<輸入>"，門檻為 "strategies.<策略>.<輸入><運算子>"
+def tunable_parameters(config: Dict) -> Dict[str, float]:
+    """設定檔內所有分數權重與範圍篩選門檻的目前值（--mode optimize-weights 的搜尋參數）。"""
+    params = {}
+    for name, weights in config.get("scores", {}).items():
+        for key, value in weights.items():
+            params[f"scores.{name}.{key}"] = float(value)
+    for item in config["strategies"]:
+        for operand, op, value in item.get("filter", []):
+            if op in RANGE_OPERATORS:
+                params[f"strategies.{item['name']}.{operand}{op}"] = float(value)
+    return params
+
+
+def apply_parameters(config: Dict, params: Dict[str, float]) -> Dict:
+    """
+    將參數值套回設定（不修改原設定）。
+    :param params: tunable_parameters() 格式的 {參數: 值}
+    :raises KeyError: 參數不存在於設定內
+    """
+    config = copy.deepcopy(config)
+    strategies = {item["name"]: item for item in config["strategies"]}
+    for key, value in params.items():
+        kind, name, rest = key.split(".", 2)
+        if kind == "scores" and rest in config.get("scores", {}).get(name, {}):
+            config["scores"][name][rest] = float(value)
+            continue
+        if kind == "strategies" and name in strategies:
+            predicates = strategies[name].get("filter", [])
+            matched = [predicate for predicate in predicates if f"{predicate[0]}{predicate[1]}" == rest]
+            if matched:
+                for predicate in matched:
+                    predicate[2] = float(value)
+                continue
+        raise KeyError(f"設定內沒有參數 {key}")
+    return config
+
+
+def leaderboard_config(rank: int = 0, path: str = LEADERBOARD_PATH, base_path: Optional[str] = None) -> Dict:
+    """
+    由 --mode optimize-weights 的排行榜取出第 rank 名的策略設定（套用在 base_path 設定檔上）。
+    :param rank: 名次（0 為最佳）
+    :param path: 排行榜 CSV
+    :param base_path: 基底設定檔（預設 STRATEGY_CONFIG）
+    :return: 可傳給 strategy_evaluator(config=...) 或寫成設定檔的 dict
+    """
+    board = pd.read_csv(path)
+    if rank >= len(board):
+        raise ValueError(f"排行榜 {path} 只有 {len(board)} 筆")
+    row = board.iloc[rank]
+    params = {col: float(row[col]) for col in board.columns if col.startswith(("scores.", "strategies."))}
+    return apply_parameters(load_strategy_config(base_path or STRATEGY_CONFIG), params)
+
+
+def save_strategy_config(config: Dict, path: str):
+    """寫出策略設定檔（可設為 LOTTO_STRATEGY_CONFIG）。"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
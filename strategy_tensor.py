@@ -0,0 +1,120 @@
+# strategy_tensor.py
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+import pandas as pd
+from db_loader import NUM_BALLS
+from feature_store import FEATURE_STORE, LABEL_COLUMN, date_index, read_features, model_matrix
+from model_registry import load_model, score_matrix
+from modules_strategy_combiner import TOP_N
+from score_kernels import weight_vector
+from strategy_registry import StrategyEvaluator, strategy_evaluator
+
+# 🧊 多期策略張量：策略登錄（strategies.json）內所有策略一次算完所有期別，(策略, 期數, 39) 分數 / 選號與各策略命中數
+
+
+class FeatureTensor(NamedTuple):
+    dates: np.ndarray     # (期數,) 日期字串
+    features: np.ndarray  # (期數, 39, 特徵數) float32
+    labels: np.ndarray    # (期數, 39) bool，是否開出
+    columns: List[str]    # 特徵欄位順序
+
+
+class StrategyTensor(NamedTuple):
+    strategies: List[str]
+    dates: np.ndarray              # (期數,)
+    scores: np.ndarray             # (策略, 期數, 39) float32；未通過篩選條件者為 -inf
+    selected: np.ndarray           # (策略, 期數, 39) bool
+    hits: Optional[np.ndarray]     # (策略, 期數) 命中數；沒有標籤時為 None
+    unions: Dict[str, np.ndarray]  # {聯集名稱: (期數, 39) bool 選號}
+
+
+def load_feature_tensor(store_path: str = FEATURE_STORE, start: Optional[str] = None,
+                        end: Optional[str] = None) -> FeatureTensor:
+    """
+    讀取特徵庫 start ~ end（含）各期並排成 (期數, 39, 特徵數) 張量（每期 39 列、號碼 1~39 依序排列）。
+    """
+    df = read_features(start=start, end=end, store_path=store_path)
+    X = model_matrix(df)
+    n_dates = len(df) // NUM_BALLS
+    if n_dates * NUM_BALLS != len(df):
+        raise ValueError("特徵庫每期列數不一致，無法排成張量")
+    dates = np.asarray(df["date"].astype(str).to_numpy()[::NUM_BALLS])
+    features = np.ascontiguousarray(X.to_numpy().reshape(n_dates, NUM_BALLS, -1))
+    labels = np.ascontiguousarray(df[LABEL_COLUMN].to_numpy(dtype=bool).reshape(n_dates, NUM_BALLS))
+    return FeatureTensor(dates, features, labels, X.columns.tolist())
+
+
+def strategy_tensor(
+    features: np.ndarray,
+    columns: List[str],
+    prob: np.ndarray,
+    gain_weights: np.ndarray,
+    top_n: int = TOP_N,
+    dates: Optional[np.ndarray] = None,
+    labels: Optional[np.ndarray] = None,
+    evaluator: Optional[StrategyEvaluator] = None,
+) -> StrategyTensor:
+    """
+    一次計算多期的所有策略分數與選號。
+    :param features: (期數, 39, 特徵數)
+    :param columns: 特徵欄位
+    :param prob: (期數, 39) 模型機率
+    :param gain_weights: (特徵數,) 依欄位順序排列的 gain（未使用的特徵為 0）
+    :param top_n: 各策略選出的號碼數
+    :param dates: (期數,) 日期
+    :param labels: (期數, 39) 是否開出；提供時一併計算命中數
+    :param evaluator: 已編譯的策略（預設為 strategies.json）
+    :return: StrategyTensor
+    """
+    evaluator = evaluator or strategy_evaluator(columns)
+    _, strategy_scores, selections = evaluator.evaluate(features, prob, gain_weights, top_n)
+    names = evaluator.names
+    scores = np.stack([strategy_scores[name] for name in names]).astype(np.float32)
+    selected = np.stack([selections[name] for name in names])
+    hits = (selected & labels).sum(axis=2) if labels is not None else None
+    if dates is None:
+        dates = np.arange(len(features))
+    return StrategyTensor(list(names), dates, scores, selected, hits, evaluator.union(selections))
+
+
+def evaluate_strategies(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    top_n: int = TOP_N,
+    as_of: Optional[str] = None,
+    params: Optional[Dict] = None,
+    store_path: str = FEATURE_STORE,
+) -> StrategyTensor:
+    """
+    以單一模型評估 start ~ end 各期的所有策略（機率取自全期批次評分，不逐期呼叫模型）。
+    預設模型只以 start 之前的期數訓練，區間內各期皆為樣本外；需逐段重訓請用 modules_backtest.run_backtest。
+    :param start: 起始期別（None 表示第一期）
+    :param end: 結束期別（含，None 表示最新一期）
+    :param top_n: 各策略選出的號碼數
+    :param as_of: 模型訓練截止日（None 表示 start；start 也為 None 時使用全部期數）
+    :param params: XGBoost 超參數（None 表示 default_params()，即有調參結果時的最佳參數）
+    :param store_path: 特徵庫目錄
+    :return: StrategyTensor（含命中數）
+    """
+    data = load_feature_tensor(store_path, start, end)
+    scores = score_matrix(params, as_of or start, start, end, store_path)
+    if not np.array_equal(scores.dates, data.dates):
+        raise ValueError("評分矩陣與特徵庫期別不一致，請重新產生特徵表")
+    _, gain_dict = load_model(scores.key)
+    return strategy_tensor(
+        data.features, data.columns, scores.prob, weight_vector(gain_dict, data.columns),
+        top_n, data.dates, data.labels,
+    )
+
+
+def recent_start(draws: int, store_path: str = FEATURE_STORE) -> Optional[str]:
+    """特徵庫最近 draws 期的第一期日期。"""
+    index = date_index(store_path)
+    return str(index[max(len(index) - draws, 0)]) if len(index) else None
+
+
+def hits_frame(tensor: StrategyTensor) -> pd.DataFrame:
+    """命中數寬表：每期一列、每策略一欄。"""
+    if tensor.hits is None:
+        raise ValueError("此張量沒有標籤，無法計算命中數")
+    return pd.DataFrame(tensor.hits.T, index=pd.Index(tensor.dates, name="date"), columns=tensor.strategies)